@@ -1,22 +1,75 @@
 import argparse
+import itertools
 import json
+import logging
 import os
+import statistics
+import subprocess
 import sys
-
-from random import randint
-from time import monotonic
+from random import randint, random
+from time import monotonic, sleep, time
+from typing import Dict
 
 import cv2
 import numpy as np
-
 import paho.mqtt.client as mqtt
 from commandr import command, Run
 
+import precision_validation
+from benchmark import (
+    benchmark_matrix,
+    BenchmarkRun,
+    compare,
+    environment,
+    run_benchmark,
+    run_isolated,
+    summarize_repeats,
+)
+from counter_pipeline import CounterStages
+from counting import PresenceCounter, TrackCounter
+from multi_stream import MultiStreamRunner, StreamManifest
+from offline import list_videos, OfflineJob, run_offline, run_sharded, validate_sharding
+from openvino_utils.input_feeder import InputFeeder, LatencyBudget
+from openvino_utils.metrics import (
+    MetricsRegistry,
+    MetricsServer,
+    PeriodicTask,
+    process_start_time,
+    SamplingProfiler,
+)
+from openvino_utils.motion import MotionGate
+from openvino_utils.openvino_model import preprocess_image_input
+from openvino_utils.preprocessing import ImagePreprocessor, profile_preprocessing
+from openvino_utils.propagation import DetectionPropagator
+from openvino_utils.quantization import (
+    CalibrationFrames,
+    INT8_PRECISION,
+    quantize,
+    sample_frames,
+)
+from openvino_utils.regions import inference_regions, parse_regions
+from openvino_utils.sinks import OutputSinks, RawPipeSink, VideoFileSink, WindowSink
+from openvino_utils.streaming_stats import LatencyStats
+from openvino_utils.timeseries import TimeSeriesStore, TimeSeriesWriter
+from openvino_utils.tuning import (
+    candidates,
+    host_id,
+    model_key,
+    select,
+    sweep,
+    TuningProfile,
+)
 from openvino_utils.utils import ImageDimension
-from openvino_utils.video_utils import codec
-
+from openvino_utils.video_utils import capture_stream
 from pedestrian_detection import PedestrianDetection
+from publisher import CountPublisher, InProcessBroker
+from skip_validation import motion_gated, propagated, validate_skipping
 
+LOGGER = logging.getLogger()
+
+# (startup timings) the process start, before the interpreter startup and the imports
+# (None when unknown)
+STARTED_AT = process_start_time()
 
 # MQTT server environment variables
 MQTT_HOST = "mqtt"
@@ -42,8 +95,45 @@ def infer(
     output_directory="./output/",
     frames_window=10,  # last frame(s) window to smooth detection per frame signal/time-series
     threshold=0.7,
+    # number of in-flight inference requests (trade a few frames of latency for FPS)
+    async_depth=0,
+    preprocess_threads=1,
+    annotate_threads=1,
+    queue_size=4,
+    realtime=False,
+    target_latency=0.5,
+    counting="presence",
+    nms_threshold=0.5,
+    hysteresis=0.0,
+    heartbeat=5.0,
+    video_output="pedestrian_detection_output.mp4",
+    stdout_output=True,
+    graph_preprocessing=False,
+    metrics_port=0,
+    metrics_interval=0.0,
+    profile=False,
+    profile_interval=0.01,
+    model_cache="./model_cache",
+    model_cache_size=1024,
+    display=False,
+    mqtt_broker=True,
+    max_frames=0,
+    startup_report="",
+    tuning=True,
+    roi="",
+    tiles="",
+    tile_overlap=0.1,
+    motion_gating=False,
+    motion_threshold=25,
+    motion_min_changed=0.002,
+    motion_refresh=1.0,
+    detection_interval=1,
+    min_detection_interval=1,
+    timeseries_directory="",
+    stream_name="default",
+    occupancy_interval=60.0,
+    capture_backend="opencv",
 ):
-
     """Main function to infer video:detect persons in video frames, process it to extract the entry and leave the scene
     output augmented output frames to sys.stdout and publish detection statistics to MQTT.
 
@@ -54,103 +144,359 @@ def infer(
     :param input_file: data source when the type is set to video
     :param output_directory: output directory for the generated artifacts control video capture and benchmarking data
     :param frames_window: last frame(s) window to smooth detection per frame signal/time-series
+    :param async_depth: number of in-flight (asynchronous) inference requests (1 for
+        synchronous inference, 0 for the host tuning profile one, see autotune, or 1
+        without a profile)
+    :param preprocess_threads: preprocessing stage threads
+    :param annotate_threads: annotation stage threads
+    :param queue_size: pipeline stages (bounded) queues size
+    :param realtime: real-time mode: always infer on the freshest frame dropping the
+        stale ones
+    :param target_latency: real-time mode target end-to-end latency (seconds)
+    :param counting: "presence" (a single person in the scene, smoothed presence) or
+        "tracking" (multi-person: non-maxima suppression and an IoU tracker counting
+        entries, exits and per-person dwell time)
+    :param nms_threshold: tracking mode non-maxima suppression IoU threshold
+    :param hysteresis: presence mode hysteresis (a person leaves when the smoothed
+        signal goes back to threshold - hysteresis)
+    :param heartbeat: MQTT counts are published when they change or every heartbeat
+        seconds
+    :param video_output: output (annotated) video file ("" to disable it)
+    :param stdout_output: write the raw (bgr24) output frames to stdout
+        (--no_stdout_output to disable it)
+    :param graph_preprocessing: the raw frames are resized/converted by the OpenVino
+        plugin (in the graph)
+    :param metrics_port: serve the live metrics (Prometheus text format) on this port (0
+        to disable)
+    :param metrics_interval: publish a metrics summary to the MQTT "metrics" topic every
+        interval seconds (0 to disable)
+    :param profile: sample the threads stacks and dump them (folded format) to
+        output_directory/profile.folded
+    :param profile_interval: profiler sampling interval (seconds)
+    :param model_cache: compiled networks cache directory ("" to compile the model on
+        every start)
+    :param model_cache_size: compiled networks cache maximum size (MB)
+    :param display: show the output frames in a window (escape to quit), headless by
+        default: the display dependencies are not imported and no keys are polled
+    :param mqtt_broker: publish to the MQTT broker (--no_mqtt_broker to publish to a
+        local in-process stand-in)
+    :param max_frames: stop after max_frames processed frames (0 to process the whole
+        input)
+    :param startup_report: save the startup timings (imports, model loading, first
+        frame) to this (json) file
+    :param tuning: apply the host tuning profile (CPU streams/threads and async depth,
+        see autotune) when found (--no_tuning to use the plugin defaults)
+    :param roi: ";" separated regions of interest as x_min,y_min,x_max,y_max frame
+        ratios (ex: a doorway "0.3,0.1,0.7,1"): only their crops are inferred ("" for
+        the whole frame)
+    :param tiles: split the regions (or the whole frame) into <rows>x<columns>
+        overlapping tiles (ex: "2x2")
+    :param tile_overlap: tiles overlap (ratio of a tile size)
+    :param motion_gating: only infer the frames changed since the last inferred one (the
+        other frames reuse its detections), see motion_gate_validation
+    :param motion_threshold: motion gating minimum (grayscale) difference of a changed
+        pixel
+    :param motion_min_changed: motion gating minimum changed pixels ratio (in the
+        regions of interest)
+    :param motion_refresh: motion gating maximum time (seconds) without inference
+    :param detection_interval: run the detector every k frames at most (k adapted
+        between min_detection_interval and detection_interval to the motion and the
+        propagation accuracy), the detections are propagated (optical flow) on the
+        frames in between (1 to detect on every frame)
+    :param min_detection_interval: minimum detector frames interval
+    :param timeseries_directory: record the per frame counts, confidences and the
+        entries/exits (with the dwell times) to this time series store directory (ex:
+        ./output/timeseries/, disabled by default), see timeseries_report. The video
+        files timestamps are recorded from the run start (wall clock)
+    :param stream_name: the stream name in the time series store
+    :param occupancy_interval: publish the last hour per-minute occupancy (from the
+        store rollups) to the MQTT "occupancy" topic every interval seconds (0 to
+        disable)
+    :param capture_backend: "opencv" (cv2.VideoCapture) or "ffmpeg": a local ffmpeg
+        process decodes the frames already scaled to the output dimension into
+        preallocated (ring) buffers
 
     """
+    imported_at = time()
 
     ensure_output_directory(output_directory=output_directory)
 
     # Connect to the MQTT server (using MQTT protocol: both MQTT and websocket are enabled in MQTT container)
-    client = mqtt.Client()
-    client.connect(MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE_INTERVAL)
-
-    # Get and open video capture
-    cap = cv2.VideoCapture(input_file)
-    cap.open(input_file)
+    if mqtt_broker:
+        client = mqtt.Client()
+        client.connect(MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE_INTERVAL)
+    else:
+        client = InProcessBroker()
+    # publish (coalesced) from a background thread
+    publisher = CountPublisher(client, heartbeat=heartbeat).start()
+    # (written from a background thread)
+    timeseries = (
+        TimeSeriesWriter(timeseries_directory).start() if timeseries_directory else None
+    )
 
     output_dimension = ImageDimension(x=1280, y=720).scale(1)
+    # (async_depth 0: the tuned number of requests)
+    requests = {"num_requests": async_depth} if async_depth else {}
     pedestrian_detection = PedestrianDetection(
-        model_name=model, model_directory=f"{models_root_dir}/{model}/{model_precision}"
+        model_name=model,
+        model_directory=f"{models_root_dir}/{model}/{model_precision}",
+        tuning=tuning,
+        **requests,
+        # the (BGR) frames channels are swapped while preprocessed (no full frame color
+        # conversion)
+        swap_rb=True,
+        graph_preprocessing=graph_preprocessing,
+        cache_directory=model_cache or None,
+        cache_max_bytes=model_cache_size << 20,
     )
     pedestrian_detection.load_model()
+    async_depth = pedestrian_detection.num_requests
 
-    video_writer = cv2.VideoWriter(
-        "pedestrian_detection_output.mp4",
-        codec(),
-        30,
-        (output_dimension.width, output_dimension.height),
-    )
-
-    pedestrians_in_frame = [0]  # initialized (a time series for people in the frame)
-    smoothed_pedestrians_in_frame = [0]  # averaged last (frames_window) frame
-
-    start = monotonic()
-    # last_frame = False
-
-    # Process frames until the video ends, or process is exited
-    while cap.isOpened():
-        # Read the next frame
-        flag, frame = cap.read()
-        if not flag:
-            break
-        key_pressed = cv2.waitKey(60)
+    # output sinks (the output frames are kept in the captured BGR order: no color
+    # conversion)
+    sinks = []
+    if video_output:
+        # write output_frame to an mp4 video output
+        sinks.append(VideoFileSink(video_output, output_dimension, fps=30))
+    if stdout_output:
+        # Send frame to the stdout to pipe to ffmpeg server
+        sinks.append(RawPipeSink(sys.stdout.buffer))
+    window_sink = None
+    if display:
+        window_sink = WindowSink(fit_screen=True)
+        sinks.append(window_sink)
+    output_sinks = OutputSinks(sinks)
 
-        image = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        output_frame = cv2.resize(
-            image,
-            (output_dimension.width, output_dimension.height),
-        )
-        pedestrians = pedestrian_detection.detect(image, min_confidence=0.85)[:1]
-        # TODO: use Jaccard index to remove the non-maxima (instead of limiting the pedestrian to 1)
-        #  -> that should lead to the same behavior (with a fairly high min confidence)
-
-        pedestrians_in_frame.append(len(pedestrians))
-        smoothed_pedestrians_in_frame.append(
-            int(np.mean(pedestrians_in_frame[-frames_window:]) > threshold)
-        )
-        if smoothed_pedestrians_in_frame[-2] != smoothed_pedestrians_in_frame[-1]:
-            if smoothed_pedestrians_in_frame[-1] == 1:
-                start = monotonic()
-                client.publish(
-                    "person", json.dumps({"count": smoothed_pedestrians_in_frame[-1]})
-                )
-            else:  # assumes one person in the scene
-                client.publish(
-                    "person/duration", json.dumps({"duration": monotonic() - start})
-                )
+    # (real-time) queued frames add latency
+    stage_queue_size = 1 if realtime else queue_size
+    # Get and open the video capture (a device index for a webcam)
+    input_feeder = InputFeeder(
+        "cam" if str(input_file).isdigit() else "video",
+        input_file,
+        backend=capture_backend,
+        # (ffmpeg) decoded at the output dimension: the output frames are not resized
+        # again
+        dimension=output_dimension,
+        # (ffmpeg) the ring covers the pipeline in-flight frames: the stages queues and
+        # threads (with the
+        # source and the consumer ones)
+        buffers=7 * stage_queue_size
+        + preprocess_threads
+        + async_depth
+        + annotate_threads
+        + 5,
+    )
+    input_feeder.load_data()
+    # (video files stream timestamps) recorded on the wall clock timeline from the run
+    # start
+    recorder = (
+        timeseries.stream(stream_name, offset=0.0 if input_feeder.live else time())
+        if timeseries is not None
+        else None
+    )
+    # counts and durations are computed on the frames (stream or wall clock) timestamps
+    if counting not in ("presence", "tracking"):
+        raise ValueError(f"unknown counting mode {counting} (presence or tracking)")
+    tracking = counting == "tracking"
+    presence_counter = (
+        TrackCounter()
+        if tracking
+        else PresenceCounter(
+            frames_window=frames_window,
+            threshold=threshold,
+            exit_threshold=threshold - hysteresis,
+        )
+    )
+    latency_budget = (
+        LatencyBudget(target_latency, fps=input_feeder.fps) if realtime else None
+    )
+    regions = parse_regions(roi)
+    motion_gate = (
+        MotionGate(
+            pixel_threshold=motion_threshold,
+            min_changed_ratio=motion_min_changed,
+            refresh_interval=motion_refresh,
+            regions=regions,
+        )
+        if motion_gating
+        else None
+    )
+    propagator = (
+        DetectionPropagator(
+            min_interval=min(min_detection_interval, detection_interval),
+            max_interval=detection_interval,
+        )
+        if detection_interval > 1
+        else None
+    )
+    counter_stages = CounterStages(
+        pedestrian_detection,
+        presence_counter,
+        publisher,
+        output_sinks,
+        output_dimension,
+        min_confidence=0.85,
+        latency_budget=latency_budget,
+        # single person: keep the biggest detection, multi-person: suppress the
+        # non-maxima
+        top_k=None if tracking else 1,
+        nms_threshold=nms_threshold if tracking else None,
+        # the stages latency is measured for the metrics
+        measure=bool(metrics_port or metrics_interval),
+        regions=inference_regions(regions, tiles, overlap=tile_overlap),
+        motion_gate=motion_gate,
+        propagator=propagator,
+        recorder=recorder,
+    )
 
-        for pedestrian in pedestrians:
-            output_frame = cv2.resize(
-                pedestrian.draw(output_frame),
-                (output_dimension.width, output_dimension.height),
+    # Process frames until the video ends, or process is exited: capture, preprocessing,
+    # inference (up to
+    # async_depth frames in flight), counting, annotation and writing run as overlapping
+    # (threaded) stages
+    pipeline = capture_stream(
+        input_feeder.realtime_frames(latency_budget)
+        if realtime
+        else input_feeder.frames(),
+        counter_stages.stages(
+            preprocess_threads=preprocess_threads,
+            infer_threads=async_depth,
+            annotate_threads=annotate_threads,
+            queue_size=stage_queue_size,
+        ),
+    )
+    # live metrics (HTTP endpoint and/or periodic MQTT summaries) and profiler
+    background = []
+    if metrics_port or metrics_interval:
+        registry = MetricsRegistry()
+        counter_stages.register_metrics(registry, pipeline)
+        registry.gauge(
+            "dropped_frames",
+            "dropped (stale or unread) frames",
+            function=lambda: input_feeder.dropped_frames
+            + (latency_budget.stale_frames if latency_budget is not None else 0),
+        )
+        if metrics_port:
+            background.append(MetricsServer(registry, port=metrics_port).start())
+        if metrics_interval:
+            background.append(
+                PeriodicTask(
+                    metrics_interval,
+                    lambda: publisher.publish_stats(
+                        registry.snapshot(), topic="metrics"
+                    ),
+                    name="metrics-publisher",
+                ).start()
             )
+    if recorder is not None and occupancy_interval:
+        store = TimeSeriesStore(timeseries_directory)
 
-        client.publish("person", json.dumps({"count": len(pedestrians)}))
-
-        # write output_frame to an mp4 video output
-        video_writer.write(cv2.cvtColor(output_frame, cv2.COLOR_BGR2RGB))
+        def publish_occupancy():
+            if recorder.last_timestamp is not None:
+                publisher.publish_stats(
+                    store.occupancy(stream_name, start=recorder.last_timestamp - 3600),
+                    topic="occupancy",
+                )
 
-        # Send frame to the stdout to pipe to ffmpeg server
-        sys.stdout.buffer.write(cv2.cvtColor(output_frame, cv2.COLOR_BGR2RGB))
-        sys.stdout.flush()
+        background.append(
+            PeriodicTask(
+                occupancy_interval, publish_occupancy, name="occupancy-publisher"
+            ).start()
+        )
+    if profile:
+        background.append(
+            SamplingProfiler(
+                os.path.join(output_directory, "profile.folded"),
+                interval=profile_interval,
+            ).start()
+        )
 
-        # Break if escape key pressed
-        if key_pressed == 27:
+    state = None
+    first_frame_at = None
+    processed_frames = 0
+    for state in pipeline:
+        processed_frames += 1
+        if first_frame_at is None:
+            first_frame_at = time()
+        if latency_budget is not None:
+            latency_budget.observe(
+                monotonic() - state.captured_at,
+                inference_time=pedestrian_detection.prediction_stats.last / async_depth,
+            )
+        # Break if escape key pressed (in the window) or enough frames were processed
+        if (window_sink is not None and window_sink.closed) or (
+            max_frames and processed_frames >= max_frames
+        ):
             break
 
-    # release the output (video_writer)
-    video_writer.release()
-    # release the capture and destroy any OpenCV windows
-    cap.release()
-    cv2.destroyAllWindows()
-    # Disconnect from MQTT
+    for service in background:
+        service.stop()
+    # release the capture
+    input_feeder.close()
+    if tracking and state is not None:
+        # the persons still in the scene leave at the end of the stream
+        for presence_event in presence_counter.flush(state.timestamp):
+            publisher.publish_duration(presence_event.duration)
+            if recorder is not None:
+                recorder.add_event(presence_event)
+    if timeseries is not None:
+        # write the queued records and the last minutes rollups
+        timeseries.stop()
+
+    # release the outputs (video_writer, window)
+    output_sinks.close()
+    # Flush the pending messages and disconnect from MQTT
+    publisher.stop()
     client.disconnect()
 
+    # startup timings (seconds from the process start)
+    startup = {
+        "imports": imported_at - STARTED_AT if STARTED_AT is not None else None,
+        "model_loading": pedestrian_detection.loading_time,
+        "first_frame": (
+            first_frame_at - STARTED_AT
+            if first_frame_at and STARTED_AT is not None
+            else None
+        ),
+        "first_frame_at": first_frame_at,
+    }
+    if startup_report:
+        with open(startup_report, "w") as startup_output:
+            json.dump(
+                {**startup, "loading": pedestrian_detection.loading_summary},
+                startup_output,
+            )
+
     # saving perf. statistics/summary
-    perf_stats = {"precision": model_precision, "average_prediction_time": {}}
-    if pedestrian_detection.prediction_time:
+    perf_stats = {
+        "precision": model_precision,
+        "average_prediction_time": {},
+        "realtime": realtime,
+        "loading": pedestrian_detection.loading_summary,
+        "startup": startup,
+        "dropped_frames": input_feeder.dropped_frames
+        + (latency_budget.stale_frames if latency_budget is not None else 0),
+    }
+    if latency_budget is not None:
+        perf_stats["sampling_rate"] = latency_budget.sampling_rate
+    if propagator is not None:
+        perf_stats["propagation"] = {
+            "detected_frames": propagator.detected_frames,
+            "propagated_frames": propagator.propagated_frames,
+            "detection_interval": propagator.interval,
+            # (frames) the scheduling runs ahead of the propagation by up to this lag
+            "max_scheduling_lag": CounterStages.propagation_lag(pipeline.stages),
+        }
+    if timeseries is not None:
+        perf_stats["timeseries"] = timeseries.summary()
+    if motion_gate is not None:
+        perf_stats["motion_gate"] = motion_gate.summary(
+            pedestrian_detection.prediction_stats.mean
+        )
+    if pedestrian_detection.prediction_stats.count:
         perf_stats["average_prediction_time"][
             pedestrian_detection.model_name
-        ] = np.mean(pedestrian_detection.prediction_time)
+        ] = pedestrian_detection.prediction_stats.mean
+        perf_stats["prediction_time"] = pedestrian_detection.prediction_stats.summary()
     with open(
         os.path.join(
             output_directory,
@@ -161,5 +507,1108 @@ def infer(
         json.dump(perf_stats, perf_output)
 
 
+@command
+def multi_stream(
+    manifest="./streams.json",
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    output_directory="./output/",
+    workers=0,
+    batch_size=1,
+    max_batch_wait=0.01,
+    report_interval=5.0,
+    heartbeat=5.0,
+    model_cache="./model_cache",
+    model_cache_size=1024,
+    timeseries_directory="",
+):
+    """Run many input streams (files, RTSP urls or devices) from one process sharing the
+    loaded networks, publish each stream statistics to its own (namespaced) MQTT topics
+    ex: door-1/person, door-1/person/duration
+
+    :param manifest: streams manifest (json) file see streams.example.json
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: default model name (a stream can set its own)
+    :param model_precision: model precision (default FP16)
+    :param output_directory: output directory for the FPS report
+    :param workers: maximum concurrent inferences per model, the shared network infer
+        requests (0 for one per stream sharing it), each stream is captured and counted
+        by its own thread
+    :param batch_size: batch the frames across the streams (> 1) reshaping the network
+        to this batch size
+    :param max_batch_wait: maximum waiting time (seconds) for a partial batch
+    :param report_interval: per-stream and aggregate FPS reporting interval (seconds)
+    :param heartbeat: MQTT counts are published when they change or every heartbeat
+        seconds
+    :param model_cache: compiled networks cache directory ("" to compile the models on
+        every start)
+    :param model_cache_size: compiled networks cache maximum size (MB)
+    :param timeseries_directory: record each stream counts and entries/exits (wall clock
+        timestamps) to this time series store directory (ex: ./output/timeseries/,
+        disabled by default), see timeseries_report
+    """
+    ensure_output_directory(output_directory=output_directory)
+    stream_manifest = StreamManifest.from_file(manifest)
+
+    client = mqtt.Client()
+    client.connect(MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE_INTERVAL)
+    publisher = CountPublisher(client, heartbeat=heartbeat).start()
+
+    # load each (distinct) model once, with enough infer requests for the streams
+    # sharing it
+    streams_per_model: Dict[str, int] = {}
+    for stream in stream_manifest.streams:
+        stream_model = stream.model or model
+        streams_per_model[stream_model] = streams_per_model.get(stream_model, 0) + 1
+    detectors = {}
+    batchers = {}
+    for model_name, streams in streams_per_model.items():
+        detectors[model_name] = PedestrianDetection(
+            model_name=model_name,
+            model_directory=f"{models_root_dir}/{model_name}/{model_precision}",
+            num_requests=1 if batch_size > 1 else min(streams, workers or streams),
+            batch_size=batch_size,
+            cache_directory=model_cache or None,
+            cache_max_bytes=model_cache_size << 20,
+        )
+        detectors[model_name].load_model()
+        if batch_size > 1:
+            batchers[model_name] = detectors[model_name].batcher(
+                max_wait=max_batch_wait
+            )
+
+    runner = MultiStreamRunner(
+        stream_manifest,
+        detectors,
+        publisher,
+        default_model=model,
+        batchers=batchers,
+        report_interval=report_interval,
+        timeseries=TimeSeriesWriter(timeseries_directory).start()
+        if timeseries_directory
+        else None,
+    )
+    report = runner.run()
+    for batcher in batchers.values():
+        batcher.close()
+    if runner.timeseries is not None:
+        runner.timeseries.stop()
+        report["timeseries"] = runner.timeseries.summary()
+    publisher.stop()
+    client.disconnect()
+
+    report["precision"] = model_precision
+    report["batch_size"] = batch_size
+    report["loading"] = [detector.loading_summary for detector in detectors.values()]
+    with open(
+        os.path.join(output_directory, "multi_stream_summary.json"), "w"
+    ) as report_output:
+        json.dump(report, report_output)
+
+
+@command
+def timeseries_report(
+    timeseries_directory="./output/timeseries/",
+    stream="",
+    start=None,
+    end=None,
+    bucket=60,
+    output_file="",
+):
+    """Aggregate the time series store (from its per-minute rollups, the frames are not
+    read): each stream occupancy per time bucket (mean/max occupancy, entries, exits,
+    mean confidence and dwell time) and its dwell times histogram
+
+    :param timeseries_directory: the time series store directory
+    :param stream: the stream to report ("" for all the streams)
+    :param start: range start timestamp (seconds, wall clock: epoch time)
+    :param end: range end timestamp (excluded)
+    :param bucket: occupancy buckets length (seconds, a multiple of a minute)
+    :param output_file: save the report to this (json) file ("" to print it only)
+    """
+    store = TimeSeriesStore(timeseries_directory)
+    streams = [stream] if stream else store.streams()
+    if not streams:
+        raise ValueError(f"no stream found in {timeseries_directory}")
+    start = float(start) if start is not None else -np.inf
+    end = float(end) if end is not None else np.inf
+    report = {
+        name: {
+            "occupancy": store.occupancy(
+                name, start=start, end=end, bucket=float(bucket)
+            ),
+            "dwell_histogram": store.dwell_histogram(name, start=start, end=end),
+        }
+        for name in streams
+    }
+    if output_file:
+        with open(output_file, "w") as report_output:
+            json.dump(report, report_output, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+@command
+def publisher_benchmark(
+    streams=16,
+    fps=30.0,
+    duration=10.0,
+    change_probability=0.02,
+    heartbeat=5.0,
+    flush_interval=0.2,
+    output_directory="./output/",
+):
+    """Measure the (coalescing) publisher against a local in-process broker stand-in:
+    simulated per frame counts of several streams are published for duration seconds
+
+    :param streams: number of simulated streams
+    :param fps: frames per second (per stream)
+    :param duration: simulation duration (seconds)
+    :param change_probability: probability for a stream count to change on a frame
+    :param heartbeat: counts heartbeat (seconds)
+    :param flush_interval: publisher batches interval (seconds)
+    :param output_directory: output directory for the benchmark summary
+    """
+    ensure_output_directory(output_directory=output_directory)
+    broker = InProcessBroker()
+    publisher = CountPublisher(
+        broker, heartbeat=heartbeat, flush_interval=flush_interval
+    ).start()
+    counts = [0] * streams
+    frames = 0
+    start = monotonic()
+    while monotonic() - start < duration:
+        for stream in range(streams):
+            if random() < change_probability:
+                if counts[stream]:
+                    publisher.publish_duration(
+                        random() * 10, namespace=f"stream-{stream}"
+                    )
+                counts[stream] = 1 - counts[stream]
+            publisher.publish_count(counts[stream], namespace=f"stream-{stream}")
+        frames += 1
+        sleep(max(0.0, start + frames / fps - monotonic()))
+    publisher.stop()
+    elapsed = monotonic() - start
+
+    summary = {
+        "frames": frames * streams,
+        "per_frame_messages_per_second": frames * streams / elapsed,
+        "messages": broker.published,
+        "messages_per_second": broker.published / elapsed,
+        "dropped_messages": publisher.dropped_messages,
+        "publish_latency": publisher.publish_latency.summary(),
+    }
+    print(json.dumps(summary, indent=2))
+    with open(
+        os.path.join(output_directory, "publisher_benchmark.json"), "w"
+    ) as summary_output:
+        json.dump(summary, summary_output)
+
+
+@command
+def preprocessing_benchmark(
+    input_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    frames=200,
+    input_height=384,
+    input_width=672,
+    output_directory="./output/",
+):
+    """Compare the per frame latency and allocations of the former preprocessing (full
+    frame color conversion, copy and resize/transpose allocations) and of the
+    preallocated buffers one, exits with an error when their model inputs differ
+
+    :param input_file: video to take the frames from
+    :param frames: number of frames
+    :param input_height: model input height (default pedestrian-detection-adas-0002)
+    :param input_width: model input width
+    :param output_directory: output directory for the benchmark summary
+    """
+    ensure_output_directory(output_directory=output_directory)
+    input_feeder = InputFeeder("video", input_file)
+    input_feeder.load_data()
+    captured = []
+    for timestamped in input_feeder.frames():
+        captured.append(timestamped.frame)
+        if len(captured) == frames:
+            break
+    input_feeder.close()
+    input_shape = (1, 3, input_height, input_width)
+
+    def former_preprocessing(frame: np.ndarray) -> np.ndarray:
+        image = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        return preprocess_image_input(image.copy(), input_shape)
+
+    preprocessor = ImagePreprocessor(input_shape, swap_rb=True)
+
+    def buffered_preprocessing(frame: np.ndarray):
+        with preprocessor.prepared(frame) as to_infer:
+            return to_infer
+
+    # same model inputs
+    same_inputs = bool(
+        np.array_equal(
+            former_preprocessing(captured[0]), buffered_preprocessing(captured[0])
+        )
+    )
+    summary = {
+        "same_inputs": same_inputs,
+        "frames": len(captured),
+        "frame_shape": list(captured[0].shape),
+        "input_shape": list(input_shape),
+        "former": profile_preprocessing(former_preprocessing, captured),
+        "preallocated": profile_preprocessing(buffered_preprocessing, captured),
+        "allocated_buffers": preprocessor.allocated_buffers,
+    }
+    print(json.dumps(summary, indent=2))
+    with open(
+        os.path.join(output_directory, "preprocessing_benchmark.json"), "w"
+    ) as summary_output:
+        json.dump(summary, summary_output)
+    if not same_inputs:
+        LOGGER.error(
+            "the preallocated buffers preprocessing model inputs differ from the "
+            "former ones"
+        )
+        sys.exit(1)
+
+
+@command
+def benchmark(
+    models_root_dir="./models/intel",
+    models_file="models.txt",
+    precisions="FP16,FP32",
+    async_depths="1,2,4",
+    inference_threads="0",
+    input_file="../ffmpeg/data/test_video.mp4",
+    frames=300,
+    warmup=10,
+    repeats=3,
+    counting="presence",
+    encode=True,
+    baseline="",
+    tolerance=0.05,
+    output_directory="./output/",
+):
+    """Replay a video through the counter pipeline for each (model, precision, async
+    depth, inference threads) combination, each run in its own process, and save the per
+    stage latencies (p50/p95/p99), FPS, CPU utilization and peak RSS as JSON
+    (benchmark.json)
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param models_file: models list (one model name per line)
+    :param precisions: comma separated model precisions
+    :param async_depths: comma separated numbers of in-flight inference requests
+    :param inference_threads: comma separated OpenVino CPU threads numbers (0 for the
+        plugin default)
+    :param input_file: replayed video
+    :param frames: replayed frames per run
+    :param warmup: (excluded) warm up inferences per run
+    :param repeats: repeats per run (the median FPS run is reported)
+    :param counting: "presence" or "tracking" counting
+    :param encode: annotate and encode the output video (--no_encode to only measure the
+        inference path)
+    :param baseline: a previous benchmark.json to compare with (FPS regressions)
+    :param tolerance: relative FPS loss reported as a regression
+    :param output_directory: output directory for the benchmark report
+    """
+    ensure_output_directory(output_directory=output_directory)
+    with open(models_file) as models_input:
+        models = [line.strip() for line in models_input if line.strip()]
+    runs = benchmark_matrix(
+        models,
+        [precision for precision in str(precisions).split(",") if precision],
+        [int(depth) for depth in str(async_depths).split(",")],
+        [int(threads) for threads in str(inference_threads).split(",")],
+        models_root_dir=models_root_dir,
+        input_file=input_file,
+        frames=frames,
+        warmup=warmup,
+        counting=counting,
+        encode=encode,
+        output_directory=output_directory,
+    )
+    result_file = os.path.join(output_directory, "benchmark_run.json")
+    report = {"environment": environment(), "runs": []}
+    for run in runs:
+        LOGGER.info("benchmarking %s", run.name)
+        report["runs"].append(
+            summarize_repeats(
+                [run_isolated(run, result_file) for _ in range(max(1, repeats))]
+            )
+        )
+    if baseline:
+        with open(baseline) as baseline_input:
+            report["comparison"] = compare(report, json.load(baseline_input), tolerance)
+    with open(os.path.join(output_directory, "benchmark.json"), "w") as report_output:
+        json.dump(report, report_output, indent=2)
+    for run in report["runs"]:
+        print(
+            f"{run['name']}: {run['fps_median']:.1f} FPS "
+            f"(end to end p95 {run['end_to_end']['p95']}s, "
+            f"cpu {run['cpu_utilization']:.0f}%)"
+        )
+    if any(item["regression"] for item in report.get("comparison", {}).values()):
+        sys.exit(1)
+
+
+@command
+def benchmark_run(run="", result_file="./output/benchmark_run.json"):
+    """Run a single benchmark (see benchmark) and save its JSON report
+
+    :param run: the run settings (BenchmarkRun JSON)
+    :param result_file: the run report file
+    """
+    result = run_benchmark(BenchmarkRun.parse_raw(run))
+    with open(result_file, "w") as result_output:
+        json.dump(result, result_output)
+
+
+@command
+def startup_benchmark(
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    input_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    repeats=5,
+    budget=0.0,
+    output_directory="./output/",
+):
+    """Measure the time from the process start to the first inferred frame: headless
+    infer processes (without any output nor MQTT broker) are started and stopped after
+    their first frame
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param input_file: input video
+    :param repeats: number of started processes (the first one may compile the model:
+        cold cache)
+    :param budget: maximum (median) seconds to the first frame, exits with an error
+        beyond it (0 to disable)
+    :param output_directory: output directory for the benchmark summary
+    """
+    ensure_output_directory(output_directory=output_directory)
+    report_file = os.path.join(output_directory, "startup_run.json")
+    runs = []
+    for _ in range(max(1, repeats)):
+        spawned_at = time()
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "infer",
+                f"--models_root_dir={models_root_dir}",
+                f"--model={model}",
+                f"--model_precision={model_precision}",
+                f"--input_file={input_file}",
+                f"--output_directory={output_directory}",
+                "--video_output=",
+                "--no_stdout_output",
+                "--no_mqtt_broker",
+                "--max_frames=1",
+                f"--startup_report={report_file}",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(report_file) as report_input:
+            run = json.load(report_input)
+        # (including the interpreter start)
+        run["spawn_to_first_frame"] = run["first_frame_at"] - spawned_at
+        runs.append(run)
+
+    first_frames = [run["spawn_to_first_frame"] for run in runs]
+    # (unavailable without the process start time)
+    imports = [run["imports"] for run in runs if run["imports"] is not None]
+    summary = {
+        "runs": runs,
+        "median_spawn_to_first_frame": statistics.median(first_frames),
+        "median_imports": statistics.median(imports) if imports else None,
+        "median_model_loading": statistics.median(run["model_loading"] for run in runs),
+        "budget": budget or None,
+    }
+    print(
+        json.dumps(
+            {key: value for key, value in summary.items() if key != "runs"}, indent=2
+        )
+    )
+    with open(
+        os.path.join(output_directory, "startup_benchmark.json"), "w"
+    ) as summary_output:
+        json.dump(summary, summary_output)
+    if budget and summary["median_spawn_to_first_frame"] > budget:
+        sys.exit(1)
+
+
+@command
+def autotune(
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    device="CPU",
+    input_file="../ffmpeg/data/test_video.mp4",
+    streams="1,2,4,CPU_THROUGHPUT_AUTO",
+    inference_threads="0",
+    async_depths="1,2,4,8",
+    latency_ceiling=0.2,
+    sample_frames=30,
+    frames=200,
+    warmup=10,
+    tuning_profile="",
+    output_directory="./output/",
+):
+    """Sweep the inference streams, threads (CPU) and async depths on a sample clip,
+    select the best throughput configuration under a latency ceiling and save it in the
+    host tuning profile (applied when the model is loaded without an explicit
+    configuration)
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param device: inference device
+    :param input_file: sample clip
+    :param streams: comma separated CPU_THROUGHPUT_STREAMS values (ex: 2 or
+        CPU_THROUGHPUT_AUTO)
+    :param inference_threads: comma separated CPU_THREADS_NUM values (0 for the plugin
+        default)
+    :param async_depths: comma separated numbers of in-flight inference requests
+    :param latency_ceiling: maximum p95 inference request latency (seconds)
+    :param sample_frames: sample clip frames (preprocessed once: the inference alone is
+        measured)
+    :param frames: measured inferences per configuration
+    :param warmup: (excluded) warm up inferences per configuration
+    :param tuning_profile: tuning profile file ("" for this host default profile)
+    :param output_directory: output directory for the sweep report (autotune.json)
+    """
+    ensure_output_directory(output_directory=output_directory)
+    model_directory = f"{models_root_dir}/{model}/{model_precision}"
+    input_feeder = InputFeeder("video", input_file)
+    input_feeder.load_data()
+    clip = [
+        timestamped.frame
+        for timestamped in itertools.islice(input_feeder.frames(), sample_frames)
+    ]
+    input_feeder.close()
+    inputs = []
+
+    def load(candidate):
+        detection = PedestrianDetection(
+            model_name=model,
+            model_directory=model_directory,
+            device=device,
+            plugin_config=candidate.plugin_config,
+            num_requests=candidate.num_requests,
+        )
+        detection.load_model()
+        if not inputs:
+            inputs.extend(detection.preprocess_input(frame) for frame in clip)
+        return detection
+
+    results = sweep(
+        load,
+        candidates(
+            device,
+            [stream for stream in str(streams).split(",") if stream],
+            [int(threads) for threads in str(inference_threads).split(",")],
+            [int(depth) for depth in str(async_depths).split(",")],
+        ),
+        inputs,
+        frames=frames,
+        warmup=warmup,
+    )
+    selected = select(results, latency_ceiling)
+    profile = TuningProfile.load(tuning_profile or None) or TuningProfile(
+        host=host_id()
+    )
+    profile.update(model_key(model_directory, model, device), selected)
+    profile.save(tuning_profile or None)
+    with open(os.path.join(output_directory, "autotune.json"), "w") as report_output:
+        json.dump(
+            {
+                "environment": environment(),
+                "latency_ceiling": latency_ceiling,
+                "selected": selected.dict(),
+                "results": [result.dict() for result in results],
+            },
+            report_output,
+            indent=2,
+        )
+    print(
+        f"{model} ({device}): {selected.plugin_config} "
+        f"x{selected.num_requests} requests, "
+        f"{selected.fps or 0.0:.1f} FPS (p95 {selected.latency_p95 or 0.0:.3f}s)"
+    )
+
+
+def precision_report(
+    models_root_dir: str,
+    model: str,
+    reference_precision: str,
+    precision: str,
+    input_file: str,
+    frames: int,
+    output_directory: str,
+    **validation,
+) -> Dict:
+    """Validate a model precision against the reference one on the input_file first
+    frames and save the report
+    (output_directory/precision_validation_<model>_<precision>.json)"""
+    detections = {}
+    for model_precision in (reference_precision, precision):
+        detections[model_precision] = PedestrianDetection(
+            model_name=model,
+            model_directory=f"{models_root_dir}/{model}/{model_precision}",
+            swap_rb=True,
+            # (same configuration for both precisions)
+            tuning=False,
+        )
+        detections[model_precision].load_model()
+    input_feeder = InputFeeder("video", input_file)
+    input_feeder.load_data()
+    report = precision_validation.validate_precision(
+        detections[reference_precision],
+        detections[precision],
+        itertools.islice(input_feeder.frames(), frames)
+        if frames
+        else input_feeder.frames(),
+        **validation,
+    )
+    input_feeder.close()
+    report["input_file"] = input_file
+    report["environment"] = environment()
+    with open(
+        os.path.join(
+            output_directory, f"precision_validation_{model}_{precision}.json"
+        ),
+        "w",
+    ) as report_output:
+        json.dump(report, report_output, indent=2)
+    print(
+        f"{model} {precision} vs {reference_precision}: "
+        f"recall {report['agreement']['recall']}, "
+        f"precision {report['agreement']['precision']}, total count "
+        f"{report['counts']['quantized']['total_count']} (reference "
+        f"{report['counts']['reference']['total_count']}), "
+        f"speedup {report['speedup'] or 0.0:.2f}x: "
+        f"{'accepted' if report['accepted'] else 'rejected'}"
+    )
+    return report
+
+
+@command
+def quantize_models(
+    models_root_dir="./models/intel",
+    models_file="models.txt",
+    model="",
+    reference_precision="FP32",
+    input_files="./data/Pedestrian_Detect_2_1_1.mp4",
+    calibration_frames=300,
+    preset="performance",
+    device="CPU",
+    validate=True,
+    validation_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    validation_frames=0,
+    counting="presence",
+    min_agreement=0.95,
+    dwell_tolerance=0.5,
+    output_directory="./output/",
+):
+    """Post-training quantize (INT8) the models calibrated on frames sampled from local
+    videos, save them next to their FP16/FP32 versions (<models_root_dir>/<model>/INT8,
+    used with --model_precision=INT8) and validate them against the reference precision
+    (detections agreement, counts and dwell times, speedup)
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param models_file: models list (one model name per line)
+    :param model: a single model to quantize (instead of the models_file ones)
+    :param reference_precision: the quantized (and validation reference) model precision
+    :param input_files: comma separated calibration videos
+    :param calibration_frames: calibration frames (sampled evenly across the videos)
+    :param preset: "performance" (symmetric) or "mixed" (asymmetric activations)
+        quantization
+    :param device: quantization target device
+    :param validate: validate the quantized models (--no_validate to skip it), exits
+        with an error when a model is rejected
+    :param validation_file: validation video (its consecutive frames are replayed)
+    :param validation_frames: replayed validation frames (0 for the whole video)
+    :param counting: "presence" or "tracking" validation counting
+    :param min_agreement: minimum detections recall and precision (against the
+        reference) to accept
+    :param dwell_tolerance: maximum mean dwell time difference (seconds) to accept
+    :param output_directory: output directory for the validation reports
+    """
+    ensure_output_directory(output_directory=output_directory)
+    if model:
+        models = [model]
+    else:
+        with open(models_file) as models_input:
+            models = [line.strip() for line in models_input if line.strip()]
+    frames = list(
+        sample_frames(
+            [input_file for input_file in str(input_files).split(",") if input_file],
+            calibration_frames,
+        )
+    )
+    rejected = []
+    for model_name in models:
+        reference = PedestrianDetection(
+            model_name=model_name,
+            model_directory=f"{models_root_dir}/{model_name}/{reference_precision}",
+            device=device,
+            tuning=False,
+        )
+        reference.load_model()
+        quantize(
+            reference.model_directory,
+            model_name,
+            f"{models_root_dir}/{model_name}/{INT8_PRECISION}",
+            # (the inference preprocessing: see infer)
+            CalibrationFrames(frames, reference.expected_input_shape, swap_rb=True),
+            device=device,
+            preset=preset,
+        )
+        if validate:
+            report = precision_report(
+                models_root_dir,
+                model_name,
+                reference_precision,
+                INT8_PRECISION,
+                validation_file,
+                validation_frames,
+                output_directory,
+                counting=counting,
+                min_agreement=min_agreement,
+                dwell_tolerance=dwell_tolerance,
+            )
+            if not report["accepted"]:
+                rejected.append(model_name)
+    if rejected:
+        LOGGER.error("rejected INT8 models: %s", ", ".join(rejected))
+        sys.exit(1)
+
+
+@command
+def validate_precision(
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    reference_precision="FP32",
+    precision=INT8_PRECISION,
+    input_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    frames=0,
+    counting="presence",
+    min_agreement=0.95,
+    dwell_tolerance=0.5,
+    output_directory="./output/",
+):
+    """Compare a model precision (ex: INT8) to the reference one on the same frames:
+    detections agreement, counts and dwell times, and speedup, exits with an error when
+    rejected
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param reference_precision: reference model precision
+    :param precision: validated model precision
+    :param input_file: replayed video (its consecutive frames)
+    :param frames: replayed frames (0 for the whole video)
+    :param counting: "presence" or "tracking" counting
+    :param min_agreement: minimum detections recall and precision (against the
+        reference) to accept
+    :param dwell_tolerance: maximum mean dwell time difference (seconds) to accept
+    :param output_directory: output directory for the validation report
+    """
+    ensure_output_directory(output_directory=output_directory)
+    report = precision_report(
+        models_root_dir,
+        model,
+        reference_precision,
+        precision,
+        input_file,
+        frames,
+        output_directory,
+        counting=counting,
+        min_agreement=min_agreement,
+        dwell_tolerance=dwell_tolerance,
+    )
+    if not report["accepted"]:
+        sys.exit(1)
+
+
+@command
+def motion_gate_validation(
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    input_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    frames=0,
+    counting="presence",
+    roi="",
+    motion_threshold=25,
+    motion_min_changed=0.002,
+    motion_refresh=1.0,
+    dwell_tolerance=0.5,
+    output_directory="./output/",
+):
+    """Measure the counting error introduced by the motion gating (see infer
+    --motion_gating): the frames are inferred (the reference) and motion gated, both
+    detections are counted and compared, with the skip ratio and the saved inference
+    compute (output_directory/motion_gate_validation.json), exits with an error when the
+    total count or the mean dwell time (beyond dwell_tolerance seconds) changes
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param input_file: replayed video (its consecutive frames)
+    :param frames: replayed frames (0 for the whole video)
+    :param counting: "presence" or "tracking" counting
+    :param roi: ";" separated regions of interest (see infer)
+    :param motion_threshold: minimum (grayscale) difference of a changed pixel
+    :param motion_min_changed: minimum changed pixels ratio (in the regions of interest)
+    :param motion_refresh: maximum time (seconds) without inference
+    :param dwell_tolerance: maximum mean dwell time difference (seconds) to accept
+    :param output_directory: output directory for the validation report
+    """
+    ensure_output_directory(output_directory=output_directory)
+    regions = parse_regions(roi)
+    pedestrian_detection = PedestrianDetection(
+        model_name=model,
+        model_directory=f"{models_root_dir}/{model}/{model_precision}",
+        swap_rb=True,
+    )
+    pedestrian_detection.load_model()
+    gate = MotionGate(
+        pixel_threshold=motion_threshold,
+        min_changed_ratio=motion_min_changed,
+        refresh_interval=motion_refresh,
+        regions=regions,
+    )
+    input_feeder = InputFeeder("video", input_file)
+    input_feeder.load_data()
+    replayed = input_feeder.frames()
+    if frames:
+        replayed = itertools.islice(replayed, frames)
+
+    report = validate_skipping(
+        pedestrian_detection,
+        replayed,
+        motion_gated(gate),
+        counting=counting,
+        regions=regions,
+        dwell_tolerance=dwell_tolerance,
+    )
+    input_feeder.close()
+    report["motion_gate"] = gate.summary(pedestrian_detection.prediction_stats.mean)
+    report["input_file"] = input_file
+    with open(
+        os.path.join(output_directory, "motion_gate_validation.json"), "w"
+    ) as report_output:
+        json.dump(report, report_output, indent=2)
+    print(
+        f"skip ratio {report['skip_ratio'] or 0.0:.2f}, estimated speedup "
+        f"{report['estimated_speedup'] or 0.0:.2f}x, "
+        f"total count {report['counts']['skipping']['total_count']} "
+        f"(every frame {report['counts']['reference']['total_count']}): "
+        f"{'accepted' if report['accepted'] else 'rejected'}"
+    )
+    if not report["accepted"]:
+        sys.exit(1)
+
+
+@command
+def propagation_validation(
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    input_files="./data/Pedestrian_Detect_2_1_1.mp4,../ffmpeg/data/test_video.mp4",
+    frames=0,
+    counting="presence",
+    detection_interval=8,
+    min_detection_interval=1,
+    dwell_tolerance=0.5,
+    output_directory="./output/",
+):
+    """Measure the throughput gain against the count accuracy of the detect every k
+    frames mode (see infer
+    --detection_interval) on local videos: each video is inferred on every frame (the
+    reference) and with the propagated detections in between the detector frames, both
+    are counted and compared (output_directory/propagation_validation.json), exits with
+    an error when a video counts change
+
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param input_files: comma separated replayed videos (their consecutive frames)
+    :param frames: replayed frames per video (0 for the whole videos)
+    :param counting: "presence" or "tracking" counting
+    :param detection_interval: maximum detector frames interval
+    :param min_detection_interval: minimum detector frames interval
+    :param dwell_tolerance: maximum mean dwell time difference (seconds) to accept
+    :param output_directory: output directory for the validation report
+    """
+    ensure_output_directory(output_directory=output_directory)
+    pedestrian_detection = PedestrianDetection(
+        model_name=model,
+        model_directory=f"{models_root_dir}/{model}/{model_precision}",
+        swap_rb=True,
+    )
+    pedestrian_detection.load_model()
+    videos = {}
+    for input_file in (
+        input_file for input_file in str(input_files).split(",") if input_file
+    ):
+        input_feeder = InputFeeder("video", input_file)
+        input_feeder.load_data()
+        replayed = input_feeder.frames()
+        if frames:
+            replayed = itertools.islice(replayed, frames)
+        propagator = DetectionPropagator(
+            min_interval=min(min_detection_interval, detection_interval),
+            max_interval=detection_interval,
+        )
+        # (per video inference time)
+        pedestrian_detection.prediction_stats = LatencyStats()
+        videos[input_file] = validate_skipping(
+            pedestrian_detection,
+            replayed,
+            propagated(propagator),
+            counting=counting,
+            dwell_tolerance=dwell_tolerance,
+        )
+        videos[input_file]["final_detection_interval"] = propagator.interval
+        input_feeder.close()
+        video = videos[input_file]
+        print(
+            f"{input_file}: {1 - (video['skip_ratio'] or 0.0):.2f} detector frames "
+            f"ratio, estimated speedup {video['estimated_speedup'] or 0.0:.2f}x, "
+            f"total count {video['counts']['skipping']['total_count']} (every frame "
+            f"{video['counts']['reference']['total_count']}): "
+            f"{'accepted' if video['accepted'] else 'rejected'}"
+        )
+    report = {
+        "detection_interval": [min_detection_interval, detection_interval],
+        "videos": videos,
+        "accepted": all(video["accepted"] for video in videos.values()),
+    }
+    with open(
+        os.path.join(output_directory, "propagation_validation.json"), "w"
+    ) as report_output:
+        json.dump(report, report_output, indent=2)
+    if not report["accepted"]:
+        sys.exit(1)
+
+
+@command
+def offline(
+    source="./data",
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    workers=0,
+    inference_threads=0,
+    async_depth=2,
+    counting="presence",
+    frames_window=10,
+    threshold=0.7,
+    min_confidence=0.85,
+    nms_threshold=0.5,
+    model_cache="./model_cache",
+    force=False,
+    output_directory="./output/offline/",
+):
+    """Reprocess recorded videos (a directory or a glob pattern) in parallel on a
+    process pool, one model per worker, without display, MQTT nor video output: each
+    file presence/entry/exit/dwell events are saved as JSONL
+    (<name>-<hash>.events.jsonl) with its throughput statistics
+    (<name>-<hash>.stats.json). Resumable: the already processed files are skipped
+
+    :param source: videos directory (searched recursively) or glob pattern (ex:
+        "/records/2022-*/*.mp4")
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param workers: worker processes (0 for one per core)
+    :param inference_threads: OpenVino CPU threads per worker (0 to share the cores
+        between the workers)
+    :param async_depth: in-flight inference requests per worker
+    :param counting: "presence" or "tracking" counting
+    :param frames_window: presence mode smoothing window (frames)
+    :param threshold: presence mode threshold
+    :param min_confidence: detections minimum confidence
+    :param nms_threshold: tracking mode non-maxima suppression IoU threshold
+    :param model_cache: compiled networks cache directory ("" to compile the model in
+        every worker)
+    :param force: process the already processed files again
+    :param output_directory: output directory for the events, statistics and summary
+        files
+    """
+    ensure_output_directory(output_directory=output_directory)
+    paths = list_videos(source)
+    if not paths:
+        raise ValueError(f"no video found in {source}")
+    summary = run_offline(
+        OfflineJob(
+            model=model,
+            precision=model_precision,
+            models_root_dir=models_root_dir,
+            inference_threads=inference_threads,
+            async_depth=async_depth,
+            counting=counting,
+            frames_window=frames_window,
+            threshold=threshold,
+            min_confidence=min_confidence,
+            nms_threshold=nms_threshold,
+            model_cache=model_cache,
+            output_directory=output_directory,
+        ),
+        paths,
+        workers=workers,
+        force=force,
+    )
+    with open(
+        os.path.join(output_directory, "offline_summary.json"), "w"
+    ) as summary_output:
+        json.dump(summary, summary_output, indent=2)
+    print(
+        f"{summary['processed']} processed, {summary['skipped']} skipped, "
+        f"{len(summary['failed'])} failed "
+        f"files: {summary['frames']} frames at {summary['aggregate_fps']:.1f} FPS"
+    )
+    if summary["failed"]:
+        sys.exit(1)
+
+
+@command
+def sharded(
+    input_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    segments=0,
+    overlap=250,
+    inference_threads=0,
+    async_depth=2,
+    counting="presence",
+    frames_window=10,
+    threshold=0.7,
+    min_confidence=0.85,
+    nms_threshold=0.5,
+    model_cache="./model_cache",
+    force=False,
+    output_directory="./output/offline/",
+):
+    """Process one long video file split into time segments inferred in parallel worker
+    processes, the counting replayed in order on the merged detections: the same events
+    (<name>-<hash>.events.jsonl) as a sequential offline run, the statistics
+    (<name>-<hash>.stats.json) with each segment throughput
+
+    :param input_file: the video file
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param segments: time segments, one worker process each (0 for one per core)
+    :param overlap: frames seeked before each segment start (decoded up to it), at least
+        the video key frames interval
+    :param inference_threads: OpenVino CPU threads per worker (0 to share the cores
+        between the workers)
+    :param async_depth: in-flight inference requests per worker
+    :param counting: "presence" or "tracking" counting
+    :param frames_window: presence mode smoothing window (frames)
+    :param threshold: presence mode threshold
+    :param min_confidence: detections minimum confidence
+    :param nms_threshold: tracking mode non-maxima suppression IoU threshold
+    :param model_cache: compiled networks cache directory ("" to compile the model in
+        every worker)
+    :param force: process the file again when already processed
+    :param output_directory: output directory for the events and statistics files
+    """
+    ensure_output_directory(output_directory=output_directory)
+    stats = run_sharded(
+        OfflineJob(
+            model=model,
+            precision=model_precision,
+            models_root_dir=models_root_dir,
+            inference_threads=inference_threads,
+            async_depth=async_depth,
+            counting=counting,
+            frames_window=frames_window,
+            threshold=threshold,
+            min_confidence=min_confidence,
+            nms_threshold=nms_threshold,
+            model_cache=model_cache,
+            output_directory=output_directory,
+        ),
+        input_file,
+        segments=segments,
+        overlap=overlap,
+        force=force,
+    )
+    print(
+        f"{stats['frames']} frames in {len(stats['segments'])} segments "
+        f"at {stats['fps']:.1f} FPS: "
+        f"{stats['events']} events ({stats['events_file']})"
+    )
+
+
+@command
+def shard_validation(
+    input_file="./data/Pedestrian_Detect_2_1_1.mp4",
+    models_root_dir="./models/intel",
+    model="pedestrian-detection-adas-0002",
+    model_precision="FP16",
+    segments=0,
+    overlap=250,
+    counting="presence",
+    frames_window=10,
+    threshold=0.7,
+    min_confidence=0.85,
+    nms_threshold=0.5,
+    model_cache="./model_cache",
+    output_directory="./output/shard_validation/",
+):
+    """Check the sharded mode events are exactly the sequential offline run ones on a
+    video file (both runs with the same settings), the report is saved to
+    shard_validation.json and the command exits with an error on any difference
+
+    :param input_file: the video file
+    :param models_root_dir: root directory for the (xml/bin) models
+    :param model: model name
+    :param model_precision: model precision
+    :param segments: time segments (0 for one per core)
+    :param overlap: frames seeked before each segment start
+    :param counting: "presence" or "tracking" counting
+    :param frames_window: presence mode smoothing window (frames)
+    :param threshold: presence mode threshold
+    :param min_confidence: detections minimum confidence
+    :param nms_threshold: tracking mode non-maxima suppression IoU threshold
+    :param model_cache: compiled networks cache directory
+    :param output_directory: output directory for both runs outputs and the report
+    """
+    ensure_output_directory(output_directory=output_directory)
+    report = validate_sharding(
+        OfflineJob(
+            model=model,
+            precision=model_precision,
+            models_root_dir=models_root_dir,
+            counting=counting,
+            frames_window=frames_window,
+            threshold=threshold,
+            min_confidence=min_confidence,
+            nms_threshold=nms_threshold,
+            model_cache=model_cache,
+            output_directory=output_directory,
+        ),
+        input_file,
+        segments=segments,
+        overlap=overlap,
+    )
+    with open(
+        os.path.join(output_directory, "shard_validation.json"), "w"
+    ) as report_output:
+        json.dump(report, report_output, indent=2)
+    print(json.dumps(report, indent=2))
+    if not report["accepted"]:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     Run()
@@ -0,0 +1,260 @@
+"""
+ Reproducible pipeline benchmark: replay a video through the counter pipeline over a
+ matrix of models, precisions, async depths and inference threads (each run in its own
+ process)
+"""
+
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+from time import monotonic
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from counter_pipeline import CounterStages
+from counting import PresenceCounter, TrackCounter
+from openvino_utils.input_feeder import InputFeeder
+from openvino_utils.sinks import OutputSinks, VideoFileSink
+from openvino_utils.streaming_stats import LatencyStats
+from openvino_utils.utils import ImageDimension
+from openvino_utils.video_utils import capture_stream, timed
+from pedestrian_detection import PedestrianDetection
+from publisher import CountPublisher, InProcessBroker
+
+LOGGER = logging.getLogger()
+
+# reported stages (pipeline order) and the pipeline stage each one is measured on
+REPORTED_STAGES = {
+    "decode": "decode",
+    "preprocess": "preprocess",
+    "infer": "predict",
+    "decode_output": "decode_output",
+    "track": "count",
+    "render": "annotate",
+    "encode": "write",
+}
+
+
+class BenchmarkRun(BaseModel):
+    """A benchmark run (matrix cell) settings"""
+
+    model: str
+    precision: str = "FP16"
+    async_depth: int = 1
+    inference_threads: int = 0  # OpenVino CPU inference threads (0: the plugin default)
+    models_root_dir: str = "./models/intel"
+    input_file: str = "../ffmpeg/data/test_video.mp4"
+    frames: int = 300  # replayed frames (from the video start)
+    warmup: int = 10  # (excluded) warm up inferences
+    preprocess_threads: int = 1
+    annotate_threads: int = 1
+    queue_size: int = 4
+    counting: str = "presence"
+    # annotate and encode the output video (render and encode stages)
+    encode: bool = True
+    output_directory: str = "./output/"
+
+    @property
+    def name(self) -> str:
+        return (
+            f"{self.model}-{self.precision}-async{self.async_depth}"
+            f"-threads{self.inference_threads}"
+        )
+
+
+def benchmark_matrix(
+    models: Sequence[str],
+    precisions: Sequence[str],
+    async_depths: Sequence[int],
+    inference_threads: Sequence[int],
+    **settings,
+) -> List[BenchmarkRun]:
+    """The runs of the (models x precisions x async depths x inference threads)
+    matrix"""
+    return [
+        BenchmarkRun(
+            model=model,
+            precision=precision,
+            async_depth=async_depth,
+            inference_threads=threads,
+            **settings,
+        )
+        for model, precision, async_depth, threads in itertools.product(
+            models, precisions, async_depths, inference_threads
+        )
+    ]
+
+
+def run_benchmark(run: BenchmarkRun) -> Dict[str, Any]:
+    """Run a benchmark in the current process (see run_isolated)
+
+    :return: the run report: per stage latency summaries (seconds), end to end latency,
+        FPS, CPU utilization and peak RSS
+    """
+    pedestrian_detection = PedestrianDetection(
+        model_name=run.model,
+        model_directory=f"{run.models_root_dir}/{run.model}/{run.precision}",
+        num_requests=run.async_depth,
+        plugin_config=(
+            {"CPU_THREADS_NUM": str(run.inference_threads)}
+            if run.inference_threads
+            else {}
+        ),
+        swap_rb=True,
+    )
+    pedestrian_detection.load_model()
+    warmup_input = np.zeros(pedestrian_detection.expected_input_shape, dtype=np.uint8)
+    for _ in range(run.warmup):
+        pedestrian_detection.predict(warmup_input)
+    pedestrian_detection.prediction_stats = LatencyStats()
+
+    output_dimension = ImageDimension(x=1280, y=720)
+    sinks = OutputSinks(
+        [
+            VideoFileSink(
+                os.path.join(run.output_directory, "benchmark_output.mp4"),
+                output_dimension,
+            )
+        ]
+        if run.encode
+        else []
+    )
+    tracking = run.counting == "tracking"
+    counter_stages = CounterStages(
+        pedestrian_detection,
+        TrackCounter() if tracking else PresenceCounter(),
+        # a local broker stand-in: the benchmark does not depend on the network
+        CountPublisher(InProcessBroker()).start(),
+        sinks,
+        output_dimension,
+        top_k=None if tracking else 1,
+        nms_threshold=0.5 if tracking else None,
+        measure=True,
+    )
+    input_feeder = InputFeeder("video", run.input_file)
+    input_feeder.load_data()
+    decode_latency = LatencyStats()
+    end_to_end_latency = LatencyStats()
+
+    frames = 0
+    cpu_start = os.times()
+    start = monotonic()
+    for state in capture_stream(
+        timed(itertools.islice(input_feeder.frames(), run.frames), decode_latency),
+        counter_stages.stages(
+            preprocess_threads=run.preprocess_threads,
+            infer_threads=run.async_depth,
+            annotate_threads=run.annotate_threads,
+            queue_size=run.queue_size,
+        ),
+    ):
+        end_to_end_latency.add(monotonic() - state.captured_at)
+        frames += 1
+    elapsed = monotonic() - start
+    cpu_end = os.times()
+    input_feeder.close()
+    sinks.close()
+    counter_stages.publisher.stop()
+
+    measured = dict(counter_stages.stage_latency)
+    measured["decode"] = decode_latency
+    measured["predict"] = pedestrian_detection.prediction_stats
+    cpu_time = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    return {
+        "name": run.name,
+        "run": run.dict(),
+        "frames": frames,
+        "elapsed": elapsed,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "loading_time": pedestrian_detection.loading_time,
+        "stages": {
+            reported: measured[stage].summary()
+            for reported, stage in REPORTED_STAGES.items()
+            if stage in measured
+        },
+        "end_to_end": end_to_end_latency.summary(),
+        # (100% per busy core)
+        "cpu_utilization": 100 * cpu_time / elapsed if elapsed else 0.0,
+        "cpu_count": os.cpu_count(),
+        # (ru_maxrss is in kilobytes on linux)
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def run_isolated(run: BenchmarkRun, result_file: str) -> Dict[str, Any]:
+    """Run a benchmark in a fresh process (no state, cache or peak memory shared between
+    the runs)"""
+    subprocess.run(
+        [
+            sys.executable,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"),
+            "benchmark_run",
+            f"--run={run.json()}",
+            f"--result_file={result_file}",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    with open(result_file) as result_input:
+        return json.load(result_input)
+
+
+def environment() -> Dict[str, Any]:
+    """The benchmarking environment (to compare comparable reports)"""
+    try:
+        from openvino.inference_engine import get_version
+
+        openvino_version = get_version()
+    except ImportError:
+        openvino_version = None
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "openvino": openvino_version,
+    }
+
+
+def summarize_repeats(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Summarize the repeats of a run (the median FPS run is the representative one)"""
+    fps = [result["fps"] for result in results]
+    median = statistics.median(fps)
+    representative = min(results, key=lambda result: abs(result["fps"] - median))
+    return {
+        **representative,
+        "fps_median": median,
+        # relative (max - min) spread of the repeats FPS
+        "fps_spread": (max(fps) - min(fps)) / median if median else None,
+        "repeats": results,
+    }
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.05
+) -> Dict[str, Dict[str, Any]]:
+    """Compare a report to a baseline one (the runs are matched by name)
+    :param tolerance: relative FPS loss flagged as a regression
+
+    :return: {run name: {"fps_ratio": report/baseline median FPS, "regression": bool}}
+    """
+    baseline_runs = {run["name"]: run for run in baseline["runs"]}
+    comparison = {}
+    for run in report["runs"]:
+        reference: Optional[Dict[str, Any]] = baseline_runs.get(run["name"])
+        if reference is None or not reference["fps_median"]:
+            continue
+        ratio = run["fps_median"] / reference["fps_median"]
+        comparison[run["name"]] = {
+            "fps_ratio": ratio,
+            "regression": ratio < 1 - tolerance,
+        }
+    return comparison
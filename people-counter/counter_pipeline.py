@@ -0,0 +1,419 @@
+"""
+ People counter pipeline stages ((gate ->) preprocess -> infer -> count -> annotate ->
+ write) to run on top of openvino_utils.video_utils.Pipeline
+"""
+
+from dataclasses import dataclass, field
+from time import monotonic, perf_counter
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+from counting import PresenceCounter, TrackCounter
+from openvino_utils.annotation import AnnotationRenderer
+from openvino_utils.detections import detection_boxes, empty_detections
+from openvino_utils.input_feeder import LatencyBudget, TimestampedFrame
+from openvino_utils.metrics import MetricsRegistry
+from openvino_utils.motion import MotionGate
+from openvino_utils.propagation import DetectionPropagator
+from openvino_utils.regions import merge_region_rows
+from openvino_utils.sinks import OutputSinks
+from openvino_utils.streaming_stats import LatencyStats, WindowedMean
+from openvino_utils.timeseries import StreamRecorder
+from openvino_utils.utils import ImageDimension, RatioBoundingBox
+from openvino_utils.video_utils import DROP, Pipeline, Stage
+from pedestrian_detection import PedestrianDetection
+from publisher import CountPublisher
+
+
+@dataclass
+class FrameState:
+    """A frame flowing through the pipeline stages"""
+
+    frame: np.ndarray
+    timestamp: float  # stream/wall clock timestamp (seconds)
+    captured_at: float  # (monotonic) capture time
+    # model ready image (a reused buffer released once inferred), one per region of
+    # interest with regions
+    to_infer: Optional[Any] = None
+    output_frame: Optional[np.ndarray] = None  # (resized) output frame
+    pedestrians: Optional[np.recarray] = None
+    # not inferred (motion gated or between detector frames): the last detections are
+    # reused (or propagated)
+    inferred: bool = True
+    track_ids: Optional[np.ndarray] = None  # (tracking) the pedestrians track ids
+    # annotation text lines (counts, FPS)
+    overlay: List[str] = field(default_factory=list)
+
+
+class CounterStages:
+    """The people counter processing stages"""
+
+    def __init__(
+        self,
+        pedestrian_detection: PedestrianDetection,
+        presence_counter: Union[PresenceCounter, TrackCounter],
+        publisher: CountPublisher,
+        sinks: OutputSinks,
+        output_dimension: ImageDimension,
+        min_confidence: float = 0.85,
+        latency_budget: Optional[LatencyBudget] = None,
+        top_k: Optional[int] = 1,
+        nms_threshold: Optional[float] = None,
+        renderer: Optional[AnnotationRenderer] = None,
+        measure: bool = False,
+        regions: Optional[Sequence[RatioBoundingBox]] = None,
+        merge_threshold: Optional[float] = 0.5,
+        motion_gate: Optional[MotionGate] = None,
+        propagator: Optional[DetectionPropagator] = None,
+        recorder: Optional[StreamRecorder] = None,
+    ):
+        """
+        :param presence_counter: single person presence counter or multi-person (tracks)
+            counter
+        :param sinks: output sinks (the output frames are neither produced nor annotated
+            without sinks)
+        :param latency_budget: real-time mode latency budget (stale frames are dropped)
+        :param top_k: maximum number of (biggest) detections to keep per frame
+        :param nms_threshold: non-maxima suppression IoU threshold (None to disable)
+        :param renderer: output frames annotation renderer (boxes in red on the BGR
+            frames by default)
+        :param measure: measure each stage (and the detections decoding) latency (see
+            stage_latency)
+        :param regions: regions of interest (frame ratios): only their crops are
+            inferred (the whole frame when empty)
+        :param merge_threshold: cross-region duplicates non-maxima suppression IoU
+            threshold
+        :param motion_gate: only infer the changed frames (the others reuse the last
+            inferred detections)
+        :param propagator: only infer the scheduled detector frames, the detections are
+            propagated (optical flow) on the frames in between
+        :param recorder: record the counted frames and the entries/exits to a time
+            series store
+        """
+        self.pedestrian_detection = pedestrian_detection
+        self.presence_counter = presence_counter
+        self.publisher = publisher
+        self.sinks = sinks
+        self.output_dimension = output_dimension
+        self.min_confidence = min_confidence
+        self.latency_budget = latency_budget
+        self.top_k = top_k
+        self.nms_threshold = nms_threshold
+        self.renderer = renderer or AnnotationRenderer()
+        self.regions = list(regions or [])
+        self.merge_threshold = merge_threshold
+        self.motion_gate = motion_gate
+        self.propagator = propagator
+        self.recorder = recorder
+        self._last_pedestrians: Optional[np.recarray] = None
+        # per stage latency statistics (when measured)
+        self.stage_latency: Dict[str, LatencyStats] = (
+            {
+                name: LatencyStats()
+                for name in (
+                    "gate",
+                    "preprocess",
+                    "infer",
+                    "decode_output",
+                    "count",
+                    "annotate",
+                    "write",
+                )
+                if name != "gate" or motion_gate is not None or propagator is not None
+            }
+            if measure
+            else {}
+        )
+        self._frame_intervals = WindowedMean(30)
+        self._counted_at: Optional[float] = None
+        self.counted_frames = 0
+
+    def frame_state(self, captured: TimestampedFrame) -> FrameState:
+        """The captured frame state (DROP for a stale frame in real-time mode)"""
+        if self.latency_budget is not None and self.latency_budget.stale(captured):
+            return DROP
+        return FrameState(
+            frame=captured.frame,
+            timestamp=captured.timestamp,
+            captured_at=captured.captured_at,
+        )
+
+    def gate(self, captured: TimestampedFrame) -> FrameState:
+        """Decide whether the frame is inferred: changed (motion gating) and scheduled
+        detector frames (a single thread stage: the frames are gated in order)"""
+        state = self.frame_state(captured)
+        if state is DROP:
+            return DROP
+        if self.motion_gate is not None:
+            state.inferred = self.motion_gate.update(state.frame, state.timestamp)
+        if state.inferred and self.propagator is not None:
+            state.inferred = self.propagator.schedule()
+        return state
+
+    def preprocess(self, captured: Union[TimestampedFrame, FrameState]) -> FrameState:
+        # (already gated)
+        state = (
+            captured if isinstance(captured, FrameState) else self.frame_state(captured)
+        )
+        if state is DROP:
+            return DROP
+        # no full frame color conversion: the model input is channel swapped while
+        # preprocessed
+        # (see OpenVinoModel.swap_rb) and the output frame stays in the captured (BGR)
+        # order
+        if self.sinks.enabled:
+            output_size = (self.output_dimension.width, self.output_dimension.height)
+            # (ex: decoded at the output dimension) annotated in place: the frame is not
+            # read after counted
+            state.output_frame = (
+                state.frame
+                if state.frame.shape[1::-1] == output_size
+                else cv2.resize(state.frame, output_size)
+            )
+        if not state.inferred:
+            return state
+        if self.regions:
+            # (the crops are views of the frame: only the regions pixels are resized)
+            state.to_infer = [
+                self.pedestrian_detection.to_inferable(region.crop(state.frame))
+                for region in self.regions
+            ]
+        else:
+            state.to_infer = self.pedestrian_detection.to_inferable(state.frame)
+        return state
+
+    def infer(self, state: FrameState) -> FrameState:
+        if not state.inferred:
+            return state
+        inputs = state.to_infer if self.regions else [state.to_infer]
+        try:
+            rows = [
+                self.pedestrian_detection.detection_output(
+                    self.pedestrian_detection.predict(to_infer)
+                )
+                for to_infer in inputs
+            ]
+        finally:
+            for to_infer in inputs:
+                self.pedestrian_detection.release_input(to_infer)
+            state.to_infer = None
+        start = perf_counter()
+        state.pedestrians = self.pedestrian_detection.detect_array(
+            None,
+            detections=(
+                merge_region_rows(
+                    rows, self.regions, iou_threshold=self.merge_threshold
+                )
+                if self.regions
+                else rows[0]
+            ),
+            min_confidence=self.min_confidence,
+            top_k=self.top_k,
+            nms_threshold=self.nms_threshold,
+        )
+        if self.stage_latency:
+            self.stage_latency["decode_output"].add(perf_counter() - start)
+        return state
+
+    def count(self, state: FrameState) -> FrameState:
+        """Update the presence (stateful: a single thread stage) and publish the
+        statistics"""
+        if state.inferred:
+            self._last_pedestrians = state.pedestrians
+            if self.propagator is not None:
+                self.propagator.synchronize(state.frame, state.pedestrians)
+        elif self.propagator is not None:
+            # (in order) carried forward from the previous frame
+            state.pedestrians = self._last_pedestrians = self.propagator.propagate(
+                state.frame
+            )
+        else:
+            # (motion gated) nothing changed since the last inferred frame
+            state.pedestrians = (
+                self._last_pedestrians
+                if self._last_pedestrians is not None
+                else empty_detections()
+            )
+        for presence_event in self.presence_counter.count(
+            state.pedestrians, state.timestamp
+        ):
+            if not presence_event.entered:
+                self.publisher.publish_duration(presence_event.duration)
+            if self.recorder is not None:
+                self.recorder.add_event(presence_event)
+        # (non-blocking) only published when the count changes or on the publisher
+        # heartbeat
+        self.publisher.publish_count(len(state.pedestrians))
+        if self.recorder is not None:
+            # (queued, written from the store background thread)
+            self.recorder.add_frame(
+                state.timestamp,
+                state.pedestrians,
+                self.presence_counter.present,
+                state.inferred,
+            )
+        now = monotonic()
+        if self._counted_at is not None:
+            self._frame_intervals.add(now - self._counted_at)
+        self._counted_at = now
+        self.counted_frames += 1
+        if self.sinks.enabled:
+            # (stateful) annotations are snapshot here and rendered by the annotation
+            # threads
+            state.track_ids = self.presence_counter.detection_track_ids
+            state.overlay = self.presence_counter.overlay() + [f"fps: {self.fps:.1f}"]
+        return state
+
+    @property
+    def fps(self) -> float:
+        """The (last frames) processing rate"""
+        interval = self._frame_intervals.mean
+        return 1 / interval if interval else 0.0
+
+    def register_metrics(
+        self, registry: MetricsRegistry, pipeline: Optional[Pipeline] = None
+    ):
+        """Register the counter metrics (read at collection time: nothing is added per
+        frame but the stages latency, when measured)
+        :param registry: the metrics registry
+        :param pipeline: the running pipeline (its stages queue depths)
+        """
+        registry.counter(
+            "frames_total", "counted frames", function=lambda: self.counted_frames
+        )
+        registry.gauge("fps", "processed frames per second", function=lambda: self.fps)
+        registry.gauge(
+            "persons",
+            "persons in the scene",
+            function=lambda: self.presence_counter.present,
+        )
+        registry.summary(
+            "inference_latency_seconds",
+            "inference (predict) latency",
+            stats=self.pedestrian_detection.prediction_stats,
+        )
+        for name, latency in self.stage_latency.items():
+            registry.summary(
+                "stage_latency_seconds",
+                "pipeline stage processing latency",
+                labels={"stage": name},
+                stats=latency,
+            )
+        registry.counter(
+            "mqtt_published_messages_total",
+            "published MQTT messages",
+            function=lambda: self.publisher.published_messages,
+        )
+        registry.counter(
+            "mqtt_dropped_messages_total",
+            "dropped (outbound queue full) MQTT messages",
+            function=lambda: self.publisher.dropped_messages,
+        )
+        if self.motion_gate is not None:
+            registry.counter(
+                "skipped_frames_total",
+                "motion gated (not inferred) frames",
+                function=lambda: self.motion_gate.skipped_frames,
+            )
+            registry.gauge(
+                "skip_ratio",
+                "motion gated frames ratio",
+                function=lambda: self.motion_gate.skip_ratio or 0.0,
+            )
+        if self.propagator is not None:
+            registry.gauge(
+                "detection_interval",
+                "frames between the detector frames",
+                function=lambda: self.propagator.interval,
+            )
+            registry.counter(
+                "propagated_frames_total",
+                "frames with propagated (not detected) detections",
+                function=lambda: self.propagator.propagated_frames,
+            )
+        if pipeline is not None:
+            for stage in pipeline.stages:
+                registry.gauge(
+                    "queue_depth",
+                    "stage input queue depth",
+                    labels={"stage": stage.name},
+                    function=lambda name=stage.name: pipeline.queue_depths()[name],
+                )
+
+    def annotate(self, state: FrameState) -> FrameState:
+        """Draw the detections, their track ids and the overlay (in place, on the output
+        frame)"""
+        labels = (
+            [f"#{track_id}" if track_id >= 0 else None for track_id in state.track_ids]
+            if state.track_ids is not None
+            else None
+        )
+        self.renderer.render(
+            state.output_frame,
+            detection_boxes(state.pedestrians),
+            labels=labels,
+            overlay=state.overlay,
+        )
+        return state
+
+    def write(self, state: FrameState) -> FrameState:
+        """Write the output frame to the sinks (a single thread stage: the sinks reuse
+        their buffer)"""
+        self.sinks.write(state.output_frame)
+        return state
+
+    @staticmethod
+    def propagation_lag(stages: Sequence[Stage]) -> int:
+        """The maximum frames scheduled by the gate and not counted yet: the one held by
+        the gate, the preprocess, infer and count queued ones and the preprocess and
+        infer in process ones"""
+        return 1 + sum(
+            stage.queue_size + (stage.threads if stage.name != "count" else 0)
+            for stage in stages
+            if stage.name in ("preprocess", "infer", "count")
+        )
+
+    def stages(
+        self,
+        preprocess_threads: int = 1,
+        infer_threads: int = 1,
+        annotate_threads: int = 1,
+        queue_size: int = 4,
+    ) -> List[Stage]:
+        """The pipeline stages
+        :param preprocess_threads: preprocessing (color conversion, resize) threads
+        :param infer_threads: inference threads (up to the model number of infer
+            requests are used)
+        :param annotate_threads: annotation (drawing) threads
+        :param queue_size: stages input queues size
+
+        With a detection interval the detector frames are scheduled (gate) before the
+        previous frames are synchronized or propagated (count): the gate -> count queues
+        hold a single frame, bounding that lag to preprocess_threads + infer_threads + 4
+        frames (see propagation_lag).
+        """
+        # (the frames scheduled but not counted yet)
+        gated_queue_size = (
+            1
+            if self.propagator is not None and self.propagator.max_interval > 1
+            else queue_size
+        )
+        stages = [
+            Stage("preprocess", self.preprocess, preprocess_threads, gated_queue_size),
+            Stage("infer", self.infer, infer_threads, gated_queue_size),
+            Stage("count", self.count, 1, gated_queue_size),
+        ]
+        if self.motion_gate is not None or self.propagator is not None:
+            stages.insert(0, Stage("gate", self.gate, 1, queue_size))
+        if self.sinks.enabled:
+            stages.extend(
+                [
+                    Stage("annotate", self.annotate, annotate_threads, queue_size),
+                    Stage("write", self.write, 1, queue_size),
+                ]
+            )
+        for stage in stages:
+            stage.latency = self.stage_latency.get(stage.name)
+        return stages
@@ -0,0 +1,155 @@
+"""
+ People counting: turn the per frame detections into enter/leave (presence) events
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from openvino_utils.detections import detection_boxes
+from openvino_utils.streaming_stats import HysteresisPresence, WindowedMean
+from openvino_utils.tracking import IoUTracker
+
+
+@dataclass
+class PresenceEvent:
+    """A (smoothed) presence change: a person entered or left the scene (with the
+    presence duration)"""
+
+    entered: bool
+    timestamp: float
+    duration: Optional[float] = None
+    track_id: Optional[int] = None  # the person track id (multi-person counting)
+
+
+class PresenceCounter:
+    """Smooth the per frame pedestrian count (average of the last frames_window frames
+    thresholded) and extract the enter/leave events (assumes one person in the scene)
+
+    Constant memory and O(1) per frame (see openvino_utils.streaming_stats).
+    """
+
+    def __init__(
+        self,
+        frames_window: int = 10,
+        threshold: float = 0.7,
+        start: float = 0.0,
+        exit_threshold: Optional[float] = None,
+    ):
+        """
+        :param frames_window: last frame(s) window to smooth detection per frame
+            signal/time-series
+        :param threshold: presence threshold applied to the smoothed signal
+        :param start: (initial) presence start timestamp
+        :param exit_threshold: (hysteresis) absence threshold (defaults to threshold)
+        """
+        self.frames_window = frames_window
+        self.threshold = threshold
+        self.start = start
+        self.pedestrians_in_frame = WindowedMean(frames_window)
+        # initialized (a time series for people in the frame)
+        self.pedestrians_in_frame.add(0)
+        self.presence = HysteresisPresence(threshold, exit_threshold)
+
+    @property
+    def present(self) -> int:
+        """The current (smoothed) presence"""
+        return int(self.presence.present)
+
+    @property
+    def detection_track_ids(self) -> Optional[np.ndarray]:
+        """(no tracks) see TrackCounter.detection_track_ids"""
+        return None
+
+    def overlay(self) -> List[str]:
+        """The counting state as text (annotation) lines"""
+        return [f"person: {'present' if self.presence.present else 'absent'}"]
+
+    def update(self, pedestrians: int, timestamp: float) -> Optional[PresenceEvent]:
+        """Update the presence with the frame pedestrians count
+        :param pedestrians: number of pedestrians detected in the frame
+        :param timestamp: the frame timestamp (seconds)
+
+        :return: the presence event if the (smoothed) presence changed otherwise None
+        """
+        was_present = self.presence.present
+        if was_present == self.presence.update(
+            self.pedestrians_in_frame.add(pedestrians)
+        ):
+            return None
+        if self.presence.present:
+            self.start = timestamp
+            return PresenceEvent(entered=True, timestamp=timestamp)
+        # assumes one person in the scene
+        return PresenceEvent(
+            entered=False, timestamp=timestamp, duration=timestamp - self.start
+        )
+
+    def count(self, detections: np.ndarray, timestamp: float) -> List[PresenceEvent]:
+        """Update the presence with the frame detections (see TrackCounter.count)"""
+        presence_event = self.update(len(detections), timestamp)
+        return [presence_event] if presence_event is not None else []
+
+
+class TrackCounter:
+    """Multi-person counting: entries, exits and per-person dwell time from the (IoU)
+    tracks lifecycles"""
+
+    def __init__(self, tracker: Optional[IoUTracker] = None):
+        self.tracker = tracker or IoUTracker()
+        self.entries = 0
+        self.exits = 0
+
+    @property
+    def present(self) -> int:
+        """Number of persons (confirmed tracks) in the scene"""
+        return len(self.tracker.active_tracks)
+
+    @property
+    def detection_track_ids(self) -> np.ndarray:
+        """The last counted detections track ids (-1 for the not (yet) confirmed
+        ones)"""
+        return self.tracker.detection_track_ids
+
+    def overlay(self) -> List[str]:
+        """The counting state as text (annotation) lines"""
+        return [
+            f"persons: {self.present}",
+            f"entries: {self.entries} exits: {self.exits}",
+        ]
+
+    def _presence_events(self, track_events) -> List[PresenceEvent]:
+        events = []
+        for track_event in track_events:
+            if track_event.entered:
+                self.entries += 1
+            else:
+                self.exits += 1
+            events.append(
+                PresenceEvent(
+                    entered=track_event.entered,
+                    timestamp=track_event.timestamp,
+                    duration=track_event.dwell,
+                    track_id=track_event.track_id,
+                )
+            )
+        return events
+
+    def count(self, detections: np.ndarray, timestamp: float) -> List[PresenceEvent]:
+        """Update the tracks with the frame detections
+        :param detections: the frame detections record array
+        :param timestamp: the frame timestamp (seconds)
+
+        :return: the persons entering/leaving the scene (leaving ones with their dwell
+            time)
+        """
+        return self._presence_events(
+            self.tracker.update(
+                detection_boxes(detections), detections["confidence"], timestamp
+            )
+        )
+
+    def flush(self, timestamp: float) -> List[PresenceEvent]:
+        """Leave all the persons still in the scene (ex: at the end of the stream)"""
+        return self._presence_events(self.tracker.flush(timestamp))
@@ -0,0 +1,252 @@
+"""
+ Multi-stream runner: many input streams (files, RTSP urls or devices) per process
+ sharing the loaded networks
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic, time
+from typing import Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+from pydantic import BaseModel
+
+from counting import PresenceCounter
+from openvino_utils.batching import FrameBatcher
+from openvino_utils.regions import inference_regions, merge_region_rows, ratio_box
+from openvino_utils.timeseries import TimeSeriesWriter
+from openvino_utils.utils import RatioBoundingBox
+from pedestrian_detection import PedestrianDetection
+from publisher import CountPublisher
+
+LOGGER = logging.getLogger()
+
+
+class StreamSpec(BaseModel):
+    """A stream (manifest entry) and its own processing settings"""
+
+    # unique stream name (also used to namespace the MQTT topics ex: door-1/person)
+    name: str
+    source: str  # video file, RTSP url or a device index (ex: "0")
+    model: Optional[str] = None  # model name (defaults to the runner model)
+    frames_window: int = 10
+    threshold: float = 0.7
+    min_confidence: float = 0.85
+    # regions of interest ([x_min, y_min, x_max, y_max] frame ratios): only their crops
+    # are inferred
+    rois: List[List[float]] = []
+    # split the regions (or the whole frame) into <rows>x<columns> tiles (ex: "2x2")
+    tiles: str = ""
+    tile_overlap: float = 0.1
+
+    @property
+    def regions(self) -> List[RatioBoundingBox]:
+        """The inferred regions (empty for the whole frame)"""
+        return inference_regions(
+            [ratio_box(roi) for roi in self.rois], self.tiles, overlap=self.tile_overlap
+        )
+
+    @property
+    def capture_source(self) -> Union[str, int]:
+        """cv2.VideoCapture source (device index or file/url)"""
+        return int(self.source) if self.source.isdigit() else self.source
+
+
+class StreamManifest(BaseModel):
+    """Streams manifest (json file) ex: {"streams": [{"name": "door-1", "source":
+    "rtsp://..."}]}"""
+
+    streams: List[StreamSpec]
+
+    @classmethod
+    def from_file(cls, path: str) -> "StreamManifest":
+        with open(path) as manifest_file:
+            manifest = cls(**json.load(manifest_file))
+        names = [stream.name for stream in manifest.streams]
+        if len(set(names)) != len(names):
+            raise ValueError(f"stream names should be unique: {names}")
+        return manifest
+
+
+class FPSMeter:
+    """Processed frames counter (and FPS)"""
+
+    def __init__(self):
+        self.frames = 0
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+
+    def tick(self):
+        if self.start is None:
+            self.start = monotonic()
+        self.frames += 1
+
+    def stop(self):
+        self.end = monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        if self.start is None:
+            return 0.0
+        return (self.end or monotonic()) - self.start
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+
+class MultiStreamRunner:
+    """Run the streams of a manifest, each captured and counted by its own thread,
+    sharing the loaded networks (one PedestrianDetection per model, optionally batching
+    the frames across the streams)
+
+    The concurrent inferences are capped by the shared detectors (their infer requests
+    pool or batcher), not by the streams threads: a live stream never waits for another
+    stream to end.
+    """
+
+    def __init__(
+        self,
+        manifest: StreamManifest,
+        detectors: Dict[str, PedestrianDetection],
+        publisher: CountPublisher,
+        default_model: str,
+        batchers: Optional[Dict[str, FrameBatcher]] = None,
+        report_interval: float = 5.0,
+        timeseries: Optional[TimeSeriesWriter] = None,
+    ):
+        """
+        :param manifest: the streams manifest
+        :param detectors: loaded detectors by model name
+        :param publisher: (started) MQTT publisher
+        :param default_model: model used by the streams not setting their own
+        :param batchers: optional (cross-stream) batchers by model name
+        :param report_interval: FPS reporting interval (seconds)
+        :param timeseries: (started) time series writer recording each stream counts and
+            entries/exits
+        """
+        self.manifest = manifest
+        self.detectors = detectors
+        self.publisher = publisher
+        self.default_model = default_model
+        self.batchers = batchers or {}
+        self.report_interval = report_interval
+        self.timeseries = timeseries
+        self.meters = {stream.name: FPSMeter() for stream in manifest.streams}
+        self.stop_event = threading.Event()
+
+    def detect(
+        self,
+        stream: StreamSpec,
+        image: np.ndarray,
+        regions: Optional[List[RatioBoundingBox]] = None,
+    ) -> np.recarray:
+        """Detect the pedestrians in a stream image (on the shared network)
+        :param regions: the stream inferred regions (see StreamSpec.regions)
+        """
+        model = stream.model or self.default_model
+        detector = self.detectors[model]
+        batcher = self.batchers.get(model)
+        detections = None
+        if batcher is not None:
+            if regions:
+                # the regions crops fill the batch (with the other streams frames)
+                futures = [
+                    batcher.submit(stream.name, region.crop(image))
+                    for region in regions
+                ]
+                detections = merge_region_rows(
+                    [future.result() for future in futures], regions
+                )
+            else:
+                detections = batcher.infer(stream.name, image)
+        return detector.detect_array(
+            image,
+            detections=detections,
+            min_confidence=stream.min_confidence,
+            top_k=1,
+            regions=regions,
+        )
+
+    def run_stream(self, stream: StreamSpec):
+        """Process a stream until it ends (or the runner is stopped)"""
+        meter = self.meters[stream.name]
+        cap = cv2.VideoCapture(stream.capture_source)
+        regions = stream.regions
+        recorder = (
+            self.timeseries.stream(stream.name) if self.timeseries is not None else None
+        )
+        presence_counter = PresenceCounter(
+            frames_window=stream.frames_window,
+            threshold=stream.threshold,
+            start=monotonic(),
+        )
+        try:
+            while cap.isOpened() and not self.stop_event.is_set():
+                flag, frame = cap.read()
+                if not flag:
+                    break
+                image = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                pedestrians = self.detect(stream, image, regions)
+
+                presence_event = presence_counter.update(len(pedestrians), monotonic())
+                if presence_event is not None and not presence_event.entered:
+                    self.publisher.publish_duration(
+                        presence_event.duration, namespace=stream.name
+                    )
+                if recorder is not None:
+                    # (wall clock timestamps in the store)
+                    now = time()
+                    recorder.add_frame(now, pedestrians, presence_counter.present)
+                    if presence_event is not None:
+                        recorder.add_event(presence_event, timestamp=now)
+                self.publisher.publish_count(len(pedestrians), namespace=stream.name)
+                meter.tick()
+        finally:
+            meter.stop()
+            cap.release()
+
+    def report(self) -> Dict:
+        """Per-stream and aggregate FPS report"""
+        streams = {
+            name: {"frames": meter.frames, "fps": meter.fps}
+            for name, meter in self.meters.items()
+        }
+        return {
+            "streams": streams,
+            "aggregate_fps": sum(stream["fps"] for stream in streams.values()),
+            "frames": sum(stream["frames"] for stream in streams.values()),
+        }
+
+    def run(self) -> Dict:
+        """Run all the streams (blocking), periodically logging the FPS report
+
+        :return: the final FPS report
+        """
+        start = monotonic()
+        # (a thread per stream: the streams loop until they end)
+        with ThreadPoolExecutor(
+            max_workers=max(1, len(self.manifest.streams)), thread_name_prefix="stream"
+        ) as executor:
+            futures = [
+                executor.submit(self.run_stream, stream)
+                for stream in self.manifest.streams
+            ]
+            pending = set(futures)
+            try:
+                while pending:
+                    _, pending = wait(pending, timeout=self.report_interval)
+                    LOGGER.info("FPS report: %s", json.dumps(self.report()))
+            except KeyboardInterrupt:
+                self.stop_event.set()
+            for stream, future in zip(self.manifest.streams, futures):
+                if future.exception() is not None:
+                    LOGGER.error(
+                        "stream %s failed: %s", stream.name, future.exception()
+                    )
+        report = self.report()
+        report["elapsed"] = monotonic() - start
+        return report
@@ -0,0 +1,608 @@
+"""
+ Offline batch analytics: recorded videos processed in parallel on a process pool (one
+ model per worker), without display, MQTT nor video output, each file events saved as
+ JSONL with its throughput statistics. A single long video can be sharded in time
+ segments inferred in parallel (its counting replayed in order).
+"""
+
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from time import monotonic
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from pydantic import BaseModel
+
+from counting import PresenceCounter, TrackCounter
+from openvino_utils.detections import as_detections
+from openvino_utils.input_feeder import InputFeeder, TimestampedFrame
+from openvino_utils.streaming_stats import LatencyStats
+from openvino_utils.video_utils import timed
+from pedestrian_detection import PedestrianDetection
+
+LOGGER = logging.getLogger()
+
+VIDEO_EXTENSIONS = (
+    ".mp4",
+    ".avi",
+    ".mkv",
+    ".mov",
+    ".m4v",
+    ".mpg",
+    ".mpeg",
+    ".ts",
+    ".webm",
+)
+
+# the worker process detector (loaded once per worker, see load_worker)
+_DETECTION: Optional[PedestrianDetection] = None
+
+
+class OfflineJob(BaseModel):
+    """Offline processing settings (shared by all the files)"""
+
+    model: str = "pedestrian-detection-adas-0002"
+    precision: str = "FP16"
+    models_root_dir: str = "./models/intel"
+    # OpenVino CPU threads per worker (0: the plugin default)
+    inference_threads: int = 0
+    async_depth: int = 2  # in-flight inference requests per worker
+    counting: str = "presence"
+    frames_window: int = 10
+    threshold: float = 0.7
+    min_confidence: float = 0.85
+    nms_threshold: float = 0.5
+    model_cache: str = "./model_cache"
+    output_directory: str = "./output/offline/"
+
+
+def list_videos(source: str) -> List[str]:
+    """The video files of a directory (recursively) or matching a glob pattern
+    (sorted)"""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "**", "*"), recursive=True)
+        paths = [path for path in paths if path.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def output_prefix(job: OfflineJob, path: str) -> str:
+    """A file outputs prefix (its name and a hash of its absolute path: same named files
+    do not collide)"""
+    digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(job.output_directory, f"{name}-{digest}")
+
+
+def is_done(job: OfflineJob, path: str) -> bool:
+    """The file was completely processed (its statistics file, written last, exists)"""
+    return os.path.exists(f"{output_prefix(job, path)}.stats.json")
+
+
+def load_worker(job: OfflineJob):
+    """Worker process initializer: load the model once"""
+    global _DETECTION  # pylint: disable=global-statement
+    logging.basicConfig(level=logging.INFO)
+    _DETECTION = PedestrianDetection(
+        model_name=job.model,
+        model_directory=f"{job.models_root_dir}/{job.model}/{job.precision}",
+        num_requests=job.async_depth,
+        plugin_config=(
+            {"CPU_THREADS_NUM": str(job.inference_threads)}
+            if job.inference_threads
+            else {}
+        ),
+        swap_rb=True,
+        cache_directory=job.model_cache or None,
+    )
+    _DETECTION.load_model()
+
+
+def _event(presence_event, frame: int) -> Dict[str, Any]:
+    event = {
+        "event": "enter" if presence_event.entered else "exit",
+        "timestamp": presence_event.timestamp,
+        "frame": frame,
+    }
+    if presence_event.track_id is not None:
+        event["track_id"] = presence_event.track_id
+    if presence_event.duration is not None:
+        event["dwell"] = presence_event.duration
+    return event
+
+
+def new_counter(job: OfflineJob) -> Union[PresenceCounter, TrackCounter]:
+    if job.counting == "tracking":
+        return TrackCounter()
+    return PresenceCounter(frames_window=job.frames_window, threshold=job.threshold)
+
+
+def count_events(
+    counter: Union[PresenceCounter, TrackCounter],
+    frames: Iterable[Tuple[int, float, np.recarray]],
+) -> Iterator[Dict[str, Any]]:
+    """Count the frames detections (in order) yielding the events: "presence" count
+    changes, "enter" and "exit" (with the dwell time), the tracked persons still in the
+    scene leave at the end
+    :param counter: the presence or tracks counter
+    :param frames: (frame index, timestamp, pedestrians) of the consecutive frames
+    """
+    present, index, timestamp = 0, -1, 0.0
+    for index, timestamp, pedestrians in frames:
+        for presence_event in counter.count(pedestrians, timestamp):
+            yield _event(presence_event, index)
+        if counter.present != present:
+            present = counter.present
+            yield {
+                "event": "presence",
+                "timestamp": timestamp,
+                "frame": index,
+                "count": present,
+            }
+    if isinstance(counter, TrackCounter):
+        for presence_event in counter.flush(timestamp):
+            yield _event(presence_event, index)
+
+
+def write_events(events: Iterable[Dict[str, Any]], path: str) -> int:
+    """Write the events as JSONL (atomically: to a temporary file renamed once all are
+    written)
+
+    :return: the number of events
+    """
+    temporary_events = f"{path}.{os.getpid()}"
+    written = 0
+    try:
+        with open(temporary_events, "w") as events_output:
+            for event in events:
+                events_output.write(json.dumps(event) + "\n")
+                written += 1
+        os.replace(temporary_events, path)
+    finally:
+        if os.path.exists(temporary_events):
+            os.remove(temporary_events)
+    return written
+
+
+def write_stats(stats: Dict[str, Any], path: str):
+    """Write (atomically) a file statistics (its done marker)"""
+    temporary_stats = f"{path}.{os.getpid()}"
+    with open(temporary_stats, "w") as stats_output:
+        json.dump(stats, stats_output)
+    os.replace(temporary_stats, path)
+
+
+def detect_frames(
+    job: OfflineJob, frames: Iterable[TimestampedFrame]
+) -> Iterator[Tuple[TimestampedFrame, np.recarray]]:
+    """Detect (in the worker process) the pedestrians of the frames (asynchronous
+    inferences)"""
+    tracking = job.counting == "tracking"
+    return _DETECTION.detect_async(
+        ((timestamped, timestamped.frame) for timestamped in frames),
+        min_confidence=job.min_confidence,
+        top_k=None if tracking else 1,
+        nms_threshold=job.nms_threshold if tracking else None,
+    )
+
+
+def process_file(job: OfflineJob, path: str) -> Dict[str, Any]:
+    """Process a video file (in a worker process) writing its events (JSONL) and
+    statistics (JSON)
+
+    The events are written to a temporary file renamed once the file is processed, the
+    statistics file (the done marker) is written last: an interrupted file is processed
+    again from its start.
+
+    :return: the file statistics
+    """
+    _DETECTION.prediction_stats = LatencyStats()
+    prefix = output_prefix(job, path)
+    input_feeder = InputFeeder("video", path)
+    input_feeder.load_data()
+    decode_latency = LatencyStats()
+    frames = 0
+    start = monotonic()
+
+    def detected_frames() -> Iterator[Tuple[int, float, np.recarray]]:
+        nonlocal frames
+        for timestamped, pedestrians in detect_frames(
+            job, timed(input_feeder.frames(), decode_latency)
+        ):
+            frames += 1
+            yield timestamped.index, timestamped.timestamp, pedestrians
+
+    try:
+        events = write_events(
+            count_events(new_counter(job), detected_frames()), f"{prefix}.events.jsonl"
+        )
+    finally:
+        input_feeder.close()
+    elapsed = monotonic() - start
+    stats = {
+        "file": path,
+        "events_file": f"{prefix}.events.jsonl",
+        "frames": frames,
+        "events": events,
+        "elapsed": elapsed,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "decode": decode_latency.summary(),
+        "inference": _DETECTION.prediction_stats.summary(),
+        "worker": os.getpid(),
+        "job": job.dict(),
+    }
+    write_stats(stats, f"{prefix}.stats.json")
+    return stats
+
+
+def run_offline(
+    job: OfflineJob, paths: List[str], workers: int = 0, force: bool = False
+) -> Dict:
+    """Process the files on a pool of worker processes (the already processed files are
+    skipped)
+    :param workers: worker processes (0 for one per core)
+    :param force: process the already processed files again
+
+    :return: the summary (processed, skipped and failed files, aggregate FPS)
+    """
+    os.makedirs(job.output_directory, exist_ok=True)
+    pending = [path for path in paths if force or not is_done(job, path)]
+    skipped = len(paths) - len(pending)
+    workers = min(workers or os.cpu_count() or 1, len(pending)) or 1
+    if not job.inference_threads:
+        # (the cores are shared between the workers: no oversubscription)
+        job = job.copy(
+            update={"inference_threads": max(1, (os.cpu_count() or 1) // workers)}
+        )
+    LOGGER.info(
+        "%d files to process (%d already done) on %d workers",
+        len(pending),
+        skipped,
+        workers,
+    )
+    processed, failed = [], {}
+    start = monotonic()
+    # (spawned workers: no OpenVino state inherited from the parent process)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=load_worker,
+        initargs=(job,),
+    ) as executor:
+        futures = {executor.submit(process_file, job, path): path for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                stats = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.error("%s failed: %s", path, error)
+                failed[path] = str(error)
+                continue
+            LOGGER.info("%s: %d frames, %.1f FPS", path, stats["frames"], stats["fps"])
+            processed.append(stats)
+    elapsed = monotonic() - start
+    frames = sum(stats["frames"] for stats in processed)
+    return {
+        "files": len(paths),
+        "processed": len(processed),
+        "skipped": skipped,
+        "failed": failed,
+        "workers": workers,
+        "frames": frames,
+        "elapsed": elapsed,
+        "aggregate_fps": frames / elapsed if elapsed else 0.0,
+        "job": job.dict(),
+    }
+
+
+def frame_count(path: str) -> int:
+    """A video file frame count (from its container: it may be approximate)"""
+    capture = cv2.VideoCapture(path)
+    try:
+        return max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        capture.release()
+
+
+def plan_segments(frames: int, segments: int) -> List[Tuple[int, Optional[int]]]:
+    """Split frames into (at most) segments consecutive [start, stop) frame ranges of
+    even lengths, the last one is open (stop None: read until the video end, the frame
+    count may be approximate)"""
+    bounds = sorted(
+        set(np.linspace(0, frames, max(1, segments) + 1).round().astype(int).tolist())
+    )
+    if len(bounds) < 2:
+        return [(0, None)]
+    ranges: List[Tuple[int, Optional[int]]] = list(zip(bounds[:-1], bounds[1:]))
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def frame_digest(frame: np.ndarray) -> str:
+    """A decoded frame content digest (to compare the same frame decoded by two
+    workers)"""
+    content = memoryview(np.ascontiguousarray(frame)).cast("B")
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def pack_segment(
+    start: int,
+    stop: Optional[int],
+    frames: Iterable[Tuple[int, float, np.recarray]],
+    first_digest: Optional[str] = None,
+    next_digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Pack a segment frames detections as compact arrays (the detection rows and their
+    per frame offsets)
+    :param frames: the segment (frame index, timestamp, pedestrians)
+    :param first_digest: the segment first frame digest
+    :param next_digest: the digest of the frame following the segment (the next segment
+        first frame)
+    """
+    indices, timestamps, offsets, rows = [], [], [0], []
+    for index, timestamp, pedestrians in frames:
+        indices.append(index)
+        timestamps.append(timestamp)
+        frame_rows = np.ascontiguousarray(pedestrians).view(np.float32).reshape(-1, 7)
+        rows.append(frame_rows)
+        offsets.append(offsets[-1] + len(frame_rows))
+    return {
+        "start": start,
+        "stop": stop,
+        "indices": np.array(indices, dtype=np.int64),
+        "timestamps": np.array(timestamps, dtype=np.float64),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "rows": np.concatenate(rows) if rows else np.zeros((0, 7), dtype=np.float32),
+        "first_digest": first_digest,
+        "next_digest": next_digest,
+    }
+
+
+def infer_segment(
+    job: OfflineJob, path: str, start: int, stop: Optional[int], overlap: int
+) -> Dict[str, Any]:
+    """Detect (in a worker process) the pedestrians of a video segment: the video is
+    seeked overlap frames before start then decoded (the skipped frames only grabbed) up
+    to start, so the segment frames are the ones of a sequential read. The frame
+    following the segment is decoded too (not inferred): its digest is compared to the
+    next segment first frame one (see segment_frames)
+
+    :return: the segment frames indices, timestamps and detection rows (see
+        pack_segment), with its decoding and inference statistics
+    """
+    _DETECTION.prediction_stats = LatencyStats()
+    input_feeder = InputFeeder("video", path)
+    input_feeder.load_data()
+    decode_latency = LatencyStats()
+    digests: Dict[str, Optional[str]] = {"first": None, "next": None}
+
+    def segment_frames_to_infer() -> Iterator[TimestampedFrame]:
+        for timestamped in timed(
+            input_feeder.frames(
+                start, None if stop is None else stop + 1, overlap=overlap
+            ),
+            decode_latency,
+        ):
+            if timestamped.index == stop:
+                digests["next"] = frame_digest(timestamped.frame)
+                return
+            if digests["first"] is None:
+                digests["first"] = frame_digest(timestamped.frame)
+            yield timestamped
+
+    try:
+        frames = [
+            (timestamped.index, timestamped.timestamp, pedestrians)
+            for timestamped, pedestrians in detect_frames(
+                job, segment_frames_to_infer()
+            )
+        ]
+    finally:
+        input_feeder.close()
+    return {
+        **pack_segment(
+            start,
+            stop,
+            frames,
+            first_digest=digests["first"],
+            next_digest=digests["next"],
+        ),
+        "decode": decode_latency.summary(),
+        "inference": _DETECTION.prediction_stats.summary(),
+        "worker": os.getpid(),
+    }
+
+
+def segment_frames(
+    segment: Dict[str, Any], previous: Optional[Dict[str, Any]] = None
+) -> Iterator[Tuple[int, float, np.recarray]]:
+    """The (frame index, timestamp, pedestrians) of an inferred segment, checking it is
+    aligned: it has its expected frames count and its first frame is the one the
+    previous segment decoded after its last frame (the same content: a seek landing on
+    another frame while reporting the requested position is caught)
+    :param previous: the previous segment (None for the first one)
+    """
+    indices = segment["indices"]
+    expected = (
+        segment["stop"] - segment["start"]
+        if segment["stop"] is not None
+        else len(indices)
+    )
+    bounds = f"[{segment['start']}, {segment['stop']})"
+    if len(indices) != expected:
+        raise RuntimeError(
+            f"short segment {bounds}: {len(indices)} frames decoded "
+            "(inaccurate frame count, process the file unsharded)"
+        )
+    first_digest = segment.get("first_digest")
+    if previous is not None and previous.get("next_digest") != first_digest:
+        raise RuntimeError(
+            f"misaligned segment {bounds}: its first frame differs from the "
+            "sequentially decoded one (inaccurate seeking, increase the overlap "
+            "or process the file unsharded)"
+        )
+    offsets, rows = segment["offsets"], segment["rows"]
+    for position, (index, timestamp) in enumerate(zip(indices, segment["timestamps"])):
+        yield int(index), float(timestamp), as_detections(
+            rows[offsets[position] : offsets[position + 1]]
+        )
+
+
+def run_sharded(
+    job: OfflineJob,
+    path: str,
+    segments: int = 0,
+    overlap: int = 250,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """Process one (long) video file split into time segments inferred in parallel
+    worker processes (the same events and statistics files as run_offline)
+
+    The workers only infer their segment (the costly part), the counting is replayed in
+    order on the merged per frame detections (its smoothing window and the in progress
+    dwell intervals run across the segments boundaries), so the events are the ones of a
+    sequential run.
+
+    :param segments: time segments (and worker processes, 0 for one per core)
+    :param overlap: seek that many frames before each segment start (then decoded up to
+        it: seeking lands on key frames)
+    :param force: process the file again when already processed
+
+    :return: the file statistics
+    """
+    os.makedirs(job.output_directory, exist_ok=True)
+    prefix = output_prefix(job, path)
+    if not force and is_done(job, path):
+        LOGGER.info("%s already processed", path)
+        with open(f"{prefix}.stats.json") as stats_input:
+            return json.load(stats_input)
+    ranges = plan_segments(frame_count(path), segments or os.cpu_count() or 1)
+    workers = len(ranges)
+    if not job.inference_threads:
+        job = job.copy(
+            update={"inference_threads": max(1, (os.cpu_count() or 1) // workers)}
+        )
+    LOGGER.info("%s: %d segments on %d workers", path, len(ranges), workers)
+    start = monotonic()
+    inferred = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=load_worker,
+        initargs=(job,),
+    ) as executor:
+        # (in the segments order: the counting of a segment starts once the previous
+        # ones are counted)
+        futures = [
+            executor.submit(
+                infer_segment, job, path, segment_start, segment_stop, overlap
+            )
+            for segment_start, segment_stop in ranges
+        ]
+
+        def merged_frames() -> Iterator[Tuple[int, float, np.recarray]]:
+            for future in futures:
+                segment = future.result()
+                yield from segment_frames(segment, inferred[-1] if inferred else None)
+                inferred.append(segment)
+
+        events = write_events(
+            count_events(new_counter(job), merged_frames()), f"{prefix}.events.jsonl"
+        )
+    elapsed = monotonic() - start
+    frames = sum(len(segment["indices"]) for segment in inferred)
+    stats = {
+        "file": path,
+        "events_file": f"{prefix}.events.jsonl",
+        "frames": frames,
+        "events": events,
+        "elapsed": elapsed,
+        "fps": frames / elapsed if elapsed else 0.0,
+        "segments": [
+            {
+                "start": segment["start"],
+                "stop": segment["stop"],
+                "frames": len(segment["indices"]),
+                "decode": segment["decode"],
+                "inference": segment["inference"],
+                "worker": segment["worker"],
+            }
+            for segment in inferred
+        ],
+        "overlap": overlap,
+        "job": job.dict(),
+    }
+    write_stats(stats, f"{prefix}.stats.json")
+    return stats
+
+
+def validate_sharding(
+    job: OfflineJob, path: str, segments: int = 0, overlap: int = 250
+) -> Dict[str, Any]:
+    """Check a sharded run events are exactly the sequential run ones (same settings and
+    inference threads, outputs in the sequential/ and sharded/ subdirectories of the job
+    output directory)
+
+    :return: the validation report (events counts, first mismatching event, speedup and
+        the verdict)
+    """
+    segments = len(plan_segments(frame_count(path), segments or os.cpu_count() or 1))
+    if not job.inference_threads:
+        # (both runs with the same inference threads: identical detections)
+        job = job.copy(
+            update={"inference_threads": max(1, (os.cpu_count() or 1) // segments)}
+        )
+    sequential_job = job.copy(
+        update={"output_directory": os.path.join(job.output_directory, "sequential")}
+    )
+    sharded_job = job.copy(
+        update={"output_directory": os.path.join(job.output_directory, "sharded")}
+    )
+    sequential = run_offline(sequential_job, [path], workers=1, force=True)
+    if sequential["failed"]:
+        raise RuntimeError(f"sequential run failed: {sequential['failed'][path]}")
+    sharded = run_sharded(
+        sharded_job, path, segments=segments, overlap=overlap, force=True
+    )
+    events = {}
+    for name, run_job in (("sequential", sequential_job), ("sharded", sharded_job)):
+        with open(f"{output_prefix(run_job, path)}.events.jsonl") as events_input:
+            events[name] = [json.loads(line) for line in events_input]
+    mismatch = next(
+        (
+            {"position": position, "sequential": expected, "sharded": actual}
+            for position, (expected, actual) in enumerate(
+                itertools.zip_longest(events["sequential"], events["sharded"])
+            )
+            if expected != actual
+        ),
+        None,
+    )
+    report = {
+        "file": path,
+        "segments": segments,
+        "overlap": overlap,
+        "frames": {"sequential": sequential["frames"], "sharded": sharded["frames"]},
+        "events": {name: len(file_events) for name, file_events in events.items()},
+        "first_mismatch": mismatch,
+        "speedup": sequential["elapsed"] / sharded["elapsed"]
+        if sharded["elapsed"]
+        else None,
+        "accepted": mismatch is None and sequential["frames"] == sharded["frames"],
+    }
+    LOGGER.info(
+        "%d/%d events, speedup %s (%s)",
+        report["events"]["sequential"],
+        report["events"]["sharded"],
+        report["speedup"],
+        "accepted" if report["accepted"] else "rejected",
+    )
+    return report
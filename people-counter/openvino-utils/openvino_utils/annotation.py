@@ -0,0 +1,128 @@
+"""
+ One pass, in place frame annotation: detection boxes (projected at once), their labels
+ (ex: track ids) and text overlays (ex: counts, FPS)
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from openvino_utils.utils import ImageDimension
+
+Color = Tuple[int, int, int]
+
+
+def project_boxes(boxes: np.ndarray, dimension: ImageDimension) -> np.ndarray:
+    """Project (n, 4) [x_min, y_min, x_max, y_max] ratio boxes to pixel boxes (as
+    RatioPoint.project)
+    :return: (n, 4) int32 pixel boxes
+    """
+    scale = np.array([dimension.width - 1, dimension.height - 1] * 2, dtype=np.float32)
+    return (np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale).astype(np.int32)
+
+
+def box_polygons(pixel_boxes: np.ndarray) -> np.ndarray:
+    """(n, 4) pixel boxes as (n, 4, 2) closed polygons (the boxes corners)"""
+    x_min, y_min, x_max, y_max = pixel_boxes.T
+    return np.stack(
+        [
+            np.stack([x_min, y_min], axis=-1),
+            np.stack([x_max, y_min], axis=-1),
+            np.stack([x_max, y_max], axis=-1),
+            np.stack([x_min, y_max], axis=-1),
+        ],
+        axis=1,
+    )
+
+
+class AnnotationRenderer:
+    """Draw the boxes, their labels and the text overlays directly on the (output)
+    frame: no frame copy nor resize, all the boxes are projected at once and drawn with
+    a single call"""
+
+    def __init__(
+        self,
+        box_color: Color = (0, 0, 255),
+        text_color: Color = (255, 255, 255),
+        thickness: int = 2,
+        font_scale: float = 0.6,
+    ):
+        """
+        :param box_color: boxes (and labels background) color in the frame channels
+            order
+        :param text_color: labels and overlays text color
+        :param thickness: boxes thickness
+        :param font_scale: labels and overlays font scale
+        """
+        self.box_color = box_color
+        self.text_color = text_color
+        self.thickness = thickness
+        self.font_scale = font_scale
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.line_height = int(30 * font_scale) + 6
+
+    def render(
+        self,
+        frame: np.ndarray,
+        boxes: np.ndarray,
+        labels: Optional[Sequence[Optional[str]]] = None,
+        overlay: Sequence[str] = (),
+    ) -> np.ndarray:
+        """Annotate frame in place
+        :param frame: (height, width, depth) frame (modified)
+        :param boxes: (n, 4) [x_min, y_min, x_max, y_max] ratio boxes
+        :param labels: optional per box labels (None to skip a box label)
+        :param overlay: text lines written on the frame top-left corner
+
+        :return: the (annotated) frame
+        """
+        dimension = ImageDimension(*frame.shape[:2][::-1])
+        pixel_boxes = project_boxes(boxes, dimension)
+        if len(pixel_boxes):
+            cv2.polylines(
+                frame,
+                list(box_polygons(pixel_boxes)),
+                isClosed=True,
+                color=self.box_color,
+                thickness=self.thickness,
+            )
+        if labels is not None:
+            for (x_min, y_min, _, _), label in zip(pixel_boxes.tolist(), labels):
+                if label:
+                    self._label(frame, label, x_min, y_min)
+        for line, text in enumerate(overlay):
+            cv2.putText(
+                frame,
+                text,
+                (10, (line + 1) * self.line_height),
+                self.font,
+                self.font_scale,
+                self.text_color,
+                1,
+                cv2.LINE_AA,
+            )
+        return frame
+
+    def _label(self, frame: np.ndarray, label: str, x: int, y: int):
+        (width, height), baseline = cv2.getTextSize(
+            label, self.font, self.font_scale, 1
+        )
+        top = max(0, y - height - baseline)
+        cv2.rectangle(
+            frame,
+            (x, top),
+            (x + width, top + height + baseline),
+            self.box_color,
+            cv2.FILLED,
+        )
+        cv2.putText(
+            frame,
+            label,
+            (x, top + height),
+            self.font,
+            self.font_scale,
+            self.text_color,
+            1,
+            cv2.LINE_AA,
+        )
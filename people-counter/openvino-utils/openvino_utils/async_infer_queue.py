@@ -0,0 +1,131 @@
+"""
+ A ring of in-flight (asynchronous) infer requests returning results in submission order
+"""
+
+import queue
+from collections import deque
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from openvino.inference_engine import Blob
+from openvino.inference_engine.ie_api import ExecutableNetwork, InferRequest
+
+# (user data, {output name: output array})
+InferResult = Tuple[Any, Dict[str, np.ndarray]]
+
+
+def request_inputs(
+    request: InferRequest, input_layer_name: str, image: Any
+) -> Optional[Dict[str, np.ndarray]]:
+    """Set a (raw frame) blob input on the request (zero-copy, see
+    preprocessing.raw_frame_blob), otherwise return the inputs to be copied into the
+    request input blob"""
+    if isinstance(image, Blob):
+        request.set_blob(input_layer_name, image)
+        return None
+    return {input_layer_name: image}
+
+
+class AsyncInferQueue:
+    """Keep up to len(network.requests) inference requests in flight (start_async/wait
+    ring)
+
+    Requests are started in a round-robin fashion: when the ring is full the oldest
+    request is waited for (and its result returned) before its slot is reused, so
+    results are always returned in submission (frame) order.
+    """
+
+    def __init__(
+        self,
+        network: ExecutableNetwork,
+        input_layer_name: str,
+        on_latency: Optional[Callable[[float], None]] = None,
+    ):
+        """
+        :param network: the loaded (executable) network, its number of requests defines
+            the queue depth
+        :param input_layer_name: the network input layer name
+        :param on_latency: optional callback receiving each request latency (start ->
+            completion) in seconds
+        """
+        self.network = network
+        self.input_layer_name = input_layer_name
+        self.on_latency = on_latency
+        self.depth = len(network.requests)
+        self._in_flight: Deque[Tuple[int, Any, float]] = deque()
+        self._next_request_id = 0
+
+    def __len__(self) -> int:
+        """Number of in-flight requests"""
+        return len(self._in_flight)
+
+    @property
+    def full(self) -> bool:
+        return len(self._in_flight) >= self.depth
+
+    def submit(self, image: np.ndarray, user_data: Any = None) -> Optional[InferResult]:
+        """Start an asynchronous inference on image
+
+        :param image: model ready (preprocessed) image or a raw frame blob (graph
+            preprocessing)
+        :param user_data: data attached to the request and returned with its result (ex:
+            the frame)
+
+        :return: the oldest request result if the ring was full (its slot is reused)
+            otherwise None
+        """
+        completed = self._complete_oldest() if self.full else None
+        request_id = self._next_request_id
+        self._next_request_id = (request_id + 1) % self.depth
+        request = self.network.requests[request_id]
+        request.async_infer(request_inputs(request, self.input_layer_name, image))
+        self._in_flight.append((request_id, user_data, monotonic()))
+        return completed
+
+    def drain(self) -> Iterator[InferResult]:
+        """Wait for all the in-flight requests yielding their results (in submission
+        order)"""
+        while self._in_flight:
+            yield self._complete_oldest()
+
+    def _complete_oldest(self) -> InferResult:
+        request_id, user_data, start = self._in_flight.popleft()
+        request = self.network.requests[request_id]
+        status = request.wait(-1)
+        if status != 0:
+            raise RuntimeError(
+                f"infer request {request_id} failed with status {status}"
+            )
+        if self.on_latency is not None:
+            self.on_latency(monotonic() - start)
+        # copy the output blobs (their buffers are reused by the next inference on this
+        # request)
+        return user_data, {
+            name: blob.buffer.copy() for name, blob in request.output_blobs.items()
+        }
+
+
+class InferRequestPool:
+    """Share the network infer requests between threads: each (synchronous) inference
+    borrows an idle request, so up to len(network.requests) threads infer
+    concurrently"""
+
+    def __init__(self, network: ExecutableNetwork, input_layer_name: str):
+        self.network = network
+        self.input_layer_name = input_layer_name
+        self._idle_requests: "queue.Queue[int]" = queue.Queue()
+        for request_id in range(len(network.requests)):
+            self._idle_requests.put(request_id)
+
+    def infer(self, image: np.ndarray) -> Dict[str, np.ndarray]:
+        """Infer image on an idle request (blocks until a request is idle)"""
+        request_id = self._idle_requests.get()
+        try:
+            request = self.network.requests[request_id]
+            request.infer(request_inputs(request, self.input_layer_name, image))
+            return {
+                name: blob.buffer.copy() for name, blob in request.output_blobs.items()
+            }
+        finally:
+            self._idle_requests.put(request_id)
@@ -0,0 +1,129 @@
+"""
+ Cross-source batched inference: frames submitted by several sources (ex: camera
+ threads) are gathered into one preallocated batch tensor and inferred at once
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from openvino_utils.openvino_model import preprocess_image_into
+from openvino_utils.single_image_openvino_model import SingleImageOpenVinoModel
+
+LOGGER = logging.getLogger()
+
+# split a batch prediction into per frame results: (prediction, number of frames) ->
+# results
+BatchSplitter = Callable[[Dict[str, np.ndarray], int], Sequence[Any]]
+
+# (source id, image, submission time, result future)
+PendingFrame = Tuple[Hashable, np.ndarray, float, Future]
+
+
+class FrameBatcher:
+    """Gather frames from multiple sources into one preallocated input tensor of the
+    model batch size
+
+    A batch is inferred as soon as it is full or when the oldest pending frame waited
+    max_wait seconds (partial batch). Each submitted frame gets a future resolved with
+    its own (split) result.
+    """
+
+    def __init__(
+        self,
+        model: SingleImageOpenVinoModel,
+        split: BatchSplitter,
+        max_wait: float = 0.01,
+    ):
+        """
+        :param model: a loaded model (reshaped to the wanted batch size, see
+            OpenVinoModel.batch_size)
+        :param split: batch prediction to per frame results splitter
+        :param max_wait: maximum waiting time (seconds) for a partial batch
+        """
+        self.model = model
+        self.split = split
+        self.max_wait = max_wait
+        self.batch_size = model.expected_input_shape[0]
+        self.tensor = np.zeros(model.expected_input_shape, dtype=np.float32)
+        self.batches = 0
+        self.batched_frames = 0
+        self._pending: Deque[PendingFrame] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="frame-batcher", daemon=True
+        )
+        self._dispatcher.start()
+
+    @property
+    def average_batch_fill(self) -> Optional[float]:
+        """Average number of frames per inferred batch"""
+        return self.batched_frames / self.batches if self.batches else None
+
+    def submit(self, source_id: Hashable, image: np.ndarray) -> Future:
+        """Submit a frame (from source_id) to the next batch
+        :return: a future resolved with the frame result
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("the batcher is closed")
+            self._pending.append((source_id, image, monotonic(), future))
+            self._condition.notify()
+        return future
+
+    def infer(
+        self, source_id: Hashable, image: np.ndarray, timeout: Optional[float] = None
+    ) -> Any:
+        """Submit a frame and wait for its result"""
+        return self.submit(source_id, image).result(timeout)
+
+    def close(self):
+        """Stop the dispatcher once the pending frames are processed"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._dispatcher.join()
+
+    def _next_batch(self) -> List[PendingFrame]:
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return []
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.batch_size and not self._closed:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [
+                self._pending.popleft()
+                for _ in range(min(self.batch_size, len(self._pending)))
+            ]
+
+    def _dispatch(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                for index, (_, image, _, _) in enumerate(batch):
+                    preprocess_image_into(image, self.tensor[index])
+                results = self.split(self.model.predict(self.tensor), len(batch))
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.error("batch inference failed: %s", error)
+                for *_, future in batch:
+                    future.set_exception(error)
+                continue
+            self.batches += 1
+            self.batched_frames += len(batch)
+            # route each frame result back to its source
+            for (*_, future), result in zip(batch, results):
+                future.set_result(result)
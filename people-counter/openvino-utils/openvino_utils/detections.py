@@ -0,0 +1,146 @@
+"""
+ Detection decoding: SSD-like (DetectionOutput) rows as a NumPy record array
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from openvino_utils.utils import RatioDetection, RatioPoint
+
+# one SSD (DetectionOutput) row: [image_id, label, confidence, x_min, y_min, x_max,
+# y_max]
+DETECTION_DTYPE = np.dtype(
+    [
+        ("image_id", np.float32),
+        ("label", np.float32),
+        ("confidence", np.float32),
+        ("x_min", np.float32),
+        ("y_min", np.float32),
+        ("x_max", np.float32),
+        ("y_max", np.float32),
+    ]
+)
+
+
+def empty_detections() -> np.recarray:
+    return np.recarray((0,), dtype=DETECTION_DTYPE)
+
+
+def as_detections(rows: np.ndarray) -> np.recarray:
+    """View (n, 7) float rows as a (n,) detection record array (no copy when rows are
+    contiguous float32)"""
+    rows = np.ascontiguousarray(rows, dtype=np.float32).reshape(-1, 7)
+    return rows.view(DETECTION_DTYPE).reshape(-1).view(np.recarray)
+
+
+def detection_sizes(detections: np.ndarray) -> np.ndarray:
+    """Detections (ratio) bounding box sizes"""
+    return (detections["x_max"] - detections["x_min"]) * (
+        detections["y_max"] - detections["y_min"]
+    )
+
+
+def detection_boxes(detections: np.ndarray) -> np.ndarray:
+    """Detections (ratio) bounding boxes as a (n, 4) [x_min, y_min, x_max, y_max]
+    array"""
+    return np.stack(
+        [
+            detections["x_min"],
+            detections["y_min"],
+            detections["x_max"],
+            detections["y_max"],
+        ],
+        axis=-1,
+    )
+
+
+def iou_matrix(boxes: np.ndarray, other_boxes: np.ndarray) -> np.ndarray:
+    """Pairwise intersection over union (Jaccard index) of two sets of (n, 4) and (m, 4)
+    boxes
+    :return: (n, m) IoU matrix
+    """
+    top_left = np.maximum(boxes[:, None, :2], other_boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], other_boxes[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=-1)
+    areas = np.prod(boxes[:, 2:] - boxes[:, :2], axis=-1)
+    other_areas = np.prod(other_boxes[:, 2:] - other_boxes[:, :2], axis=-1)
+    union = areas[:, None] + other_areas[None, :] - intersection
+    return np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union > 0
+    )
+
+
+def non_maxima_suppression(
+    boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5
+) -> np.ndarray:
+    """Greedy non-maxima suppression (on a single pairwise IoU matrix)
+    :param boxes: (n, 4) boxes
+    :param scores: (n,) boxes scores
+    :param iou_threshold: a box overlapping a better scored (kept) box above this
+        threshold is suppressed
+
+    :return: the kept boxes indices (by decreasing score)
+    """
+    order = np.argsort(-scores, kind="stable")
+    overlapping = iou_matrix(boxes[order], boxes[order]) > iou_threshold
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for index in range(len(order)):
+        if suppressed[index]:
+            continue
+        keep.append(index)
+        suppressed |= overlapping[index]
+    return order[keep]
+
+
+def decode_detections(
+    rows: np.ndarray,
+    min_confidence: float = 0.95,
+    top_k: Optional[int] = None,
+    nms_threshold: Optional[float] = None,
+) -> np.recarray:
+    """Decode SSD detection rows: filter by confidence, (optionally) suppress the
+    non-maxima, rank by (decreasing) size and keep the top_k
+
+    :param rows: (n, 7) detection rows as returned by the DetectionOutput layer
+    :param min_confidence: minimum confidence to filter detections
+    :param top_k: maximum number of (biggest) detections to keep (None to keep all)
+    :param nms_threshold: non-maxima suppression IoU threshold (None to keep the
+        overlapping detections)
+
+    :return: detection record array sorted by decreasing size
+    """
+    filtered = rows[rows[:, 2] >= min_confidence]
+    if nms_threshold is not None and len(filtered) > 1:
+        filtered = filtered[
+            np.sort(
+                non_maxima_suppression(
+                    filtered[:, 3:7], filtered[:, 2], iou_threshold=nms_threshold
+                )
+            )
+        ]
+    sizes = (filtered[:, 5] - filtered[:, 3]) * (filtered[:, 6] - filtered[:, 4])
+    # stable sort (keeps the output order of the equally sized detections)
+    order = np.argsort(-sizes, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+    return as_detections(filtered[order])
+
+
+def to_ratio_detections(detections: np.ndarray) -> List[RatioDetection]:
+    """Build RatioDetection objects from a detection record array"""
+    return [
+        RatioDetection(
+            top_left=RatioPoint(start_x, start_y),
+            bottom_right=RatioPoint(end_x, end_y),
+            confidence=confidence,
+        )
+        for confidence, start_x, start_y, end_x, end_y in zip(
+            detections["confidence"],
+            detections["x_min"],
+            detections["y_min"],
+            detections["x_max"],
+            detections["y_max"],
+        )
+    ]
@@ -0,0 +1,258 @@
+"""
+ FFmpeg capture backend: a local ffmpeg process decodes (and scales, on its own threads)
+ the input to raw frames read from its pipe into a ring of preallocated buffers (no
+ allocation per frame), behind the subset of the cv2.VideoCapture interface used by
+ InputFeeder
+"""
+
+import json
+import logging
+import subprocess
+from fractions import Fraction
+from typing import List, Optional, Union
+
+import cv2
+import numpy as np
+
+from openvino_utils.utils import ImageDimension
+
+LOGGER = logging.getLogger()
+
+# raw pixel formats -> channels (the frames are (height, width, channels) or (height,
+# width) arrays)
+PIXEL_FORMATS = {"bgr24": 3, "rgb24": 3, "gray": 1}
+
+
+def probe(source: str, ffprobe: str = "ffprobe") -> dict:
+    """The source (first) video stream width, height, fps and frame count (0 when
+    unknown: a live source)"""
+    output = subprocess.run(
+        [
+            ffprobe,
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames:format=duration",
+            "-of",
+            "json",
+            source,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    description = json.loads(output)
+    if not description.get("streams"):
+        raise ValueError(f"no video stream in {source}")
+    stream = description["streams"][0]
+    fps = 0.0
+    for rate in (stream.get("avg_frame_rate"), stream.get("r_frame_rate")):
+        try:
+            fps = float(Fraction(rate))
+        except (TypeError, ValueError, ZeroDivisionError):
+            continue
+        if fps:
+            break
+    try:
+        frames = int(stream.get("nb_frames", 0))
+    except ValueError:
+        frames = 0
+    if not frames:
+        try:
+            frames = int(float(description.get("format", {}).get("duration", 0)) * fps)
+        except ValueError:
+            frames = 0
+    return {
+        "width": stream["width"],
+        "height": stream["height"],
+        "fps": fps,
+        "frames": frames,
+    }
+
+
+class FFmpegCapture:
+    """Decode a video file, a stream url or a (v4l2) device with a local ffmpeg process
+
+    The frames are output by ffmpeg already scaled to dimension in pixel_format and read
+    (readinto) into a ring of buffers preallocated frames: a returned frame is
+    overwritten buffers reads later, the consumer should hold fewer frames (ex: the
+    pipeline in-flight frames) or copy them.
+
+    Seeking (CAP_PROP_POS_FRAMES) restarts the decoder at the frame timestamp (ffmpeg
+    decodes from the previous key frame and drops the frames before it).
+    """
+
+    # the frames are reused buffers (see InputFeeder.realtime_frames)
+    reuses_buffers = True
+
+    def __init__(
+        self,
+        source: Union[str, int],
+        dimension: Optional[ImageDimension] = None,
+        pixel_format: str = "bgr24",
+        buffers: int = 8,
+        threads: int = 0,
+        ffmpeg: str = "ffmpeg",
+        ffprobe: str = "ffprobe",
+    ):
+        """
+        :param source: video file, stream url or device index (/dev/video<index>)
+        :param dimension: output frames dimension (None for the source one)
+        :param pixel_format: output frames pixel format (bgr24, rgb24 or gray)
+        :param buffers: ring buffers (frames)
+        :param threads: ffmpeg decoding threads (0 for the ffmpeg default)
+        :param ffmpeg: ffmpeg executable
+        :param ffprobe: ffprobe executable
+        """
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(
+                f"unsupported pixel format {pixel_format} ({', '.join(PIXEL_FORMATS)})"
+            )
+        self.device = isinstance(source, int) or str(source).isdigit()
+        self.source = f"/dev/video{source}" if self.device else str(source)
+        self.pixel_format = pixel_format
+        self.threads = threads
+        self.ffmpeg = ffmpeg
+        try:
+            described = probe(self.source, ffprobe=ffprobe)
+        except FileNotFoundError as error:
+            raise RuntimeError(
+                f"{ffprobe} not found: install ffmpeg or use the opencv capture backend"
+            ) from error
+        except (subprocess.CalledProcessError, ValueError) as error:
+            if dimension is None:
+                raise RuntimeError(f"cannot probe {self.source}: {error}") from error
+            # (ex: a device) the output dimension is known
+            described = {
+                "width": dimension.width,
+                "height": dimension.height,
+                "fps": 0.0,
+                "frames": 0,
+            }
+        self.source_dimension = ImageDimension(
+            x=described["width"], y=described["height"]
+        )
+        self.dimension = dimension or self.source_dimension
+        self.fps = described["fps"]
+        self.frame_count = 0 if self.device else described["frames"]
+        shape = (int(self.dimension.height), int(self.dimension.width))
+        if PIXEL_FORMATS[pixel_format] > 1:
+            shape += (PIXEL_FORMATS[pixel_format],)
+        self._buffers: List[np.ndarray] = [
+            np.empty(shape, dtype=np.uint8) for _ in range(max(2, buffers))
+        ]
+        self._skipped = np.empty(shape, dtype=np.uint8)  # (grabbed frames)
+        self._next_buffer = 0
+        self._position = 0
+        self._ended = False
+        self._process: Optional[subprocess.Popen] = None
+        self._start(0)
+
+    @property
+    def frame_bytes(self) -> int:
+        return self._skipped.nbytes
+
+    def command(self, start: float = 0.0) -> List[str]:
+        """The ffmpeg decoding command (from the start timestamp)"""
+        command = [self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error"]
+        if self.threads:
+            command += ["-threads", str(self.threads)]
+        if start:
+            # (input seeking: from the previous key frame, the frames before start are
+            # dropped)
+            command += ["-ss", f"{start:.6f}"]
+        if self.device:
+            command += ["-f", "v4l2"]
+        command += ["-i", self.source, "-map", "0:v:0", "-an", "-sn"]
+        if self.dimension != self.source_dimension:
+            width, height = int(self.dimension.width), int(self.dimension.height)
+            command += ["-vf", f"scale={width}:{height}:flags=bilinear"]
+        return command + ["-f", "rawvideo", "-pix_fmt", self.pixel_format, "-"]
+
+    def _start(self, position: int):
+        self._stop()
+        try:
+            self._process = subprocess.Popen(
+                self.command(position / self.fps if position and self.fps else 0.0),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                bufsize=self.frame_bytes,
+            )
+        except FileNotFoundError as error:
+            raise RuntimeError(
+                f"{self.ffmpeg} not found: install ffmpeg or use the opencv capture "
+                "backend"
+            ) from error
+        self._position = position
+        self._ended = False
+
+    def _stop(self):
+        if self._process is None:
+            return
+        self._process.stdout.close()
+        self._process.terminate()
+        try:
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+    def _read_into(self, buffer: np.ndarray) -> bool:
+        """Fill a buffer with the next frame (False at the end of the stream)"""
+        if self._ended or self._process is None:
+            return False
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view):
+            read = self._process.stdout.readinto(view[filled:])
+            if not read:
+                # (a truncated last frame is dropped)
+                self._ended = True
+                return False
+            filled += read
+        self._position += 1
+        return True
+
+    def read(self):
+        """The next frame (flag, frame) as cv2.VideoCapture.read, the frame is a ring
+        buffer"""
+        buffer = self._buffers[self._next_buffer]
+        if not self._read_into(buffer):
+            return False, None
+        self._next_buffer = (self._next_buffer + 1) % len(self._buffers)
+        return True, buffer
+
+    def grab(self) -> bool:
+        """Skip the next frame (its bytes are read into a scratch buffer)"""
+        return self._read_into(self._skipped)
+
+    def isOpened(self) -> bool:  # pylint: disable=invalid-name
+        return self._process is not None and not self._ended
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.dimension.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.dimension.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self._position)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self._position * 1000 / self.fps if self.fps else 0.0
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        """Only CAP_PROP_POS_FRAMES is supported (on sources with a known frame rate)"""
+        if prop != cv2.CAP_PROP_POS_FRAMES or not self.fps or self.device:
+            return False
+        self._start(max(0, int(value)))
+        return True
+
+    def release(self):
+        self._stop()
+        self._ended = True
@@ -1,10 +1,95 @@
-from typing import Optional
+import threading
+from dataclasses import dataclass
+from math import ceil
+from time import monotonic, time
+from typing import Iterator, Optional
 
 import cv2
+import numpy as np
 
+from openvino_utils.ffmpeg_capture import FFmpegCapture
 from openvino_utils.utils import ImageDimension
 
 
+@dataclass
+class TimestampedFrame:
+    """A captured frame with its timestamps"""
+
+    frame: np.ndarray
+    # stream timestamp (video files) or wall clock timestamp (live sources) in seconds
+    timestamp: float
+    index: int  # frame index in the source
+    captured_at: float  # (monotonic) capture time, to measure the end-to-end latency
+
+
+class LatencyBudget:
+    """Real-time scheduling: adapt the sampling stride (1 / effective sampling rate) of
+    a source so the frames are processed within a target end-to-end latency"""
+
+    def __init__(
+        self,
+        target_latency: float,
+        fps: float = 0.0,
+        max_stride: int = 30,
+        smoothing: float = 0.1,
+    ):
+        """
+        :param target_latency: target end-to-end (capture -> output) latency in seconds
+        :param fps: source frame rate (used to convert the inference time into skipped
+            frames)
+        :param max_stride: maximum sampling stride
+        :param smoothing: measures exponential moving average smoothing factor
+        """
+        self.target_latency = target_latency
+        self.fps = fps
+        self.max_stride = max_stride
+        self.smoothing = smoothing
+        self.stride = 1
+        self.latency: Optional[float] = None  # smoothed end-to-end latency
+        # smoothed (per frame) inference time
+        self.inference_time: Optional[float] = None
+        self.stale_frames = 0
+        self._correction = 0
+
+    def _smooth(self, average: Optional[float], value: float) -> float:
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    @property
+    def sampling_rate(self) -> float:
+        """Effective sampling rate"""
+        return 1 / self.stride
+
+    def observe(self, latency: float, inference_time: Optional[float] = None):
+        """Observe a processed frame and adapt the sampling stride
+        :param latency: the frame end-to-end latency (seconds)
+        :param inference_time: the measured (per frame) inference time (seconds)
+        """
+        self.latency = self._smooth(self.latency, latency)
+        if inference_time is not None:
+            self.inference_time = self._smooth(self.inference_time, inference_time)
+        # frames produced by the source while one is inferred
+        base = (
+            ceil(self.inference_time * self.fps)
+            if self.inference_time and self.fps
+            else 1
+        )
+        # latency feedback (queued frames)
+        if self.latency > self.target_latency:
+            self._correction += 1
+        elif self.latency < self.target_latency / 2 and self._correction:
+            self._correction -= 1
+        self.stride = max(1, min(self.max_stride, base + self._correction))
+
+    def stale(self, frame: TimestampedFrame) -> bool:
+        """Check (and count) a frame already exceeding the latency budget"""
+        if monotonic() - frame.captured_at > self.target_latency:
+            self.stale_frames += 1
+            return True
+        return False
+
+
 def consume_a_slot(slots: Optional[int]) -> Optional[int]:
     """Consume slots helper"""
     return slots - 1 if slots is not None else None
@@ -15,23 +100,50 @@ class InputFeeder:
     A helper class to feed input from an image, webcam, or video.
     """
 
-    def __init__(self, input_type, input_file=None):
+    def __init__(
+        self,
+        input_type,
+        input_file=None,
+        backend: str = "opencv",
+        dimension: Optional[ImageDimension] = None,
+        buffers: int = 8,
+    ):
         """
         input_type: str, The type of input, "video" for video file, "image" for image file,
                     or "cam" to use webcam feed.
         input_file: str, image or video file (ignored when input_type == "cam")
+        backend: str, video/cam capture backend: "opencv" (cv2.VideoCapture) or "ffmpeg"
+        (a local ffmpeg decoding process, see openvino_utils.ffmpeg_capture)
+        dimension: ImageDimension, (ffmpeg backend) frames scaled to this dimension by
+        the decoder buffers: int, (ffmpeg backend) the frames ring buffers: a frame is
+        overwritten buffers reads later
         """
+        if backend not in ("opencv", "ffmpeg"):
+            raise ValueError(f"unknown capture backend {backend} (opencv or ffmpeg)")
         self.input_type = input_type
-        if self.input_type in set({"video", "image"}):
-            self.input_file = input_file
+        self.input_file = input_file
+        self.backend = backend
+        self.output_dimension = dimension
+        self.buffers = buffers
         self.capture = None
+        self.dropped_frames = 0  # frames skipped (or overwritten) by the real-time mode
 
     def load_data(self):
         """Initialize/load the video (or) the image input"""
-        if self.input_type == "video":
+        if self.backend == "ffmpeg" and self.input_type in ("video", "cam"):
+            self.capture = FFmpegCapture(
+                self.input_file
+                if self.input_type == "video"
+                else int(self.input_file or 0),
+                dimension=self.output_dimension,
+                buffers=self.buffers,
+            )
+        elif self.input_type == "video":
             self.capture = cv2.VideoCapture(self.input_file)
         elif self.input_type == "cam":
-            self.capture = cv2.VideoCapture(0)
+            self.capture = cv2.VideoCapture(
+                int(self.input_file) if self.input_file is not None else 0
+            )
         else:
             self.capture = cv2.imread(self.input_file)
 
@@ -42,6 +154,128 @@ class InputFeeder:
             y=self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT),
         )
 
+    @property
+    def fps(self) -> float:
+        return self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+
+    @property
+    def live(self) -> bool:
+        """A live source (webcam or a stream without a known frame count)"""
+        return (
+            self.input_type == "cam" or self.capture.get(cv2.CAP_PROP_FRAME_COUNT) <= 0
+        )
+
+    def timestamp(self, index: int) -> float:
+        """Frame timestamp: stream time for video files and wall clock for live
+        sources"""
+        if self.live:
+            return time()
+        if self.fps:
+            return index / self.fps
+        return self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+    def seek(self, index: int, overlap: int = 0) -> int:
+        """Seek a video file (at most overlap frames) before a frame index: the frames
+        from the returned position up to index are to be skipped (grabbed) so index is
+        decoded as by a sequential read
+        :param index: the wanted frame index
+        :param overlap: seek that many frames before index (ex: a key frame interval,
+            for the inaccurate seeking backends)
+
+        :return: the actual position (frame index of the next read)
+        """
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, max(0, index - overlap))
+        position = int(self.capture.get(cv2.CAP_PROP_POS_FRAMES))
+        if not 0 <= position <= index:
+            # (past the wanted frame) decode from the start
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            position = 0
+        return position
+
+    def frames(
+        self, start: int = 0, stop: Optional[int] = None, overlap: int = 0
+    ) -> Iterator[TimestampedFrame]:
+        """Yield the frames (timestamped) until the video ends
+        :param start: first frame index (video files are seeked, see seek)
+        :param stop: stop before this frame index (None for the video end)
+        :param overlap: seek overlap (frames, see seek)
+        """
+        index = self.seek(start, overlap=overlap) if start else 0
+        while stop is None or index < stop:
+            if index < start:
+                if not self.capture.grab():
+                    break
+                index += 1
+                continue
+            flag, frame = self.capture.read()
+            if not flag:
+                break
+            yield TimestampedFrame(frame, self.timestamp(index), index, monotonic())
+            index += 1
+
+    def realtime_frames(self, budget: LatencyBudget) -> Iterator[TimestampedFrame]:
+        """Yield the frames in real-time mode: for live sources always the freshest
+        frame (the frames captured in between are dropped), for video files the frames
+        are sampled with the budget stride (the skipped frames are grabbed but not
+        decoded)
+        """
+        if self.live:
+            yield from self._freshest_frames()
+            return
+        index = 0
+        while True:
+            flag, frame = self.capture.read()
+            if not flag:
+                break
+            yield TimestampedFrame(frame, self.timestamp(index), index, monotonic())
+            index += 1
+            for _ in range(budget.stride - 1):
+                if not self.capture.grab():
+                    return
+                self.dropped_frames += 1
+                index += 1
+
+    def _freshest_frames(self) -> Iterator[TimestampedFrame]:
+        latest = {"frame": None, "ended": False}
+        available = threading.Condition()
+        stop = threading.Event()
+
+        def grab():
+            index = 0
+            while not stop.is_set():
+                flag, frame = self.capture.read()
+                with available:
+                    if not flag:
+                        latest["ended"] = True
+                        available.notify()
+                        return
+                    if latest["frame"] is not None:
+                        self.dropped_frames += 1
+                    latest["frame"] = TimestampedFrame(
+                        frame, self.timestamp(index), index, monotonic()
+                    )
+                    available.notify()
+                index += 1
+
+        grabber = threading.Thread(target=grab, name="frame-grabber", daemon=True)
+        grabber.start()
+        try:
+            while True:
+                with available:
+                    while latest["frame"] is None and not latest["ended"]:
+                        available.wait()
+                    if latest["frame"] is None:
+                        return
+                    frame, latest["frame"] = latest["frame"], None
+                    if getattr(self.capture, "reuses_buffers", False):
+                        # (the grabber keeps filling the ring buffers) only the kept
+                        # frames are copied
+                        frame.frame = frame.frame.copy()
+                yield frame
+        finally:
+            stop.set()
+            grabber.join()
+
     def next_batch(self, sampling_rate: float = 0.1, limit: Optional[int] = None):
         """
         If input_type is 'image', then it returns self.capture (loaded image).
@@ -52,12 +286,14 @@ class InputFeeder:
 
         slots = limit
         # subsample the original video only yield each 1/sampling_rate
+        # (the skipped frames are grabbed: not decoded by opencv, not copied by ffmpeg)
         while slots is None or slots:
-            flag, frame = self.capture.read()
-            sample = 0
+            flag, sample = True, 0
             while flag and sample < (int(1 / sampling_rate)):
-                flag, frame = self.capture.read()
+                flag = self.capture.grab()
                 sample += 1
+            if flag:
+                flag, frame = self.capture.read()
             if not flag:
                 break
             # update slots
@@ -0,0 +1,369 @@
+"""
+ Live instrumentation: named counters, gauges and latency summaries any stage can
+ register, exposed on a local HTTP endpoint (Prometheus text format), and a sampling
+ profiler dumping the threads stacks
+"""
+
+import logging
+import os
+import sys
+import threading
+from collections import Counter as StackCounter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from openvino_utils.streaming_stats import LatencyStats
+
+LOGGER = logging.getLogger()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def process_start_time() -> Optional[float]:
+    """The process start (epoch) time, from /proc on Linux (clock ticks resolution)
+    otherwise from psutil when installed, None when unavailable"""
+    try:
+        with open("/proc/self/stat") as stat_file:
+            # (the fields after the command name, which may hold spaces: the start time
+            # is the 22nd field)
+            started = int(stat_file.read().rpartition(")")[2].split()[19]) / os.sysconf(
+                "SC_CLK_TCK"
+            )
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return time() - (uptime - started)
+    except (OSError, IndexError, ValueError, AttributeError):
+        # (AttributeError: no os.sysconf)
+        pass
+    try:
+        import psutil  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return psutil.Process().create_time()
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Counter:
+    """A monotonic counter (ex: processed frames), incremented or read from a
+    callback"""
+
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self.function = function
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        if self.function is not None:
+            return float(self.function() or 0.0)
+        return self._value
+
+
+class Gauge:
+    """A value set by its stage or read from a callback at collection time (ex: a queue
+    depth): a callback gauge costs nothing per frame"""
+
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self.function = function
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        if self.function is not None:
+            return float(self.function() or 0.0)
+        return self._value
+
+
+class MetricsRegistry:
+    """Named (and labeled) metrics registry: counters, gauges and latency summaries
+    (LatencyStats)
+
+    Registering the same name and labels twice returns the registered metric.
+    """
+
+    def __init__(self, namespace: str = "people_counter"):
+        self.namespace = namespace
+        # name -> (type, help, {labels: metric})
+        self._metrics: Dict[str, Tuple[str, str, Dict[Labels, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(
+        self,
+        kind: str,
+        name: str,
+        help_text: str,
+        labels: Optional[Dict[str, str]],
+        factory: Callable[[], Any],
+    ) -> Any:
+        name = f"{self.namespace}_{name}" if self.namespace else name
+        with self._lock:
+            registered_kind, _, series = self._metrics.setdefault(
+                name, (kind, help_text, {})
+            )
+            if registered_kind != kind:
+                raise ValueError(f"{name} is already registered as a {registered_kind}")
+            key = _labels(labels)
+            if key not in series:
+                series[key] = factory()
+            return series[key]
+
+    def counter(
+        self,
+        name: str,
+        help_text: str = "",
+        labels: Optional[Dict[str, str]] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Counter:
+        """A counter (read from function at collection time when set)"""
+        return self._register(
+            "counter", name, help_text, labels, lambda: Counter(function)
+        )
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str = "",
+        labels: Optional[Dict[str, str]] = None,
+        function: Optional[Callable[[], float]] = None,
+    ) -> Gauge:
+        """A gauge (read from function at collection time when set)"""
+        return self._register("gauge", name, help_text, labels, lambda: Gauge(function))
+
+    def summary(
+        self,
+        name: str,
+        help_text: str = "",
+        labels: Optional[Dict[str, str]] = None,
+        stats: Optional[LatencyStats] = None,
+    ) -> LatencyStats:
+        """A (latency) summary: streaming quantiles, sum and count (registers stats when
+        given)"""
+        return self._register(
+            "summary",
+            name,
+            help_text,
+            labels,
+            lambda: stats if stats is not None else LatencyStats(),
+        )
+
+    def timer(
+        self, name: str, help_text: str = "", labels: Optional[Dict[str, str]] = None
+    ):
+        """A summary measuring the wrapped calls duration (decorator)"""
+        stats = self.summary(name, help_text, labels)
+
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                start = monotonic()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    stats.add(monotonic() - start)
+
+            return wrapper
+
+        return decorator
+
+    def _series(self):
+        with self._lock:
+            return [
+                (name, kind, help_text, list(series.items()))
+                for name, (kind, help_text, series) in self._metrics.items()
+            ]
+
+    def render_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for name, kind, help_text, series in self._series():
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series:
+                if kind == "summary":
+                    summary = metric.summary()
+                    for key, value in summary.items():
+                        if key.startswith("p") and value is not None:
+                            quantile = float(key[1:]) / 100
+                            labels_text = _format_labels(
+                                labels, quantile=f"{quantile:g}"
+                            )
+                            lines.append(f"{name}{labels_text} {value}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {metric.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The metrics values (summaries as dicts) ex: to publish a periodic MQTT
+        summary"""
+        values: Dict[str, Any] = {}
+        for name, kind, _, series in self._series():
+            for labels, metric in series:
+                key = name + _format_labels(labels)
+                values[key] = metric.summary() if kind == "summary" else metric.value
+        return values
+
+
+class MetricsServer:
+    """Serve a registry metrics (GET /metrics) from a background thread"""
+
+    def __init__(
+        self, registry: MetricsRegistry, port: int = 9100, host: str = "0.0.0.0"
+    ):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        )
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class PeriodicTask:
+    """Call a function every interval seconds from a background thread (ex: publish a
+    metrics summary)"""
+
+    def __init__(
+        self, interval: float, function: Callable[[], None], name: str = "periodic"
+    ):
+        self.interval = interval
+        self.function = function
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.function()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("periodic task %s failed", self._thread.name)
+
+    def start(self) -> "PeriodicTask":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+
+class SamplingProfiler:
+    """Sample the threads stacks (sys._current_frames) every interval seconds and dump
+    the aggregated stacks in the folded format (one "thread;outer;...;inner count" line
+    per stack, for flame graphs)"""
+
+    def __init__(
+        self,
+        output_file: str,
+        interval: float = 0.01,
+        dump_interval: float = 10.0,
+        thread_prefixes: Optional[Sequence[str]] = None,
+    ):
+        """
+        :param output_file: folded stacks output (rewritten on each dump)
+        :param interval: sampling interval (seconds)
+        :param dump_interval: dump interval (seconds), the stacks are dumped at stop too
+        :param thread_prefixes: only sample the threads whose name starts with one of
+            these (ex: "infer")
+        """
+        self.output_file = output_file
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.thread_prefixes = tuple(thread_prefixes) if thread_prefixes else None
+        self.samples = 0
+        self.stacks: StackCounter = StackCounter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for (
+            ident,
+            frame,
+        ) in sys._current_frames().items():  # pylint: disable=protected-access
+            if ident == self._thread.ident:
+                continue
+            thread_name = names.get(ident, str(ident))
+            if self.thread_prefixes and not thread_name.startswith(
+                self.thread_prefixes
+            ):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                location = f"{os.path.basename(code.co_filename)}:{frame.f_lineno}"
+                stack.append(f"{code.co_name} ({location})")
+                frame = frame.f_back
+            self.stacks[(thread_name, *reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        next_dump = monotonic() + self.dump_interval
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+            if monotonic() >= next_dump:
+                self.dump()
+                next_dump = monotonic() + self.dump_interval
+
+    def dump(self):
+        """Write the aggregated stacks (folded format) atomically"""
+        temporary_file = f"{self.output_file}.tmp"
+        with open(temporary_file, "w") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{';'.join(stack)} {count}\n")
+        os.replace(temporary_file, self.output_file)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self.dump()
@@ -0,0 +1,165 @@
+"""
+ Persistent compiled network cache (OpenVino CACHE_DIR per model files hash, device and
+ configuration) with a size bounded (least recently used) eviction, and a lazily shared
+ IECore
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from time import time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from openvino.inference_engine import IECore
+
+LOGGER = logging.getLogger()
+
+_CORE: Optional[IECore] = None
+_CORE_LOCK = threading.Lock()
+# (the CACHE_DIR of a core applies to all its loads)
+_CACHE_DIR_LOCK = threading.Lock()
+
+# cache entry metadata file (cold loading time, last use)
+METADATA_FILE = "metadata.json"
+
+
+def shared_core() -> IECore:
+    """The process IECore (created on first use and shared by all the models)"""
+    global _CORE  # pylint: disable=global-statement
+    with _CORE_LOCK:
+        if _CORE is None:
+            _CORE = IECore()
+        return _CORE
+
+
+@contextmanager
+def core_cache_dir(ie: IECore, cache_dir: str, device_name: str) -> Iterator[IECore]:
+    """The core with its CACHE_DIR set to cache_dir during the context (the networks
+    loaded in it are exported to or imported from cache_dir)
+
+    CACHE_DIR is a core property (not a load_network plugin configuration), the contexts
+    are serialized so the concurrent loads on a shared core do not use each other cache
+    directory.
+    """
+    with _CACHE_DIR_LOCK:
+        ie.set_config({"CACHE_DIR": cache_dir}, device_name)
+        try:
+            yield ie
+        finally:
+            ie.set_config({"CACHE_DIR": ""}, device_name)
+
+
+def files_digest(paths: Iterable[str], chunk_size: int = 1 << 20) -> "hashlib._Hash":
+    """sha256 of the files contents"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as model_file:
+            for chunk in iter(lambda: model_file.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest
+
+
+def _directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class ModelCache:
+    """A directory of compiled network cache entries, one per (model files, device,
+    configuration) key
+
+    Each entry is the OpenVino CACHE_DIR of its key: a cold load compiles (and exports)
+    the network, a warm load imports it. When the entries exceed max_bytes the least
+    recently used ones are evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30):
+        """
+        :param directory: the cache root directory
+        :param max_bytes: the cache maximum size (bytes)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(
+        self, model_files: Iterable[str], device: str, config: Dict[str, Any]
+    ) -> str:
+        """The entry key: model files contents, device and (loading) configuration
+        hash"""
+        digest = files_digest(model_files)
+        digest.update(device.encode())
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()[:32]
+
+    def entry(self, key: str) -> str:
+        """The entry (CACHE_DIR) directory"""
+        return os.path.join(self.directory, key)
+
+    def metadata(self, key: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.entry(key), METADATA_FILE)) as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return {}
+
+    def is_warm(self, key: str) -> bool:
+        """The entry holds a compiled network (the next load imports it)"""
+        entry = self.entry(key)
+        return os.path.isdir(entry) and any(
+            name != METADATA_FILE for name in os.listdir(entry)
+        )
+
+    def record_load(self, key: str, loading_time: float, warm: bool) -> Dict[str, Any]:
+        """Record a load (its time and the entry last use) then evict the least recently
+        used entries
+
+        :return: the entry metadata (cold_loading_time, last_warm_loading_time,
+            last_used ...)
+        """
+        metadata = self.metadata(key)
+        metadata[
+            "last_warm_loading_time" if warm else "cold_loading_time"
+        ] = loading_time
+        metadata["last_used"] = time()
+        metadata["loads"] = metadata.get("loads", 0) + 1
+        entry = self.entry(key)
+        os.makedirs(entry, exist_ok=True)
+        temporary_file = os.path.join(entry, f"{METADATA_FILE}.{os.getpid()}")
+        with open(temporary_file, "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+        os.replace(temporary_file, os.path.join(entry, METADATA_FILE))
+        self.evict(keep=key)
+        return metadata
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove the least recently used entries until the cache fits in max_bytes
+        :param keep: an entry never evicted (ex: the one just loaded)
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            if os.path.isdir(self.entry(key)):
+                entries.append(
+                    (
+                        self.metadata(key).get("last_used", 0.0),
+                        key,
+                        _directory_size(self.entry(key)),
+                    )
+                )
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            LOGGER.info("evicting the compiled network cache entry %s", key)
+            # (another process may be evicting it too)
+            shutil.rmtree(self.entry(key), ignore_errors=True)
+            total -= size
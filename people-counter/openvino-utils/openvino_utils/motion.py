@@ -0,0 +1,131 @@
+"""
+ Motion gating: a cheap change detector (frame differencing on downscaled grayscale
+ frames) deciding which frames need an inference, the others reuse the last inferred
+ result
+"""
+
+import threading
+from time import perf_counter
+from typing import Dict, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from openvino_utils.streaming_stats import LatencyStats
+from openvino_utils.utils import ImageDimension, RatioBoundingBox
+
+
+class MotionGate:
+    """Gate the inference on the change between a frame and the last inferred one
+
+    The frames are downscaled (to width pixels wide) and converted to blurred grayscale
+    images: a frame is changed when more than min_changed_ratio of its (regions) pixels
+    differ by more than pixel_threshold from the last inferred frame. Comparing with the
+    last inferred frame (rather than the previous one) lets slow changes add up. An
+    inference is forced every refresh_interval seconds.
+    """
+
+    def __init__(
+        self,
+        width: int = 160,
+        pixel_threshold: int = 25,
+        min_changed_ratio: float = 0.002,
+        refresh_interval: float = 1.0,
+        regions: Optional[Sequence[RatioBoundingBox]] = None,
+    ):
+        """
+        :param width: downscaled frames width (pixels)
+        :param pixel_threshold: minimum (grayscale) difference of a changed pixel
+        :param min_changed_ratio: minimum changed pixels ratio of a changed frame
+        :param refresh_interval: maximum time (seconds, frames timestamps) without
+            inference
+        :param regions: only the changes in these regions (frame ratios) gate the
+            inference (None for the whole frame)
+        """
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.refresh_interval = refresh_interval
+        self.regions = list(regions or [])
+        self.frames = 0
+        self.skipped_frames = 0
+        self.latency = LatencyStats()  # gating (downscale and difference) time
+        self._reference: Optional[np.ndarray] = None  # last inferred (downscaled) frame
+        self._inferred_at: Optional[float] = None
+        self._mask: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def skip_ratio(self) -> Optional[float]:
+        return self.skipped_frames / self.frames if self.frames else None
+
+    def _downscaled(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # (sensor noise)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def _regions_mask(self, shape) -> Optional[np.ndarray]:
+        if not self.regions:
+            return None
+        if self._mask is None or self._mask.shape != shape:
+            self._mask = np.zeros(shape, dtype=bool)
+            dimension = ImageDimension(x=shape[1], y=shape[0])
+            for region in self.regions:
+                box = region.project(dimension)
+                self._mask[
+                    box.top_left.y : box.bottom_right.y + 1,
+                    box.top_left.x : box.bottom_right.x + 1,
+                ] = True
+        return self._mask
+
+    def changed_ratio(self, small: np.ndarray) -> float:
+        """The ratio of the (regions) pixels changed since the last inferred frame"""
+        changed = cv2.absdiff(small, self._reference) > self.pixel_threshold
+        mask = self._regions_mask(small.shape)
+        if mask is None:
+            return np.count_nonzero(changed) / changed.size
+        return np.count_nonzero(changed & mask) / max(1, np.count_nonzero(mask))
+
+    def update(self, frame: np.ndarray, timestamp: float) -> bool:
+        """Decide whether a frame needs an inference (frames are expected in order)
+        :param frame: the (height, width, depth) frame
+        :param timestamp: the frame timestamp (seconds)
+
+        :return: True to infer the frame, False to reuse the last inferred result
+        """
+        start = perf_counter()
+        small = self._downscaled(frame)
+        with self._lock:
+            self.frames += 1
+            infer = (
+                self._reference is None
+                or timestamp - self._inferred_at >= self.refresh_interval
+                or self.changed_ratio(small) >= self.min_changed_ratio
+            )
+            if infer:
+                self._reference = small
+                self._inferred_at = timestamp
+            else:
+                self.skipped_frames += 1
+        self.latency.add(perf_counter() - start)
+        return infer
+
+    def summary(
+        self, inference_time: Optional[float] = None
+    ) -> Dict[str, Optional[float]]:
+        """Gating summary
+        :param inference_time: the mean (per frame) inference time to estimate the saved
+            compute
+        """
+        return {
+            "frames": self.frames,
+            "skipped_frames": self.skipped_frames,
+            "skip_ratio": self.skip_ratio,
+            "gating_time": self.latency.mean,
+            "saved_inference_seconds": (
+                self.skipped_frames * inference_time if inference_time else None
+            ),
+        }
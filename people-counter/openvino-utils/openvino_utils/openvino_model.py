@@ -1,17 +1,19 @@
 import logging
+from contextlib import nullcontext
 from dataclasses import dataclass
-
 from time import monotonic, time
 from typing import Dict, Optional, Tuple
 
 import cv2
-
 import numpy as np
-
 from openvino.inference_engine import IECore
 from openvino.inference_engine.ie_api import ExecutableNetwork
 from pydantic import BaseModel
 
+from openvino_utils.model_cache import core_cache_dir, ModelCache, shared_core
+from openvino_utils.preprocessing import enable_graph_preprocessing
+from openvino_utils.tuning import host_id, model_key, TuningProfile
+
 LOGGER = logging.getLogger()
 
 import os
@@ -38,33 +40,77 @@ def preprocess_image_input(image: np.ndarray, output_shape: np.ndarray) -> np.nd
 
     return (
         cv2.resize(image, (width, height))
-        .transpose((2, 0, 1)) # transpose (so the channel occupies the first dimension)
+        .transpose((2, 0, 1))  # transpose (so the channel occupies the first dimension)
         .reshape(1, 3, height, width)
     )
 
 
+def preprocess_image_into(image: np.ndarray, output: np.ndarray) -> np.ndarray:
+    """Preprocess image into a (preallocated) model input slot
+    :param image: np.ndarray (height, width, depth)
+    :param output: (depth, output_height, output_width) slot (ex: a batch tensor item)
+    :return: the filled output slot
+    """
+    height, width = output.shape[-2:]
+    # transpose (so the channel occupies the first dimension) while copying into the
+    # slot
+    np.copyto(output, cv2.resize(image, (width, height)).transpose((2, 0, 1)))
+    return output
+
+
 def load_with_IECore(
     model_definition: ModelDefinition,
-    ie=IECore(),
+    ie: Optional[IECore] = None,
     device_name: str = "CPU",
     num_requests: int = 1,
+    config: Optional[Dict[str, str]] = None,
+    batch_size: int = 1,
+    graph_preprocessing: bool = False,
+    swap_rb: bool = False,
+    cache_dir: Optional[str] = None,
 ) -> Tuple[ExecutableNetwork, str]:
     """
     load a model using  IECore
+    :param ie: the IECore (defaults to the process shared one)
     :param device_name: the device name ex: "CPU"
     :param model_definition: model definition as an OpenVinoModel
     :param num_request: number of the requests (default = 1)
+    :param config: plugin configuration (ex: {"CPU_THROUGHPUT_STREAMS":
+        "CPU_THROUGHPUT_AUTO"})
+    :param batch_size: the network (input) batch size, the network is reshaped when
+        different from its own
+    :param graph_preprocessing: the network takes raw frames (resized and converted by
+        the plugin)
+    :param swap_rb: (graph preprocessing) swap the frames red and blue channels
+    :param cache_dir: the compiled network cache directory (set as the core CACHE_DIR
+        during the load)
     :return: the tuple (network, input_name)
     """
+    ie = ie or shared_core()
     net = ie.read_network(
         model=model_definition.structure, weights=model_definition.weights
     )
-    exec_net = ie.load_network(
-        network=net, device_name=device_name, num_requests=num_requests
-    )
+    if batch_size != 1:
+        net.reshape(
+            {
+                name: (batch_size, *info.input_data.shape[1:])
+                for name, info in net.input_info.items()
+            }
+        )
     input_layer = next(
         iter(net.input_info)
     )  # to check if it is equivalent to 2021 next(iter(model.inputs))
+    if graph_preprocessing:
+        enable_graph_preprocessing(net, input_layer, swap_rb=swap_rb)
+    with nullcontext() if cache_dir is None else core_cache_dir(
+        ie, cache_dir, device_name
+    ):
+        exec_net = ie.load_network(
+            network=net,
+            device_name=device_name,
+            config=config or {},
+            num_requests=num_requests,
+        )
     # print(net.input_info[input_layer].input_data.shape)
     return exec_net, input_layer
 
@@ -75,10 +121,32 @@ class OpenVinoModel(BaseModel):
     model_name: str
     model_directory: str
     device: str = "CPU"
+    # number of infer requests (> 1 enables the asynchronous mode)
+    num_requests: int = 1
+    plugin_config: Dict[str, str] = {}
+    # network (input) batch size (the network is reshaped at loading time)
+    batch_size: int = 1
+    # swap the input images red and blue channels (while preprocessing)
+    swap_rb: bool = False
+    # raw frames are resized/converted in the graph (by the plugin)
+    graph_preprocessing: bool = False
     network: Optional[ExecutableNetwork] = None
     input_layer_name: Optional[str] = None
     # extensions = None (if the model requires plugin) # todo clean-up
     loading_time: Optional[float] = None
+    # compiled networks cache (None to always compile)
+    cache_directory: Optional[str] = None
+    # compiled networks cache size (least recently used entries evicted)
+    cache_max_bytes: int = 1 << 30
+    cache_state: Optional[str] = None  # "cold" (compiled) or "warm" (imported) load
+    # the cache entry metadata (cold and last warm loading times)
+    cache_metadata: Dict = {}
+    # apply the host tuning profile (see tuning.py) to the plugin_config and
+    # num_requests not given
+    tuning: bool = True
+    # tuning profile path (None: this host default profile)
+    tuning_profile: Optional[str] = None
+    tuned: bool = False  # the tuning profile was applied
 
     class Config:
         arbitrary_types_allowed = True
@@ -102,17 +170,101 @@ class OpenVinoModel(BaseModel):
 
     @property
     def loading_summary(self) -> Dict:
-        return {"model_name": self.model_name, "loading_time": self.loading_time}
+        return {
+            "model_name": self.model_name,
+            "loading_time": self.loading_time,
+            "cache": self.cache_state or "disabled",
+            "tuned": self.tuned,
+            "plugin_config": self.effective_plugin_config,
+            "num_requests": self.num_requests,
+            "cold_loading_time": self.cache_metadata.get("cold_loading_time"),
+            "warm_loading_time": self.cache_metadata.get("last_warm_loading_time"),
+        }
+
+    @property
+    def effective_plugin_config(self) -> Dict[str, str]:
+        """Plugin configuration (using as many CPU streams as the device can afford
+        when multiple requests are in flight unless explicitly configured)"""
+        config = dict(self.plugin_config)
+        if self.num_requests > 1 and self.device == "CPU":
+            config.setdefault("CPU_THROUGHPUT_STREAMS", "CPU_THROUGHPUT_AUTO")
+        return config
+
+    def apply_tuning_profile(self) -> bool:
+        """Apply the tuning profile configuration of this model (and device) to the
+        plugin_config and num_requests that were not explicitly given
+
+        :return: the profile was applied
+        """
+        explicit = {"plugin_config", "num_requests"} & self.__fields_set__
+        if not self.tuning or self.tuned or len(explicit) == 2:
+            return self.tuned
+        profile = TuningProfile.load(self.tuning_profile)
+        if profile is None:
+            return False
+        tuned = profile.models.get(
+            model_key(self.model_directory, self.model_name, self.device)
+        )
+        if tuned is None:
+            return False
+        if profile.host != host_id():
+            LOGGER.warning(
+                "applying a tuning profile of another host (%s)", profile.host
+            )
+        if "plugin_config" not in explicit:
+            self.plugin_config = dict(tuned.plugin_config)
+        if "num_requests" not in explicit:
+            self.num_requests = tuned.num_requests
+        self.tuned = True
+        LOGGER.info(
+            "%s tuned configuration: %s x%d requests",
+            self.model_name,
+            self.plugin_config,
+            self.num_requests,
+        )
+        return True
 
     def load_model(self):
-        """Load the model"""
+        """Load the model (importing its compiled network from the cache when warm) with
+        the host tuning profile configuration unless explicitly configured"""
         start = monotonic()
+        self.apply_tuning_profile()
+        model_definition = ModelDefinition.from_path(
+            os.path.join(self.model_directory, self.model_name)
+        )
+        config = self.effective_plugin_config
+        cache, cache_key, warm = None, None, False
+        if self.cache_directory:
+            cache = ModelCache(self.cache_directory, max_bytes=self.cache_max_bytes)
+            cache_key = cache.key(
+                [model_definition.structure, model_definition.weights],
+                self.device,
+                {
+                    **config,
+                    "batch_size": self.batch_size,
+                    "graph_preprocessing": self.graph_preprocessing,
+                    "swap_rb": self.swap_rb,
+                },
+            )
+            warm = cache.is_warm(cache_key)
         self.network, self.input_layer_name = load_with_IECore(
-            ModelDefinition.from_path(
-                os.path.join(self.model_directory, self.model_name)
-            ),
+            model_definition,
             device_name=self.device,
-            num_requests=1,
+            num_requests=self.num_requests,
+            config=config,
+            batch_size=self.batch_size,
+            graph_preprocessing=self.graph_preprocessing,
+            swap_rb=self.swap_rb,
+            cache_dir=None if cache is None else cache.entry(cache_key),
         )
         loading_time = monotonic() - start
         self.loading_time = loading_time
+        if cache is not None:
+            self.cache_state = "warm" if warm else "cold"
+            self.cache_metadata = cache.record_load(cache_key, loading_time, warm)
+            LOGGER.info(
+                "%s loaded in %.3fs (%s compiled network cache)",
+                self.model_name,
+                loading_time,
+                self.cache_state,
+            )
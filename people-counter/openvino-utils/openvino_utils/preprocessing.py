@@ -0,0 +1,169 @@
+"""
+ Allocation free model input preprocessing: frames are resized into preallocated NCHW
+ input buffers (reused across frames), or handed raw to the network when the
+ preprocessing runs in the graph
+"""
+
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Set
+
+import cv2
+import numpy as np
+from openvino.inference_engine import Blob, ColorFormat, ResizeAlgorithm, TensorDesc
+from openvino.inference_engine.ie_api import IENetwork
+
+from openvino_utils.streaming_stats import LatencyStats
+
+
+class ImagePreprocessor:
+    """Resize (and optionally swap the red and blue channels of) images into
+    preallocated NCHW buffers
+
+    Buffers are handed out by acquire (preprocess) and given back with release once the
+    inference consumed them: the free list only grows to the number of frames in flight,
+    then no memory is allocated per frame. The (small) resized image channels are
+    swapped while being split into the buffer planes, so a full frame color conversion
+    is never needed.
+    """
+
+    def __init__(
+        self, input_shape: Sequence[int], swap_rb: bool = False, dtype=np.uint8
+    ):
+        """
+        :param input_shape: the model input shape (batch=1, depth, height, width)
+        :param swap_rb: swap the red and blue channels (ex: BGR frames to an RGB model)
+        :param dtype: the input buffers type
+        """
+        self.input_shape = tuple(input_shape)
+        self.swap_rb = swap_rb
+        self.dtype = dtype
+        self.allocated_buffers = 0
+        self._free: List[np.ndarray] = []
+        self._owned: Set[int] = set()  # the (never freed) buffers ids
+        self._lock = threading.Lock()
+        # per thread (height, width, depth) resize buffer
+        self._scratch = threading.local()
+
+    def acquire(self) -> np.ndarray:
+        """Get an idle input buffer (allocated only when all of them are in flight)"""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated_buffers += 1
+            buffer = np.empty(self.input_shape, dtype=self.dtype)
+            self._owned.add(id(buffer))
+        return buffer
+
+    def release(self, buffer: np.ndarray):
+        """Give an input buffer back once its inference consumed it (other arrays are
+        ignored)"""
+        with self._lock:
+            if id(buffer) in self._owned:
+                self._free.append(buffer)
+
+    def _resized(self, image: np.ndarray) -> np.ndarray:
+        height, width = self.input_shape[-2:]
+        scratch = getattr(self._scratch, "image", None)
+        if scratch is None or scratch.shape[-1] != image.shape[-1]:
+            scratch = self._scratch.image = np.empty(
+                (height, width, image.shape[-1]), dtype=image.dtype
+            )
+        return cv2.resize(image, (width, height), dst=scratch)
+
+    def preprocess_into(self, image: np.ndarray, output: np.ndarray) -> np.ndarray:
+        """Preprocess image into output (a (depth, height, width) slot or a (1, depth,
+        height, width) buffer)"""
+        resized = self._resized(image)
+        # split the channels straight into the (contiguous) output planes: the HWC to
+        # CHW transposition
+        # (and the channels swap, by reversing the planes) without any intermediate
+        # image
+        planes = list(output.reshape(output.shape[-3:]))
+        if self.swap_rb:
+            planes.reverse()
+        if cv2.split(resized, planes)[0] is not planes[0]:
+            # (not written in place)
+            channels = resized[..., ::-1] if self.swap_rb else resized
+            np.copyto(output.reshape(output.shape[-3:]), channels.transpose((2, 0, 1)))
+        return output
+
+    def preprocess(self, image: np.ndarray) -> np.ndarray:
+        """Preprocess image into an acquired buffer (to be released once inferred)"""
+        return self.preprocess_into(image, self.acquire())
+
+    @contextmanager
+    def prepared(self, image: np.ndarray) -> Iterator[np.ndarray]:
+        """Preprocess image into a buffer released when leaving the context"""
+        buffer = self.preprocess(image)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+
+def enable_graph_preprocessing(
+    network: IENetwork, input_layer_name: str, swap_rb: bool = False
+):
+    """Move the preprocessing into the network: it takes the raw (uint8, NHWC, any size)
+    frames, the resizing, layout/precision conversion and channels swapping are done by
+    the plugin
+    :param network: the (not loaded yet) network
+    :param input_layer_name: the network input layer name
+    :param swap_rb: swap the red and blue channels (the frames are declared RGB to a BGR
+        model)
+    """
+    input_info = network.input_info[input_layer_name]
+    input_info.precision = "U8"
+    input_info.layout = "NHWC"
+    input_info.preprocess_info.resize_algorithm = ResizeAlgorithm.RESIZE_BILINEAR
+    if swap_rb:
+        input_info.preprocess_info.color_format = ColorFormat.RGB
+
+
+def raw_frame_blob(frame: np.ndarray) -> Blob:
+    """Wrap a raw (height, width, depth) uint8 frame (without any copy) as an NHWC input
+    blob (for a network with the graph preprocessing enabled, see
+    enable_graph_preprocessing)"""
+    height, width, depth = frame.shape
+    return Blob(
+        TensorDesc("U8", [1, depth, height, width], "NHWC"),
+        np.ascontiguousarray(frame).reshape(1, height, width, depth),
+    )
+
+
+def profile_preprocessing(
+    preprocess: Callable[[np.ndarray], Any], frames: Sequence[np.ndarray]
+) -> Dict[str, Any]:
+    """Measure a preprocessing function per frame latency and (python/numpy traced)
+    allocations
+    :param preprocess: the preprocessing function (its result is dropped)
+    :param frames: the frames to preprocess (the latency and allocations are measured on
+        separate runs)
+
+    :return: {"latency": latency summary (seconds), "allocated_bytes_per_frame": peak
+        traced allocation}
+    """
+    latency = LatencyStats()
+    for frame in frames:
+        start = perf_counter()
+        preprocess(frame)
+        latency.add(perf_counter() - start)
+
+    tracemalloc.start()
+    allocated_bytes = 0
+    try:
+        for frame in frames:
+            # (also resets the peak)
+            tracemalloc.clear_traces()
+            preprocess(frame)
+            # (transient) allocations raise the traced memory peak
+            allocated_bytes += tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "latency": latency.summary(),
+        "allocated_bytes_per_frame": allocated_bytes / len(frames),
+    }
@@ -0,0 +1,189 @@
+"""
+ Detection propagation: the detector runs every k frames (k adapted to the motion and to
+ the propagation accuracy), the boxes are carried forward in between with a sparse
+ (Lucas-Kanade) optical flow on downscaled frames
+"""
+
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from openvino_utils.detections import (
+    as_detections,
+    detection_boxes,
+    empty_detections,
+    iou_matrix,
+)
+
+# the optical flow points grid (per box side)
+GRID_SIZE = 5
+
+
+class DetectionPropagator:
+    """Schedule the detector frames and propagate the last detections on the frames in
+    between
+
+    Each box is moved by the median displacement of a grid of points tracked with a
+    pyramidal Lucas-Kanade optical flow (the points failing the forward-backward check
+    are ignored). The detection interval grows (up to max_interval) while the propagated
+    boxes match the next detections and shrinks (down to min_interval) on fast motion,
+    lost boxes or a propagation disagreeing with the detector.
+
+    In a staged pipeline schedule runs ahead of synchronize/propagate by the frames in
+    flight between them: the interval changes and the lost boxes apply to the frames
+    scheduled after those (see CounterStages.stages, bounding that lag).
+    """
+
+    def __init__(
+        self,
+        min_interval: int = 1,
+        max_interval: int = 8,
+        width: int = 320,
+        max_motion: float = 0.02,
+        min_points: int = 4,
+        min_iou: float = 0.5,
+        max_error: float = 1.0,
+    ):
+        """
+        :param min_interval: minimum detection interval (frames)
+        :param max_interval: maximum detection interval (frames)
+        :param width: downscaled frames width (pixels)
+        :param max_motion: (frame ratio) per frame box displacement beyond which the
+            interval shrinks
+        :param min_points: minimum tracked points to move a box (otherwise the box is
+            lost)
+        :param min_iou: minimum IoU between the propagated boxes and the next detections
+            to grow the interval
+        :param max_error: maximum forward-backward error (downscaled pixels) of a
+            tracked point
+        """
+        if not 1 <= min_interval <= max_interval:
+            raise ValueError("1 <= min_interval <= max_interval expected")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.width = width
+        self.max_motion = max_motion
+        self.min_points = min_points
+        self.min_iou = min_iou
+        self.max_error = max_error
+        self.interval = min_interval
+        self.detected_frames = 0
+        self.propagated_frames = 0
+        # a box could not be propagated: detect on the next scheduled frame (the frames
+        # already scheduled
+        # keep the box in place)
+        self.lost = False
+        self._scheduled = False  # (the first frame is a detector frame)
+        self._since_detection = 0
+        # the previous (downscaled, grayscale) frame
+        self._previous: Optional[np.ndarray] = None
+        # the current (detected or propagated) detections
+        self._detections = empty_detections()
+        self._lock = threading.Lock()
+
+    def schedule(self) -> bool:
+        """Decide whether the next frame is a detector frame (frames are expected in
+        order)"""
+        with self._lock:
+            if (
+                self.lost
+                or not self._scheduled
+                or self._since_detection + 1 >= self.interval
+            ):
+                self._scheduled = True
+                self._since_detection = 0
+                self.lost = False
+                return True
+            self._since_detection += 1
+            return False
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def _adapt(self, grow: bool):
+        with self._lock:
+            if grow:
+                self.interval = min(self.max_interval, self.interval + 1)
+            else:
+                self.interval = max(self.min_interval, self.interval // 2)
+
+    def synchronize(self, frame: np.ndarray, detections: np.recarray) -> np.recarray:
+        """Re-synchronize on a detector frame: the detections replace the propagated
+        boxes, the interval grows when the propagated (or the last detected) boxes
+        matched them
+        :param frame: the detector (height, width, depth) frame
+        :param detections: its detections record array
+
+        :return: the detections
+        """
+        if self._previous is not None:
+            matched = len(self._detections) == len(detections)
+            if matched and len(detections):
+                ious = iou_matrix(
+                    detection_boxes(self._detections), detection_boxes(detections)
+                )
+                matched = bool(np.all(ious.max(axis=1) >= self.min_iou))
+            self._adapt(matched)
+        self.detected_frames += 1
+        self._previous = self._gray(frame)
+        self._detections = detections
+        return detections
+
+    def propagate(self, frame: np.ndarray) -> np.recarray:
+        """Carry the last detections forward to frame (the frame following the last
+        synchronized or propagated one)
+
+        :return: the propagated detections record array (frame ratios)
+        """
+        gray = self._gray(frame)
+        self.propagated_frames += 1
+        previous, self._previous = self._previous, gray
+        if previous is None or not len(self._detections):
+            return self._detections
+        height, width = gray.shape
+        scale = np.array([width - 1, height - 1], dtype=np.float32)
+        boxes = detection_boxes(self._detections)
+        # a grid of points inside each box (downscaled pixels)
+        steps = (np.arange(GRID_SIZE, dtype=np.float32) + 0.5) / GRID_SIZE
+        grid = np.stack(np.meshgrid(steps, steps), axis=-1).reshape(-1, 2)
+        points = (
+            boxes[:, None, :2] + grid[None] * (boxes[:, None, 2:] - boxes[:, None, :2])
+        ) * scale
+        points = points.reshape(-1, 1, 2).astype(np.float32)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(
+            previous, gray, points, None, winSize=(15, 15), maxLevel=2
+        )
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(
+            gray, previous, moved, None, winSize=(15, 15), maxLevel=2
+        )
+        valid = (
+            (status.reshape(-1) == 1)
+            & (back_status.reshape(-1) == 1)
+            & (np.linalg.norm((back - points).reshape(-1, 2), axis=1) <= self.max_error)
+        ).reshape(len(boxes), -1)
+        displacements = ((moved - points).reshape(len(boxes), -1, 2)) / scale
+        rows = (
+            np.ascontiguousarray(self._detections)
+            .view(np.float32)
+            .reshape(-1, 7)
+            .copy()
+        )
+        fast = False
+        for index, box_valid in enumerate(valid):
+            if np.count_nonzero(box_valid) < self.min_points:
+                # (kept in place until the next detection)
+                self.lost = True
+                continue
+            displacement = np.median(displacements[index][box_valid], axis=0)
+            fast |= bool(np.linalg.norm(displacement) > self.max_motion)
+            rows[index, 3:7] = np.clip(
+                rows[index, 3:7] + np.tile(displacement, 2), 0.0, 1.0
+            )
+        if fast or self.lost:
+            self._adapt(False)
+        self._detections = as_detections(rows)
+        return self._detections
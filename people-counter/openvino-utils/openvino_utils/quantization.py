@@ -0,0 +1,232 @@
+"""
+ Post-training (INT8) quantization: calibration frames sampled from local videos, the
+ OpenVino post-training optimization tool (openvino-dev) run on them, and the detections
+ agreement between a reference (FP32) model and a quantized one
+"""
+
+import logging
+import os
+from typing import Dict, Iterator, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from openvino_utils.detections import detection_boxes, iou_matrix
+from openvino_utils.input_feeder import InputFeeder
+from openvino_utils.preprocessing import ImagePreprocessor
+
+LOGGER = logging.getLogger()
+
+# the quantized models precision directory (next to the FP16/FP32 ones)
+INT8_PRECISION = "INT8"
+
+
+def sample_frames(input_files: Sequence[str], frames: int) -> Iterator[np.ndarray]:
+    """Sample (evenly) about frames frames across the input videos
+    :param input_files: local video files
+    :param frames: total number of sampled frames (split between the videos)
+    """
+    per_video = max(1, frames // max(1, len(input_files)))
+    for input_file in input_files:
+        input_feeder = InputFeeder("video", input_file)
+        input_feeder.load_data()
+        try:
+            frame_count = input_feeder.capture.get(cv2.CAP_PROP_FRAME_COUNT)
+            sampling_rate = (
+                min(1.0, per_video / frame_count) if frame_count > 0 else 1.0
+            )
+            yield from input_feeder.next_batch(
+                sampling_rate=sampling_rate, limit=per_video
+            )
+        finally:
+            input_feeder.close()
+
+
+class CalibrationFrames:
+    """Calibration dataset: frames preprocessed as the inference ones (model ready
+    (depth, height, width) inputs, see ImagePreprocessor) to be iterated by the
+    post-training optimization tool"""
+
+    def __init__(
+        self,
+        frames: Sequence[np.ndarray],
+        input_shape: Sequence[int],
+        swap_rb: bool = False,
+    ):
+        """
+        :param frames: (height, width, depth) frames (ex: see sample_frames)
+        :param input_shape: the model input shape (batch=1, depth, height, width)
+        :param swap_rb: swap the red and blue channels (as done by the inference)
+        """
+        preprocessor = ImagePreprocessor(input_shape, swap_rb=swap_rb)
+        self.inputs = [
+            preprocessor.preprocess_into(
+                frame, np.empty(input_shape[1:], dtype=np.uint8)
+            )
+            for frame in frames
+        ]
+
+    def __len__(self) -> int:
+        return len(self.inputs)
+
+    def __getitem__(self, index: int):
+        """(data, annotation) item: no annotation, the default quantization only
+        collects statistics"""
+        if index >= len(self.inputs):
+            raise IndexError(index)
+        return self.inputs[index], None
+
+
+def quantize(
+    model_directory: str,
+    model_name: str,
+    output_directory: str,
+    calibration: CalibrationFrames,
+    device: str = "CPU",
+    preset: str = "performance",
+) -> str:
+    """Quantize a (FP32 or FP16) IR model to INT8 with the post-training optimization
+    tool default quantization, calibrated on the calibration frames
+
+    :param model_directory: the (reference precision) model directory
+    :param model_name: the model name (the xml/bin files prefix)
+    :param output_directory: the quantized model directory (ex: .../<model>/INT8)
+    :param calibration: the calibration frames
+    :param device: the target device
+    :param preset: "performance" (symmetric) or "mixed" (asymmetric activations)
+        quantization
+
+    :return: the quantized model structure (xml) path
+    """
+    # (optional dependency: openvino-dev, see requirements-dev.txt)
+    try:
+        from openvino.tools.pot import (  # pylint: disable=import-outside-toplevel
+            compress_model_weights,
+            create_pipeline,
+            DataLoader,
+            IEEngine,
+            load_model,
+            save_model,
+        )
+    except ImportError as error:
+        raise ImportError(
+            "the INT8 quantization requires the post-training optimization tool "
+            "(pip install openvino-dev)"
+        ) from error
+
+    class FramesLoader(DataLoader):
+        def __init__(self, frames: CalibrationFrames):
+            super().__init__({})
+            self.frames = frames
+
+        def __len__(self):
+            return len(self.frames)
+
+        def __getitem__(self, index):
+            return self.frames[index]
+
+    model = load_model(
+        {
+            "model_name": model_name,
+            "model": os.path.join(model_directory, f"{model_name}.xml"),
+            "weights": os.path.join(model_directory, f"{model_name}.bin"),
+        }
+    )
+    engine = IEEngine(config={"device": device}, data_loader=FramesLoader(calibration))
+    pipeline = create_pipeline(
+        [
+            {
+                "name": "DefaultQuantization",
+                "params": {
+                    "target_device": device,
+                    "preset": preset,
+                    "stat_subset_size": len(calibration),
+                },
+            }
+        ],
+        engine,
+    )
+    quantized = pipeline.run(model)
+    compress_model_weights(quantized)
+    save_model(quantized, save_path=output_directory, model_name=model_name)
+    LOGGER.info(
+        "%s quantized (%s preset, %d calibration frames) to %s",
+        model_name,
+        preset,
+        len(calibration),
+        output_directory,
+    )
+    return os.path.join(output_directory, f"{model_name}.xml")
+
+
+class DetectionAgreement:
+    """Streaming agreement between reference and compared (ex: FP32 and INT8)
+    detections: per frame greedy IoU matching, matched/missed/extra detections and
+    frames with the same number of detections"""
+
+    def __init__(self, iou_threshold: float = 0.5):
+        """
+        :param iou_threshold: minimum IoU for a compared detection to match a reference
+            one
+        """
+        self.iou_threshold = iou_threshold
+        self.frames = 0
+        self.same_count_frames = 0
+        self.matched = 0
+        self.missed = 0  # reference detections without a match
+        self.extra = 0  # compared detections without a match
+        self.matched_iou = 0.0  # matched pairs IoU sum
+
+    def add(self, reference: np.ndarray, compared: np.ndarray) -> int:
+        """Add a frame detections (record arrays)
+
+        :return: the frame matched detections
+        """
+        self.frames += 1
+        self.same_count_frames += len(reference) == len(compared)
+        matched = 0
+        if len(reference) and len(compared):
+            ious = iou_matrix(detection_boxes(reference), detection_boxes(compared))
+            # greedy (best IoU first) one to one matching
+            for flat in np.argsort(-ious, axis=None, kind="stable"):
+                row, column = np.unravel_index(flat, ious.shape)
+                if ious[row, column] < self.iou_threshold:
+                    break
+                if np.isnan(ious[row, column]):
+                    continue
+                matched += 1
+                self.matched_iou += float(ious[row, column])
+                ious[row, :] = np.nan
+                ious[:, column] = np.nan
+        self.matched += matched
+        self.missed += len(reference) - matched
+        self.extra += len(compared) - matched
+        return matched
+
+    @property
+    def recall(self) -> Optional[float]:
+        """Matched share of the reference detections"""
+        total = self.matched + self.missed
+        return self.matched / total if total else None
+
+    @property
+    def precision(self) -> Optional[float]:
+        """Matched share of the compared detections"""
+        total = self.matched + self.extra
+        return self.matched / total if total else None
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "frames": self.frames,
+            "same_count_frames": (
+                self.same_count_frames / self.frames if self.frames else None
+            ),
+            "matched": self.matched,
+            "missed": self.missed,
+            "extra": self.extra,
+            "recall": self.recall,
+            "precision": self.precision,
+            "mean_matched_iou": self.matched_iou / self.matched
+            if self.matched
+            else None,
+        }
@@ -0,0 +1,128 @@
+"""
+ Regions of interest: the inference runs on (ratio) region crops of the frame, the
+ region detections are mapped back to the frame (ratio) coordinates and merged
+"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from openvino_utils.detections import non_maxima_suppression
+from openvino_utils.utils import RatioBoundingBox, RatioPoint
+
+FULL_FRAME = RatioBoundingBox(RatioPoint(0.0, 0.0), RatioPoint(1.0, 1.0))
+
+
+def ratio_box(coordinates: Sequence[float]) -> RatioBoundingBox:
+    """A region from its [x_min, y_min, x_max, y_max] (frame ratio) coordinates"""
+    x_min, y_min, x_max, y_max = (float(coordinate) for coordinate in coordinates)
+    if not 0 <= x_min < x_max <= 1 or not 0 <= y_min < y_max <= 1:
+        raise ValueError(
+            "a region should be x_min,y_min,x_max,y_max ratios in [0, 1]: "
+            f"{coordinates}"
+        )
+    return RatioBoundingBox(RatioPoint(x_min, y_min), RatioPoint(x_max, y_max))
+
+
+def parse_regions(regions: str) -> List[RatioBoundingBox]:
+    """Parse ";" separated x_min,y_min,x_max,y_max regions (ex:
+    "0.3,0.1,0.7,1;0,0,0.2,0.5")"""
+    return [
+        ratio_box(region.split(","))
+        for region in str(regions).split(";")
+        if region.strip()
+    ]
+
+
+def tile(
+    region: RatioBoundingBox, rows: int, columns: int, overlap: float = 0.1
+) -> List[RatioBoundingBox]:
+    """Split a region into rows x columns overlapping tiles
+    :param overlap: tiles overlap (ratio of a tile size) so the objects on a tile border
+        are whole in one tile
+    """
+    (x_min, y_min), (x_max, y_max) = (
+        region.top_left.as_array,
+        region.bottom_right.as_array,
+    )
+    width, height = (x_max - x_min) / columns, (y_max - y_min) / rows
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            tiles.append(
+                RatioBoundingBox(
+                    RatioPoint(
+                        max(x_min, x_min + (column - overlap) * width),
+                        max(y_min, y_min + (row - overlap) * height),
+                    ),
+                    RatioPoint(
+                        min(x_max, x_min + (column + 1 + overlap) * width),
+                        min(y_max, y_min + (row + 1 + overlap) * height),
+                    ),
+                )
+            )
+    return tiles
+
+
+def to_frame_rows(rows: np.ndarray, region: RatioBoundingBox) -> np.ndarray:
+    """Map (region ratio) detection rows back to frame ratio rows (a new array)"""
+    origin = region.top_left.as_array
+    size = region.bottom_right.as_array - origin
+    mapped = np.array(rows, dtype=np.float32).reshape(-1, 7)
+    mapped[:, 3:7] = mapped[:, 3:7] * np.tile(size, 2) + np.tile(origin, 2)
+    return mapped
+
+
+def merge_region_rows(
+    region_rows: Sequence[np.ndarray],
+    regions: Sequence[RatioBoundingBox],
+    iou_threshold: Optional[float] = 0.5,
+) -> np.ndarray:
+    """Merge the detection rows of each region (in frame ratios), the duplicates
+    detected in the overlapping parts of the regions are suppressed
+    :param region_rows: each region detection rows (region ratios)
+    :param regions: the regions
+    :param iou_threshold: cross-region non-maxima suppression IoU threshold (None to
+        keep the duplicates)
+
+    :return: the frame ratio detection rows
+    """
+    rows = np.concatenate(
+        [to_frame_rows(rows, region) for rows, region in zip(region_rows, regions)]
+    )
+    # (the last detection of an image is followed by a negative image_id row and zero
+    # confidence padding)
+    rows = rows[(rows[:, 0] >= 0) & (rows[:, 2] > 0)]
+    if iou_threshold is None or len(regions) < 2 or len(rows) < 2:
+        return rows
+    return rows[
+        np.sort(
+            non_maxima_suppression(
+                rows[:, 3:7], rows[:, 2], iou_threshold=iou_threshold
+            )
+        )
+    ]
+
+
+def inference_regions(
+    regions: Sequence[RatioBoundingBox], tiles: str = "", overlap: float = 0.1
+) -> List[RatioBoundingBox]:
+    """The inferred regions: the regions of interest (the whole frame when tiled without
+    any region) optionally split into tiles
+    :param regions: the regions of interest
+    :param tiles: "<rows>x<columns>" tiles per region (ex: "2x2", "" not to tile)
+    :param overlap: tiles overlap (see tile)
+    """
+    if not tiles:
+        return list(regions)
+    try:
+        rows, columns = (int(count) for count in str(tiles).lower().split("x"))
+    except ValueError as error:
+        raise ValueError(
+            f"tiles should be <rows>x<columns> (ex: 2x2): {tiles}"
+        ) from error
+    return [
+        region_tile
+        for region in regions or [FULL_FRAME]
+        for region_tile in tile(region, rows, columns, overlap)
+    ]
@@ -7,16 +7,21 @@
  """
 
 import logging
-
+from contextlib import contextmanager
 from time import monotonic
-from typing import Callable, List, Optional
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
+from pydantic import Field
 
-from openvino_utils.openvino_model import (
-    OpenVinoModel,
-    preprocess_image_input,
+from openvino_utils.async_infer_queue import (
+    AsyncInferQueue,
+    InferRequestPool,
+    InferResult,
 )
+from openvino_utils.openvino_model import OpenVinoModel, preprocess_image_input
+from openvino_utils.preprocessing import ImagePreprocessor, raw_frame_blob
+from openvino_utils.streaming_stats import LatencyStats
 from openvino_utils.utils import ImageDimension
 
 LOGGER = logging.getLogger()
@@ -29,7 +34,7 @@ def timing(to_time):
         start = monotonic()
         res = to_time(*args, **kwargs)
         time = monotonic() - start
-        args[0].prediction_time.append(time)
+        args[0].prediction_stats.add(time)
         return res
 
     return wrapper
@@ -38,7 +43,11 @@ def timing(to_time):
 class SingleImageOpenVinoModel(OpenVinoModel):
     """Single image input OpenVino model"""
 
-    prediction_time: List[float] = []
+    # bounded (constant memory) prediction time statistics
+    prediction_stats: LatencyStats = Field(default_factory=LatencyStats)
+    # thread safe (synchronous) inference
+    request_pool: Optional[InferRequestPool] = None
+    preprocessor: Optional[ImagePreprocessor] = None  # preallocated input buffers
 
     @property
     def image_dimension(self) -> Optional[np.ndarray]:
@@ -53,9 +62,65 @@ class SingleImageOpenVinoModel(OpenVinoModel):
             return image.copy()
         return preprocess_image_input(image, self.expected_input_shape)
 
+    def prepare_input(self, image: np.ndarray) -> Union[np.ndarray, Any]:
+        """Prepare an image for the inference without allocating memory: a preallocated
+        input buffer (to be given back with release_input once inferred) or, with the
+        graph preprocessing, a blob wrapping the raw image (the image should not be
+        modified until inferred)
+        :param image: np.ndarray (height, width, depth) image or a model ready one
+        """
+        if image.shape == self.expected_input_shape:
+            return image
+        if self.graph_preprocessing:
+            return raw_frame_blob(image)
+        return self.preprocessor.preprocess(image)
+
+    def release_input(self, prepared: Union[np.ndarray, Any]):
+        """Give a prepared input (buffer) back once inferred"""
+        if isinstance(prepared, np.ndarray):
+            self.preprocessor.release(prepared)
+
+    @contextmanager
+    def prepared_input(self, image: np.ndarray) -> Iterator[Union[np.ndarray, Any]]:
+        """Prepare an image (see prepare_input) released when leaving the context"""
+        prepared = self.prepare_input(image)
+        try:
+            yield prepared
+        finally:
+            self.release_input(prepared)
+
+    def load_model(self):
+        """Load the model (its infer requests are shared through a request pool)"""
+        super().load_model()
+        self.request_pool = InferRequestPool(self.network, self.input_layer_name)
+        self.preprocessor = ImagePreprocessor(
+            self.expected_input_shape, swap_rb=self.swap_rb
+        )
+
     @timing
     def predict(self, image):
         """
-        Predict image
+        Predict image (thread safe: concurrent predictions use distinct infer requests)
+        """
+        return self.request_pool.infer(image)
+
+    def predict_async(
+        self, images: Iterable[Tuple[Any, np.ndarray]]
+    ) -> Iterator[InferResult]:
+        """
+        Predict a stream of images keeping up to num_requests inferences in flight
+        (uses all the infer requests: not to be mixed with concurrent predict calls)
+
+        :param images: iterable of (user_data, model ready image) tuples
+        :return: iterator of (user_data, prediction) tuples in the input order
         """
-        return self.network.infer({self.input_layer_name: image})
+        queue = AsyncInferQueue(
+            self.network,
+            self.input_layer_name,
+            on_latency=self.prediction_stats.add,
+        )
+        for user_data, image in images:
+            completed = queue.submit(image, user_data)
+            if completed is not None:
+                yield completed
+        yield from queue.drain()
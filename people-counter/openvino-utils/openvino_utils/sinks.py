@@ -0,0 +1,130 @@
+"""
+ Output sinks: the output frames are color converted once (into a reused buffer) and
+ written to each enabled sink (mp4 file, raw pipe ...)
+"""
+
+import sys
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from openvino_utils.utils import ImageDimension
+from openvino_utils.video_utils import codec
+
+
+class FrameSink(ABC):
+    """A frames sink"""
+
+    @abstractmethod
+    def write(self, frame: np.ndarray):
+        """Write an output frame (a reused buffer: copy it to keep it)"""
+
+    def close(self):
+        pass
+
+
+class VideoFileSink(FrameSink):
+    """Encode the frames to a video file (ex: mp4)"""
+
+    def __init__(self, path: str, dimension: ImageDimension, fps: float = 30):
+        self.video_writer = cv2.VideoWriter(
+            path, codec(), fps, (dimension.width, dimension.height)
+        )
+
+    def write(self, frame: np.ndarray):
+        self.video_writer.write(frame)
+
+    def close(self):
+        self.video_writer.release()
+
+
+class RawPipeSink(FrameSink):
+    """Write the raw frames bytes to a pipe (ex: stdout piped to ffmpeg) without
+    intermediate copies"""
+
+    def __init__(self, stream: Optional[BinaryIO] = None, flush: bool = True):
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.flush = flush
+
+    def write(self, frame: np.ndarray):
+        # (a C-contiguous frame) exposed as a flat bytes memoryview
+        self.stream.write(memoryview(frame).cast("B"))
+        if self.flush:
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class WindowSink(FrameSink):
+    """Display the frames in a window (the display dependencies are only imported when a
+    window is used)
+
+    Pressing escape closes the window (see closed).
+    """
+
+    def __init__(self, name: str = "people-counter", fit_screen: bool = True):
+        """
+        :param name: the window name
+        :param fit_screen: fit the window to the screen size
+        """
+        self.name = name
+        self.closed = False
+        cv2.namedWindow(name, cv2.WINDOW_NORMAL)
+        if fit_screen:
+            import pyautogui  # pylint: disable=import-outside-toplevel
+
+            screen = ImageDimension.from_pyautogui_size(pyautogui.size())
+            cv2.resizeWindow(name, screen.width, screen.height)
+
+    def write(self, frame: np.ndarray):
+        if self.closed:
+            return
+        cv2.imshow(self.name, frame)
+        # (the key polling also lets the window refresh) escape closes the window
+        if cv2.waitKey(1) & 0xFF == 27:
+            self.closed = True
+
+    def close(self):
+        cv2.destroyWindow(self.name)
+
+
+class OutputSinks:
+    """Color convert each output frame once into a reused buffer and write it to all the
+    sinks (without any sink the outputs are disabled and cost nothing)"""
+
+    def __init__(
+        self, sinks: Sequence[FrameSink], color_conversion: Optional[int] = None
+    ):
+        """
+        :param sinks: the enabled sinks
+        :param color_conversion: cv2 color conversion code applied once per frame (ex:
+            cv2.COLOR_BGR2RGB)
+        """
+        self.sinks = list(sinks)
+        self.color_conversion = color_conversion
+        self._buffer: Optional[np.ndarray] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def convert(self, frame: np.ndarray) -> np.ndarray:
+        if self.color_conversion is None:
+            return np.ascontiguousarray(frame)
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = np.empty_like(frame)
+        return cv2.cvtColor(frame, self.color_conversion, dst=self._buffer)
+
+    def write(self, frame: np.ndarray):
+        if not self.sinks:
+            return
+        output = self.convert(frame)
+        for sink in self.sinks:
+            sink.write(output)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,172 @@
+"""
+ Bounded-memory, O(1) per update streaming statistics: windowed means, hysteresis
+ presence and streaming (P²) quantiles
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence
+
+
+class WindowedMean:
+    """Mean of the last window values (ring buffer and running sum)"""
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window should be >= 1")
+        self.window = window
+        self._values: List[float] = [0.0] * window
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def add(self, value: float) -> float:
+        """Add a value and return the (updated) windowed mean"""
+        if self._count == self.window:
+            self._sum -= self._values[self._index]
+        else:
+            self._count += 1
+        self._values[self._index] = value
+        self._sum += value
+        self._index = (self._index + 1) % self.window
+        return self.mean
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._count if self._count else 0.0
+
+
+class HysteresisPresence:
+    """Binary presence from a (smoothed) signal with hysteresis: present when the signal
+    goes above enter_threshold and absent when it goes back to (or below)
+    exit_threshold"""
+
+    def __init__(self, enter_threshold: float, exit_threshold: Optional[float] = None):
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = (
+            enter_threshold if exit_threshold is None else exit_threshold
+        )
+        if self.exit_threshold > self.enter_threshold:
+            raise ValueError("exit_threshold should be <= enter_threshold")
+        self.present = False
+
+    def update(self, value: float) -> bool:
+        if self.present:
+            self.present = value > self.exit_threshold
+        else:
+            self.present = value > self.enter_threshold
+        return self.present
+
+
+class P2Quantile:
+    """Streaming quantile estimation (P² algorithm, Jain & Chlamtac) in constant
+    memory"""
+
+    def __init__(self, quantile: float):
+        if not 0 < quantile < 1:
+            raise ValueError("quantile should be in ]0, 1[")
+        self.quantile = quantile
+        self._initial: List[float] = []
+        self._heights: Optional[List[float]] = None
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4]
+        self._increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value: float):
+        if self._heights is None:
+            self._initial.append(value)
+            if len(self._initial) == 5:
+                self._heights = sorted(self._initial)
+            return
+        heights, positions = self._heights, self._positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(index for index in range(1, 5) if value < heights[index]) - 1
+        for index in range(cell + 1, 5):
+            positions[index] += 1
+        for index in range(5):
+            self._desired[index] += self._increments[index]
+        for index in range(1, 4):
+            delta = self._desired[index] - positions[index]
+            if (delta >= 1 and positions[index + 1] - positions[index] > 1) or (
+                delta <= -1 and positions[index - 1] - positions[index] < -1
+            ):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(index, step)
+                if not heights[index - 1] < height < heights[index + 1]:
+                    height = heights[index] + step * (
+                        heights[index + step] - heights[index]
+                    ) / (positions[index + step] - positions[index])
+                heights[index] = height
+                positions[index] += step
+
+    def _parabolic(self, index: int, step: int) -> float:
+        heights, positions = self._heights, self._positions
+        return heights[index] + step / (positions[index + 1] - positions[index - 1]) * (
+            (positions[index] - positions[index - 1] + step)
+            * (heights[index + 1] - heights[index])
+            / (positions[index + 1] - positions[index])
+            + (positions[index + 1] - positions[index] - step)
+            * (heights[index] - heights[index - 1])
+            / (positions[index] - positions[index - 1])
+        )
+
+    @property
+    def value(self) -> Optional[float]:
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        ordered = sorted(self._initial)
+        return ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+
+
+class LatencyStats:
+    """Streaming latency statistics (count, mean, min, max, last and quantiles) in
+    constant memory (thread safe: stages running on several threads can share it)"""
+
+    def __init__(self, quantiles: Sequence[float] = (0.5, 0.95, 0.99)):
+        self._quantiles = {quantile: P2Quantile(quantile) for quantile in quantiles}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def add(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            self.last = value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+            for estimator in self._quantiles.values():
+                estimator.add(value)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        return self._quantiles[quantile].value
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Statistics summary ex: {"count": 10, "mean": 0.01, "p50": 0.009, "p95":
+        ...}"""
+        summary = {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+        }
+        for quantile, estimator in self._quantiles.items():
+            summary[f"p{quantile * 100:g}"] = estimator.value
+        return summary
@@ -0,0 +1,559 @@
+"""
+ Counts time series store: append-only, columnar (fixed-width NumPy records) and
+ memory-mapped segment files per stream, written from a background thread, with
+ per-minute rollups for the range aggregations
+"""
+
+import glob
+import logging
+import os
+import re
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from openvino_utils.streaming_stats import LatencyStats
+
+LOGGER = logging.getLogger()
+
+# one counted frame
+FRAME_DTYPE = np.dtype(
+    [
+        ("timestamp", np.float64),
+        ("count", np.uint16),  # detections in the frame
+        ("present", np.uint16),  # the (smoothed/tracked) persons in the scene
+        ("max_confidence", np.float32),  # (0 without detection)
+        ("mean_confidence", np.float32),
+        ("inferred", np.uint8),  # (0: reused or propagated detections)
+    ]
+)
+
+# one entry (dwell NaN) or exit
+EVENT_DTYPE = np.dtype(
+    [
+        ("timestamp", np.float64),
+        ("entered", np.uint8),
+        ("track_id", np.int32),  # (-1 without tracking)
+        ("dwell", np.float32),
+    ]
+)
+
+# dwell time histogram bins upper edges (seconds), the last bin holds the longer dwell
+# times
+DWELL_BIN_EDGES = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# one minute rollup (timestamp: the minute start)
+MINUTE_DTYPE = np.dtype(
+    [
+        ("timestamp", np.float64),
+        ("frames", np.uint32),
+        ("inferred_frames", np.uint32),
+        ("present_sum", np.float64),  # (mean occupancy: present_sum / frames)
+        ("present_max", np.uint16),
+        ("count_sum", np.float64),
+        ("detected_frames", np.uint32),  # frames with detections
+        ("confidence_sum", np.float64),  # sum of the detected frames max confidence
+        ("entries", np.uint32),
+        ("exits", np.uint32),
+        ("dwell_sum", np.float64),
+        ("dwell_histogram", np.uint32, (len(DWELL_BIN_EDGES) + 1,)),
+    ]
+)
+
+SERIES_DTYPES = {"frames": FRAME_DTYPE, "events": EVENT_DTYPE, "minutes": MINUTE_DTYPE}
+
+# each series (initial, maximum) segment rows: a full frames segment is about 36 minutes
+# at 30 FPS
+# (1.4 MB), a full minutes one about 17 hours (110 KB)
+SEGMENT_ROWS = {
+    "frames": (1 << 10, 1 << 16),
+    "events": (1 << 8, 1 << 12),
+    "minutes": (1 << 6, 1 << 10),
+}
+
+
+def stream_directory(directory: str, stream: str) -> str:
+    if not stream or stream in (".", "..") or "/" in stream or os.sep in stream:
+        raise ValueError(f"invalid stream name: {stream!r}")
+    return os.path.join(directory, stream)
+
+
+def valid_rows(segment: np.ndarray) -> int:
+    """The written rows of a segment (the free rows timestamps are NaN)"""
+    free = np.isnan(segment["timestamp"])
+    return int(np.argmax(free)) if free.any() else len(segment)
+
+
+class SegmentedSeries:
+    """One append-only series of a stream: <name>-<sequence>.npy segment files of
+    fixed-width records (memory-mapped). A writer appends to the last segment until it
+    is full (also across the writer runs), the next segment doubles its size from
+    initial_rows up to max_rows (a short run only allocates a few rows). One writer per
+    stream.
+
+    The segments are created with NaN timestamps (written to a temporary file then
+    renamed), the readers only read the rows with a timestamp. The records are appended
+    in (non-decreasing) timestamps order.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        initial_rows: Optional[int] = None,
+        max_rows: Optional[int] = None,
+    ):
+        """
+        :param directory: the stream directory
+        :param name: the series name ("frames", "events" or "minutes")
+        :param initial_rows: the first segment rows (see SEGMENT_ROWS)
+        :param max_rows: the segments maximum rows (see SEGMENT_ROWS)
+        """
+        self.directory = directory
+        self.name = name
+        self.dtype = SERIES_DTYPES[name]
+        self.initial_rows = initial_rows or SEGMENT_ROWS[name][0]
+        self.max_rows = max(self.initial_rows, max_rows or SEGMENT_ROWS[name][1])
+        self._segment: Optional[np.memmap] = None
+        self._sequence: Optional[int] = None
+        self._rows = 0
+
+    def paths(self) -> List[str]:
+        """The segment files (in sequence order)"""
+        pattern = re.compile(rf"{self.name}-(\d+)\.npy$")
+        return sorted(
+            (
+                path
+                for path in glob.glob(
+                    os.path.join(self.directory, f"{self.name}-*.npy")
+                )
+                if pattern.search(path)
+            ),
+            key=lambda path: int(pattern.search(path).group(1)),
+        )
+
+    @property
+    def capacity(self) -> int:
+        return len(self._segment) if self._segment is not None else 0
+
+    def _open(self):
+        """Open the last segment to append to it (or a new one when full or without any
+        segment)"""
+        os.makedirs(self.directory, exist_ok=True)
+        paths = self.paths()
+        self._sequence = (
+            int(re.search(r"-(\d+)\.npy$", paths[-1]).group(1)) if paths else 0
+        )
+        if paths:
+            self._segment = np.load(paths[-1], mmap_mode="r+")
+            self._rows = valid_rows(self._segment)
+        if self._segment is None or self._rows == self.capacity:
+            self._rotate()
+
+    def _rotate(self):
+        rows = min(self.max_rows, max(self.initial_rows, 2 * self.capacity))
+        if self._segment is not None:
+            self._segment.flush()
+        self._sequence += 1
+        path = os.path.join(self.directory, f"{self.name}-{self._sequence:06d}.npy")
+        temporary = f"{path}.tmp"
+        segment = np.lib.format.open_memmap(
+            temporary, mode="w+", dtype=self.dtype, shape=(rows,)
+        )
+        segment["timestamp"] = np.nan
+        segment.flush()
+        del segment
+        os.replace(temporary, path)
+        self._segment = np.load(path, mmap_mode="r+")
+        self._rows = 0
+
+    def _writable(self):
+        if self._segment is None:
+            self._open()
+        elif self._rows == self.capacity:
+            self._rotate()
+
+    def append(self, records: np.ndarray):
+        """Append records (rotating the full segments)"""
+        written = 0
+        while written < len(records):
+            self._writable()
+            rows = min(len(records) - written, self.capacity - self._rows)
+            self._segment[self._rows : self._rows + rows] = records[
+                written : written + rows
+            ]
+            self._rows += rows
+            written += rows
+
+    def put_pending(self, record: np.ndarray):
+        """Write a (not complete) record after the appended ones: it is overwritten by
+        the next write"""
+        self._writable()
+        self._segment[self._rows] = record
+
+    def flush(self):
+        if self._segment is not None:
+            self._segment.flush()
+
+    def close(self):
+        self.flush()
+        self._segment = None
+
+    def read(self, start: float = -np.inf, end: float = np.inf) -> np.ndarray:
+        """The records of the [start, end) timestamps range (only the overlapping
+        segments are read)"""
+        parts = []
+        for path in self.paths():
+            segment = np.load(path, mmap_mode="r")
+            rows = valid_rows(segment)
+            if not rows:
+                continue
+            timestamps = segment["timestamp"][:rows]
+            if timestamps[0] >= end or timestamps[rows - 1] < start:
+                continue
+            first, last = np.searchsorted(timestamps, [start, end], side="left")
+            parts.append(np.array(segment[first:last]))
+        return np.concatenate(parts) if parts else np.zeros((0,), dtype=self.dtype)
+
+
+def dwell_bins(dwell_times: np.ndarray) -> np.ndarray:
+    """The dwell times histogram (counts per DWELL_BIN_EDGES bin)"""
+    return np.bincount(
+        np.searchsorted(DWELL_BIN_EDGES, dwell_times, side="right"),
+        minlength=len(DWELL_BIN_EDGES) + 1,
+    )
+
+
+class StreamRecorder:
+    """A stream handle of a TimeSeriesWriter (the records are only queued: never
+    blocking the caller)
+
+    The store timestamps are wall clock ones: the timestamps relative to a stream start
+    (ex: a video file index / fps) are recorded with the stream start wall clock time as
+    offset, so the runs (replays of the same file) and the streams share a single
+    timeline.
+    """
+
+    def __init__(self, writer: "TimeSeriesWriter", stream: str, offset: float = 0.0):
+        """
+        :param writer: the (started) writer
+        :param stream: the stream name
+        :param offset: added to the recorded timestamps (seconds)
+        """
+        self.writer = writer
+        self.stream = stream
+        self.offset = offset
+        self.last_timestamp: Optional[float] = None  # (store timestamp)
+
+    def add_frame(
+        self,
+        timestamp: float,
+        detections: np.ndarray,
+        present: int,
+        inferred: bool = True,
+    ):
+        """Record a counted frame
+        :param timestamp: the frame timestamp (seconds)
+        :param detections: the frame detections record array
+        :param present: the persons in the scene (the counter present)
+        :param inferred: the detections were inferred (not reused or propagated)
+        """
+        confidences = detections["confidence"] if len(detections) else None
+        self.last_timestamp = timestamp = timestamp + self.offset
+        self.writer.enqueue(
+            self.stream,
+            "frames",
+            (
+                timestamp,
+                len(detections),
+                present,
+                confidences.max() if confidences is not None else 0.0,
+                confidences.mean() if confidences is not None else 0.0,
+                inferred,
+            ),
+        )
+
+    def add_event(self, presence_event, timestamp: Optional[float] = None):
+        """Record an entry or an exit (with its dwell time)
+        :param presence_event: a counting.PresenceEvent
+        :param timestamp: the event timestamp (defaults to the presence event one)
+        """
+        self.writer.enqueue(
+            self.stream,
+            "events",
+            (
+                (presence_event.timestamp if timestamp is None else timestamp)
+                + self.offset,
+                presence_event.entered,
+                -1 if presence_event.track_id is None else presence_event.track_id,
+                np.nan if presence_event.duration is None else presence_event.duration,
+            ),
+        )
+
+
+class TimeSeriesWriter:
+    """Write the streams frames and events records (and their per-minute rollups) from a
+    background thread
+
+    The records are queued (a bounded queue, the oldest records are dropped when full)
+    and written in batches every flush_interval: the frames and events to their series,
+    the minutes rollups updated with them (the current minute rollup is rewritten on
+    every flush so the readers see it).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_rows: Optional[Dict[str, Tuple[int, int]]] = None,
+        flush_interval: float = 1.0,
+        max_queue: int = 100000,
+    ):
+        """
+        :param directory: the store directory (one subdirectory per stream)
+        :param segment_rows: each series (initial, maximum) segment rows (defaults to
+            SEGMENT_ROWS)
+        :param flush_interval: batches writing interval (seconds)
+        :param max_queue: bounded queue size (records)
+        """
+        self.directory = directory
+        self.segment_rows = {**SEGMENT_ROWS, **(segment_rows or {})}
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.written_records = 0
+        self.dropped_records = 0
+        self.write_latency = LatencyStats()
+        self._queue: Deque[Tuple[str, str, Tuple]] = deque()
+        self._series: Dict[Tuple[str, str], SegmentedSeries] = {}
+        # the current minute rollup of each stream
+        self._rollups: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def stream(self, name: str, offset: float = 0.0) -> StreamRecorder:
+        """A stream recorder (see StreamRecorder)"""
+        stream_directory(self.directory, name)
+        return StreamRecorder(self, name, offset=offset)
+
+    def enqueue(self, stream: str, series: str, record: Tuple):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped_records += 1
+            self._queue.append((stream, series, record))
+
+    def start(self) -> "TimeSeriesWriter":
+        self._thread = threading.Thread(
+            target=self._write_loop, name="timeseries-writer", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Write the queued records, complete the current minutes rollups and close the
+        segments"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._write_lock:
+            self._write()
+            for stream, rollup in self._rollups.items():
+                self._get_series(stream, "minutes").append(rollup[None])
+            self._rollups.clear()
+            for series in self._series.values():
+                series.close()
+
+    def flush(self):
+        """Write the queued records now (the current minutes rollups are written as
+        pending records)"""
+        with self._write_lock:
+            self._write()
+
+    def _write_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("time series write failed")
+
+    def _get_series(self, stream: str, name: str) -> SegmentedSeries:
+        series = self._series.get((stream, name))
+        if series is None:
+            series = self._series[stream, name] = SegmentedSeries(
+                stream_directory(self.directory, stream), name, *self.segment_rows[name]
+            )
+        return series
+
+    def _write(self):
+        with self._lock:
+            batch = list(self._queue)
+            self._queue.clear()
+        if not batch:
+            return
+        start = perf_counter()
+        records: Dict[Tuple[str, str], List[Tuple]] = {}
+        for stream, series, record in batch:
+            records.setdefault((stream, series), []).append(record)
+        for stream in {stream for stream, _ in records}:
+            frames = np.array(records.get((stream, "frames"), []), dtype=FRAME_DTYPE)
+            events = np.array(records.get((stream, "events"), []), dtype=EVENT_DTYPE)
+            for name, series_records in (("frames", frames), ("events", events)):
+                if len(series_records):
+                    self._get_series(stream, name).append(series_records)
+            self._roll_up(stream, frames, events)
+        for series in self._series.values():
+            series.flush()
+        self.written_records += len(batch)
+        self.write_latency.add(perf_counter() - start)
+
+    def _roll_up(self, stream: str, frames: np.ndarray, events: np.ndarray):
+        """Add the frames and events to their minutes rollups (the completed minutes are
+        appended)"""
+        minutes_series = self._get_series(stream, "minutes")
+        rollup = self._rollups.get(stream)
+        frame_minutes = (frames["timestamp"] // 60).astype(np.int64)
+        event_minutes = (events["timestamp"] // 60).astype(np.int64)
+        if rollup is not None:
+            # (a clock going backwards) added to the current minute
+            current = int(rollup["timestamp"] // 60)
+            frame_minutes = np.maximum(frame_minutes, current)
+            event_minutes = np.maximum(event_minutes, current)
+        for minute in np.unique(np.concatenate([frame_minutes, event_minutes])):
+            if rollup is None or minute * 60 > rollup["timestamp"]:
+                if rollup is not None:
+                    minutes_series.append(rollup[None])
+                rollup = np.zeros((), dtype=MINUTE_DTYPE)
+                rollup["timestamp"] = minute * 60
+            minute_frames = frames[frame_minutes == minute]
+            if len(minute_frames):
+                detected = minute_frames[minute_frames["count"] > 0]
+                # (the casts: the record fields are narrower than the sums, numpy 2
+                # refuses implicit ones)
+                rollup["frames"] += np.uint32(len(minute_frames))
+                rollup["inferred_frames"] += np.uint32(
+                    np.count_nonzero(minute_frames["inferred"])
+                )
+                rollup["present_sum"] += float(minute_frames["present"].sum())
+                rollup["present_max"] = max(
+                    rollup["present_max"], minute_frames["present"].max()
+                )
+                rollup["count_sum"] += float(minute_frames["count"].sum())
+                rollup["detected_frames"] += np.uint32(len(detected))
+                rollup["confidence_sum"] += detected["max_confidence"].sum()
+            minute_events = events[event_minutes == minute]
+            if len(minute_events):
+                exits = minute_events[minute_events["entered"] == 0]
+                dwell_times = exits["dwell"][~np.isnan(exits["dwell"])]
+                rollup["entries"] += np.uint32(len(minute_events) - len(exits))
+                rollup["exits"] += np.uint32(len(exits))
+                rollup["dwell_sum"] += dwell_times.sum()
+                rollup["dwell_histogram"] += dwell_bins(dwell_times).astype(np.uint32)
+        if rollup is not None:
+            minutes_series.put_pending(rollup)
+            self._rollups[stream] = rollup
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "written_records": self.written_records,
+            "dropped_records": self.dropped_records,
+            "write_time": self.write_latency.summary(),
+        }
+
+
+class TimeSeriesStore:
+    """Read a time series store: raw records ranges and the (rollups based) range
+    aggregations"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def streams(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def series(
+        self, stream: str, name: str, start: float = -np.inf, end: float = np.inf
+    ) -> np.ndarray:
+        """A stream series ("frames", "events" or "minutes") records of the [start, end)
+        range"""
+        return SegmentedSeries(stream_directory(self.directory, stream), name).read(
+            start, end
+        )
+
+    def occupancy(
+        self,
+        stream: str,
+        start: float = -np.inf,
+        end: float = np.inf,
+        bucket: float = 60,
+    ) -> Dict[str, List]:
+        """The occupancy per time bucket (from the minutes rollups, in the minutes of
+        the [start, end) range)
+        :param bucket: the buckets length (seconds, a multiple of a minute)
+
+        :return: the buckets (start timestamp) mean and max occupancy, entries, exits,
+            mean confidence and mean dwell time (None without any exit)
+        """
+        minutes = self.series(stream, "minutes", start, end)
+        keys, groups = np.unique(
+            (minutes["timestamp"] // bucket) * bucket, return_inverse=True
+        )
+        sums = {
+            field: np.bincount(groups, weights=minutes[field], minlength=len(keys))
+            for field in (
+                "frames",
+                "present_sum",
+                "detected_frames",
+                "confidence_sum",
+                "entries",
+                "exits",
+                "dwell_sum",
+            )
+        }
+        present_max = np.zeros(len(keys), dtype=np.int64)
+        np.maximum.at(present_max, groups, minutes["present_max"])
+        frames = np.maximum(sums["frames"], 1)
+        return {
+            "timestamp": keys.tolist(),
+            "frames": sums["frames"].astype(int).tolist(),
+            "mean_occupancy": (sums["present_sum"] / frames).tolist(),
+            "max_occupancy": present_max.tolist(),
+            "entries": sums["entries"].astype(int).tolist(),
+            "exits": sums["exits"].astype(int).tolist(),
+            "mean_confidence": (
+                sums["confidence_sum"] / np.maximum(sums["detected_frames"], 1)
+            ).tolist(),
+            "mean_dwell": [
+                dwell_sum / exits if exits else None
+                for dwell_sum, exits in zip(
+                    sums["dwell_sum"].tolist(), sums["exits"].tolist()
+                )
+            ],
+        }
+
+    def dwell_histogram(
+        self, stream: str, start: float = -np.inf, end: float = np.inf
+    ) -> Dict[str, Any]:
+        """The dwell times histogram (from the minutes rollups) of the [start, end)
+        range
+
+        :return: the bins (upper edges, None for the last open bin) counts, the exits
+            and mean dwell time
+        """
+        minutes = self.series(stream, "minutes", start, end)
+        exits = int(minutes["exits"].sum())
+        return {
+            "bin_edges": list(DWELL_BIN_EDGES) + [None],
+            "counts": minutes["dwell_histogram"].sum(axis=0).astype(int).tolist(),
+            "exits": exits,
+            "mean_dwell": float(minutes["dwell_sum"].sum()) / exits if exits else None,
+        }
@@ -0,0 +1,184 @@
+"""
+ Lightweight IoU/centroid multi-object tracker assigning persistent ids to (ratio)
+ bounding boxes
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from openvino_utils.detections import iou_matrix
+
+
+@dataclass
+class Track:
+    """A tracked object (box as [x_min, y_min, x_max, y_max] ratios)"""
+
+    track_id: int
+    box: np.ndarray
+    confidence: float
+    first_seen: float
+    last_seen: float
+    hits: int = 1
+    misses: int = 0
+    confirmed: bool = False
+
+    @property
+    def dwell(self) -> float:
+        return self.last_seen - self.first_seen
+
+
+@dataclass
+class TrackEvent:
+    """A track lifecycle event: a (confirmed) track entered or exited (with its dwell
+    time)"""
+
+    entered: bool
+    track_id: int
+    timestamp: float
+    dwell: Optional[float] = None
+
+
+def centroids(boxes: np.ndarray) -> np.ndarray:
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+class IoUTracker:
+    """Greedy IoU (with a centroid distance fallback) tracker
+
+    A track is confirmed (entered) after min_hits matched detections and exits after
+    more than max_misses consecutive frames without a matched detection.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_centroid_distance: float = 0.1,
+        min_hits: int = 3,
+        max_misses: int = 10,
+    ):
+        """
+        :param iou_threshold: minimum IoU to match a detection to a track
+        :param max_centroid_distance: maximum (ratio) centroid distance to match a non
+            overlapping detection
+        :param min_hits: matched detections to confirm a track
+        :param max_misses: consecutive missed frames before a track exits
+        """
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.tracks: List[Track] = []
+        # the last updated detections track ids (-1 for the detections without a
+        # confirmed track)
+        self.detection_track_ids = np.empty(0, dtype=np.int64)
+        self._next_track_id = 0
+
+    @property
+    def active_tracks(self) -> List[Track]:
+        """The confirmed (visible or recently missed) tracks"""
+        return [track for track in self.tracks if track.confirmed]
+
+    def _match(self, boxes: np.ndarray) -> List[tuple]:
+        """Greedy (best score first) track/detection assignment"""
+        if not self.tracks or not len(boxes):
+            return []
+        track_boxes = np.stack([track.box for track in self.tracks])
+        ious = iou_matrix(track_boxes, boxes)
+        distances = np.linalg.norm(
+            centroids(track_boxes)[:, None, :] - centroids(boxes)[None, :, :], axis=-1
+        )
+        # overlapping matches (score > 1) come before the centroid distance ones (score
+        # in ]0, 1])
+        scores = np.where(
+            ious >= self.iou_threshold,
+            1 + ious,
+            np.clip(1 - distances / self.max_centroid_distance, 0, None),
+        )
+        track_indices, box_indices = np.unravel_index(
+            np.argsort(-scores, axis=None, kind="stable"), scores.shape
+        )
+        matched_tracks, matched_boxes, matches = set(), set(), []
+        for track_index, box_index in zip(track_indices, box_indices):
+            if scores[track_index, box_index] <= 0:
+                break
+            if track_index in matched_tracks or box_index in matched_boxes:
+                continue
+            matched_tracks.add(track_index)
+            matched_boxes.add(box_index)
+            matches.append((track_index, box_index))
+            if len(matches) == min(scores.shape):
+                break
+        return matches
+
+    def update(
+        self, boxes: np.ndarray, confidences: np.ndarray, timestamp: float
+    ) -> List[TrackEvent]:
+        """Update the tracks with a frame detections
+        :param boxes: (n, 4) detected boxes [x_min, y_min, x_max, y_max]
+        :param confidences: (n,) detections confidences
+        :param timestamp: the frame timestamp (seconds)
+
+        :return: the frame track events (entered/exited tracks)
+        """
+        events: List[TrackEvent] = []
+        matches = self._match(boxes)
+        matched_boxes = {box_index for _, box_index in matches}
+        matched_tracks = {track_index for track_index, _ in matches}
+        track_ids = np.full(len(boxes), -1, dtype=np.int64)
+
+        for track_index, box_index in matches:
+            track = self.tracks[track_index]
+            track.box = boxes[box_index]
+            track.confidence = float(confidences[box_index])
+            track.last_seen = timestamp
+            track.hits += 1
+            track.misses = 0
+            if not track.confirmed and track.hits >= self.min_hits:
+                track.confirmed = True
+                events.append(TrackEvent(True, track.track_id, track.first_seen))
+            if track.confirmed:
+                track_ids[box_index] = track.track_id
+
+        surviving = []
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    if track.confirmed:
+                        events.append(
+                            TrackEvent(False, track.track_id, timestamp, track.dwell)
+                        )
+                    continue
+            surviving.append(track)
+        self.tracks = surviving
+
+        for box_index in range(len(boxes)):
+            if box_index in matched_boxes:
+                continue
+            track = Track(
+                track_id=self._next_track_id,
+                box=boxes[box_index],
+                confidence=float(confidences[box_index]),
+                first_seen=timestamp,
+                last_seen=timestamp,
+            )
+            self._next_track_id += 1
+            if self.min_hits <= 1:
+                track.confirmed = True
+                events.append(TrackEvent(True, track.track_id, timestamp))
+                track_ids[box_index] = track.track_id
+            self.tracks.append(track)
+        self.detection_track_ids = track_ids
+        return events
+
+    def flush(self, timestamp: float) -> List[TrackEvent]:
+        """Exit all the (confirmed) tracks (ex: at the end of the stream)"""
+        events = [
+            TrackEvent(False, track.track_id, timestamp, track.dwell)
+            for track in self.tracks
+            if track.confirmed
+        ]
+        self.tracks = []
+        return events
@@ -0,0 +1,184 @@
+"""
+ Per host tuning profiles: the best (throughput under a latency ceiling) plugin
+ streams/threads and async depth of each model, found by sweeping them on a sample clip
+"""
+
+import itertools
+import json
+import logging
+import os
+import platform
+from time import monotonic, time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from openvino_utils.streaming_stats import LatencyStats
+
+LOGGER = logging.getLogger()
+
+# per host profiles directory (overridden by the OPENVINO_TUNING_DIR environment
+# variable)
+DEFAULT_TUNING_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "openvino_utils", "tuning"
+)
+
+
+def host_id() -> str:
+    """A (stable) host identifier: host name, processor and cores count"""
+    processor = platform.processor() or platform.machine()
+    return "-".join(
+        "".join(char if char.isalnum() else "_" for char in part)
+        for part in (platform.node(), processor, str(os.cpu_count()))
+    )
+
+
+def default_profile_path() -> str:
+    """This host tuning profile path"""
+    return os.path.join(
+        os.environ.get("OPENVINO_TUNING_DIR", DEFAULT_TUNING_DIRECTORY),
+        f"{host_id()}.json",
+    )
+
+
+def model_key(model_directory: str, model_name: str, device: str) -> str:
+    """A profile entry key (the model directory holds the precision ex: .../FP16)"""
+    return f"{os.path.normpath(os.path.join(model_directory, model_name))}@{device}"
+
+
+class TunedConfig(BaseModel):
+    """A measured (candidate) configuration"""
+
+    plugin_config: Dict[str, str] = {}
+    num_requests: int = 1
+    fps: Optional[float] = None
+    latency_p95: Optional[float] = None  # requests latency (seconds)
+
+
+class TuningProfile(BaseModel):
+    """A host tuning profile: the selected configuration of each model (see
+    model_key)"""
+
+    host: str
+    models: Dict[str, TunedConfig] = {}
+    tuned_at: Dict[str, float] = {}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> Optional["TuningProfile"]:
+        """Load a profile (this host one by default), None when missing or unreadable"""
+        path = path or default_profile_path()
+        try:
+            with open(path) as profile_file:
+                return cls(**json.load(profile_file))
+        except (OSError, ValueError) as error:
+            if os.path.exists(path):
+                LOGGER.warning("ignoring the tuning profile %s (%s)", path, error)
+            return None
+
+    def save(self, path: Optional[str] = None):
+        """Save (atomically) the profile (this host one by default)"""
+        path = path or default_profile_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary_file = f"{path}.{os.getpid()}"
+        with open(temporary_file, "w") as profile_file:
+            json.dump(self.dict(), profile_file, indent=2)
+        os.replace(temporary_file, path)
+
+    def update(self, key: str, config: TunedConfig):
+        self.models[key] = config
+        self.tuned_at[key] = time()
+
+
+def candidates(
+    device: str,
+    streams: Sequence[str],
+    threads: Sequence[int],
+    async_depths: Sequence[int],
+) -> List[TunedConfig]:
+    """The swept configurations: (CPU) inference streams x threads (0: the plugin
+    default) x async depths, only the async depths on the other devices (the CPU depths
+    lower than the streams number are skipped: some streams would be idle)
+    """
+    if device != "CPU":
+        return [TunedConfig(num_requests=depth) for depth in async_depths]
+    configs = []
+    for stream, thread, depth in itertools.product(streams, threads, async_depths):
+        if str(stream).isdigit() and depth < int(stream):
+            continue
+        plugin_config = {"CPU_THROUGHPUT_STREAMS": str(stream)}
+        if thread:
+            plugin_config["CPU_THREADS_NUM"] = str(thread)
+        configs.append(TunedConfig(plugin_config=plugin_config, num_requests=depth))
+    return configs
+
+
+def measure(model, inputs: Sequence[np.ndarray], frames: int) -> TunedConfig:
+    """Measure a loaded model throughput and requests latency on inputs (cycled up to
+    frames)
+    :param model: a loaded SingleImageOpenVinoModel
+    :param inputs: model ready inputs
+    """
+    latency = LatencyStats()
+    model.prediction_stats = latency
+    start = monotonic()
+    for _ in model.predict_async(
+        (None, inputs[index % len(inputs)]) for index in range(frames)
+    ):
+        pass
+    elapsed = monotonic() - start
+    return TunedConfig(
+        plugin_config=dict(model.plugin_config),
+        num_requests=model.num_requests,
+        fps=frames / elapsed if elapsed else None,
+        latency_p95=latency.quantile(0.95),
+    )
+
+
+def select(
+    results: Sequence[TunedConfig], latency_ceiling: Optional[float] = None
+) -> TunedConfig:
+    """The best throughput configuration whose p95 latency is under the ceiling
+    (the lowest latency one when none is)"""
+    eligible = [
+        result
+        for result in results
+        if latency_ceiling is None
+        or (result.latency_p95 is not None and result.latency_p95 <= latency_ceiling)
+    ]
+    if not eligible:
+        LOGGER.warning(
+            "no configuration under the %ss latency ceiling", latency_ceiling
+        )
+        return min(results, key=lambda result: result.latency_p95 or float("inf"))
+    return max(eligible, key=lambda result: result.fps or 0.0)
+
+
+def sweep(
+    load: Callable[[TunedConfig], object],
+    candidates: Sequence[TunedConfig],
+    inputs: Sequence[np.ndarray],
+    frames: int = 200,
+    warmup: int = 10,
+) -> List[TunedConfig]:
+    """Load and measure each candidate
+    :param load: candidate -> loaded model (with the candidate plugin_config and
+        num_requests)
+    :param inputs: model ready inputs (ex: a preprocessed sample clip)
+    :param frames: measured inferences per candidate
+    :param warmup: (not measured) warm up inferences per candidate
+    """
+    results = []
+    for candidate in candidates:
+        model = load(candidate)
+        measure(model, inputs, warmup)
+        result = measure(model, inputs, frames)
+        LOGGER.info(
+            "%s x%d: %.1f FPS (p95 %.3fs)",
+            result.plugin_config,
+            result.num_requests,
+            result.fps or 0.0,
+            result.latency_p95 or 0.0,
+        )
+        results.append(result)
+    return results
@@ -7,13 +7,15 @@
 
 
 from dataclasses import dataclass
-
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 import cv2
-
 import numpy as np
-from pyautogui import Size
+
+if TYPE_CHECKING:
+    # (annotation only) pyautogui requires a display: it is never imported at runtime
+    # from here
+    from pyautogui import Size
 
 
 @dataclass
@@ -55,7 +57,7 @@ class ImageDimension(Point):
         return ImageDimension(x=point.x, y=point.y)
 
     @classmethod
-    def from_pyautogui_size(cls, size: Size) -> "ImageDimension":
+    def from_pyautogui_size(cls, size: "Size") -> "ImageDimension":
         return ImageDimension(x=size.width, y=size.height)
 
     def scale(self, factor: float) -> "ImageDimension":
@@ -1,10 +1,25 @@
+import queue
+import threading
+from dataclasses import dataclass
 from sys import platform
-
-from typing import Callable, Iterable
+from time import perf_counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
 
 import cv2
 import numpy as np
 
+from openvino_utils.streaming_stats import LatencyStats
+
 Mat = "np.ndarray[int, np.dtype[np.generic]]"
 
 
@@ -16,40 +31,210 @@ def codec():
             return cv2.VideoWriter_fourcc(*"MJPG")
 
 
-def capture_stream(args, pipeline: Iterable[Callable[[Mat], Mat]]):
+# a stage returning DROP filters the item out of the pipeline
+DROP = object()
+# end of stream marker (internal)
+_END = object()
+# blocking queue operations polling interval (to check the stop event)
+_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class Stage:
+    """A pipeline stage: process (item) -> item run by threads workers fed by a bounded
+    queue"""
+
+    name: str
+    process: Callable[[Any], Any]
+    threads: int = 1
+    queue_size: int = 4  # bounded input queue (backpressure on the upstream stage)
+    # per item processing time statistics (when measured)
+    latency: Optional[LatencyStats] = None
+
+    def __call__(self, item: Any) -> Any:
+        if self.latency is None:
+            return self.process(item)
+        start = perf_counter()
+        processed = self.process(item)
+        self.latency.add(perf_counter() - start)
+        return processed
+
+
+class Pipeline:
+    """Staged (threaded) pipeline: the source and each stage run in their own thread(s)
+    connected by bounded queues, so stages overlap (ex: decode, inference and encode).
+    Items leave each stage in the source order (whatever the stage threads count), a
+    stateful stage should use a single thread.
+
+    Iterating the pipeline runs it yielding the last stage outputs (closing the
+    iteration stops it).
+    """
+
+    def __init__(self, source: Iterable[Any], stages: Sequence[Stage]):
+        self.source = source
+        self.stages = list(stages)
+        self.queues: List["queue.Queue"] = [
+            queue.Queue(maxsize=stage.queue_size) for stage in self.stages
+        ] + [queue.Queue(maxsize=self.stages[-1].queue_size if self.stages else 1)]
+        self.stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+        self._threads: List[threading.Thread] = []
+
+    def stop(self):
+        self.stop_event.set()
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Each stage input queue depth (ex: to find the bottleneck stage: the one with
+        a full queue)"""
+        return {
+            stage.name: stage_queue.qsize()
+            for stage, stage_queue in zip(self.stages, self.queues)
+        }
+
+    def _put(self, to_queue: "queue.Queue", item: Any) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                to_queue.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, from_queue: "queue.Queue") -> Any:
+        while not self.stop_event.is_set():
+            try:
+                return from_queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error: BaseException):
+        if self.error is None:
+            self.error = error
+        self.stop()
+
+    def _feed(self):
+        try:
+            for sequence, item in enumerate(self.source):
+                if not self._put(self.queues[0], (sequence, item)):
+                    break
+            self._put(self.queues[0], _END)
+        except BaseException as error:  # pylint: disable=broad-except
+            self._fail(error)
+        finally:
+            close = getattr(self.source, "close", None)
+            if close is not None:
+                close()
+
+    def _start_stage(self, index: int):
+        stage = self.stages[index]
+        input_queue, output_queue = self.queues[index], self.queues[index + 1]
+        # ordering turnstile: a worker hands its item over only when it is the next one
+        # (in source order)
+        turnstile = threading.Condition()
+        state = {"next": 0, "alive": stage.threads}
+
+        def hand_over(sequence: int, item: Any) -> bool:
+            with turnstile:
+                while state["next"] != sequence and not self.stop_event.is_set():
+                    turnstile.wait(_POLL_INTERVAL)
+                # (dropped items are handed over too, keeping the downstream sequence
+                # contiguous)
+                delivered = self._put(output_queue, (sequence, item))
+                state["next"] += 1
+                turnstile.notify_all()
+                return delivered
+
+        def work():
+            try:
+                while True:
+                    task = self._get(input_queue)
+                    if task is _END:
+                        # let the siblings see the end of stream too (the last one
+                        # forwards it)
+                        input_queue.put(_END)
+                        break
+                    sequence, item = task
+                    if not hand_over(sequence, item if item is DROP else stage(item)):
+                        break
+            except BaseException as error:  # pylint: disable=broad-except
+                self._fail(error)
+            finally:
+                with turnstile:
+                    state["alive"] -= 1
+                    last = state["alive"] == 0
+                if last:
+                    self._put(output_queue, _END)
+
+        for worker in range(stage.threads):
+            self._threads.append(
+                threading.Thread(
+                    target=work, name=f"{stage.name}-{worker}", daemon=True
+                )
+            )
+
+    def __iter__(self) -> Iterator[Any]:
+        self._threads = [
+            threading.Thread(target=self._feed, name="source", daemon=True)
+        ]
+        for index in range(len(self.stages)):
+            self._start_stage(index)
+        for thread in self._threads:
+            thread.start()
+        try:
+            while True:
+                task = self._get(self.queues[-1])
+                if task is _END:
+                    break
+                if task[1] is not DROP:
+                    yield task[1]
+        finally:
+            self.stop()
+            for thread in self._threads:
+                thread.join()
+        if self.error is not None:
+            raise self.error
 
-    # Capture
-    cap = cv2.VideoCapture(args.i)  # make it a frame streamer as a part of the pipeline
-    cap.open(args.i)
 
-    # create a video writer for the output video
-    video_writer = (
-        cv2.VideoWriter("out.mp4", codec(), 30, (100, 100)) if not image_flag else None
-    )
+def capture_frames(input_file: Union[str, int]) -> Iterator[Mat]:
+    """Capture (decode) the frames of a video file/url (or device index) until it
+    ends"""
+    cap = cv2.VideoCapture(input_file)
+    try:
+        while cap.isOpened():
+            flag, frame = cap.read()
+            if not flag:
+                break
+            yield frame
+    finally:
+        cap.release()
 
-    # process frames until the video ends, or process is exited
-    processed_frames = 0
-    while cap.isOpened():
-        # Read the next frame
-        flag, frame = cap.read()
-        if not flag:
-            break
-        key_pressed = cv2.waitKey(60)
 
-        for process in pipeline:
-            frame = process(frame)
-        processed_frames += 1
+def timed(items: Iterable[Any], latency: LatencyStats) -> Iterator[Any]:
+    """Iterate items measuring the time to get each of them (ex: a frames source
+    decoding time)"""
+    iterator = iter(items)
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        latency.add(perf_counter() - start)
+        yield item
 
-        if image_flag:
-            cv2.imwrite("output_image.jpg", frame)
-        else:
-            video_writer.write(frame)
 
-        # Break if escape key pressed
-        if key_pressed == 27:
-            break
+def capture_stream(
+    source: Union[str, int, Iterable[Any]], stages: Sequence[Stage]
+) -> Pipeline:
+    """Capture a video stream as the source of a staged pipeline
+    :param source: video file, url, device index or a frames iterable (ex:
+        InputFeeder.realtime_frames)
+    :param stages: the processing stages (preprocessing, inference, postprocessing,
+        sinks ...)
 
-    if not image_flag:
-        video_writer.release()
-    cap.release()
-    cv2.destroyAllWindows()
+    :return: the pipeline (to iterate)
+    """
+    if isinstance(source, (str, int)):
+        source = capture_frames(source)
+    return Pipeline(source, stages)
@@ -6,15 +6,22 @@
  """
 
 import logging
-from typing import List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 
+from openvino_utils.batching import FrameBatcher
+from openvino_utils.detections import decode_detections, to_ratio_detections
+from openvino_utils.propagation import DetectionPropagator
+from openvino_utils.regions import merge_region_rows
 from openvino_utils.single_image_openvino_model import SingleImageOpenVinoModel
-from openvino_utils.utils import RatioDetection, RatioPoint
+from openvino_utils.utils import RatioBoundingBox, RatioDetection
 
 LOGGER = logging.getLogger()
 
+# supported (SSD like) detection output blob names
+DETECTION_OUTPUTS = ("detection_out", "DetectionOutput")
+
 
 class PedestrianDetection(SingleImageOpenVinoModel):
 
@@ -22,26 +29,124 @@ class PedestrianDetection(SingleImageOpenVinoModel):
 
     model_name: str = "pedestrian-detection-adas-0002"
     model_directory: str = "models/intel/pedestrian-detection-adas-0002/FP32"
+    output_blob_name: Optional[str] = None  # resolved at loading time
+
+    def load_model(self):
+        """Load the model and resolve the detection output blob name"""
+        super().load_model()
+        self.output_blob_name = next(
+            (name for name in DETECTION_OUTPUTS if name in self.network.outputs), None
+        )
+        if self.output_blob_name is None:
+            raise Exception(
+                f"non supported results (outputs: {list(self.network.outputs)})"
+            )
+
+    def to_inferable(self, image: np.ndarray) -> np.ndarray:
+        """check if the image is matching the expected dimension otherwise pre-process
+        it (into a reused input buffer: to be given back with release_input once
+        inferred)"""
+        return self.prepare_input(image)
+
+    def detection_output(self, prediction_results: Dict[str, np.ndarray]) -> np.ndarray:
+        """Extract the detections (rows) from the prediction results"""
+        return prediction_results[self.output_blob_name][0][0]
+
+    def split_detections(
+        self, prediction_results: Dict[str, np.ndarray], count: int
+    ) -> List[np.ndarray]:
+        """Split a batch prediction into per image detection rows (using the image_id
+        column)
+        :param prediction_results: the batch prediction results
+        :param count: number of (valid) images in the batch
+
+        :return: the detection rows of each of the first count images
+        """
+        rows = self.detection_output(prediction_results)
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        bounds = np.searchsorted(rows[:, 0], np.arange(count + 1))
+        return [rows[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def batcher(self, max_wait: float = 0.01) -> FrameBatcher:
+        """Cross-source batcher resolving each submitted frame with its raw detection
+        rows (to be decoded with detect_array(None, detections=...))
+        :param max_wait: maximum waiting time (seconds) for a partial batch
+        """
+        return FrameBatcher(self, self.split_detections, max_wait=max_wait)
 
     def infer(
         self,
         image: np.ndarray,
     ) -> np.ndarray:
-        """Extract sematic segmentation"""
+        """Run the inference (once) and return the raw detection rows"""
+        with self.prepared_input(image) as to_infer:
+            return self.detection_output(self.predict(to_infer))
+
+    def infer_regions(
+        self,
+        image: np.ndarray,
+        regions: Sequence[RatioBoundingBox],
+        merge_threshold: Optional[float] = 0.5,
+    ) -> np.ndarray:
+        """Run the inference on each region crop (instead of the whole frame)
+        :param image: the (height, width, depth) frame
+        :param regions: the regions of interest (frame ratios, ex: a doorway or
+            overlapping tiles)
+        :param merge_threshold: cross-region non-maxima suppression IoU threshold (see
+            merge_region_rows)
+
+        :return: the detection rows mapped back to the frame (ratio) coordinates
+        """
+        return merge_region_rows(
+            [self.infer(region.crop(image)) for region in regions],
+            regions,
+            iou_threshold=merge_threshold,
+        )
+
+    def detect_array(
+        self,
+        image: Optional[np.ndarray],
+        detections: Optional[np.ndarray] = None,
+        min_confidence: float = 0.95,
+        top_k: Optional[int] = None,
+        nms_threshold: Optional[float] = None,
+        regions: Optional[Sequence[RatioBoundingBox]] = None,
+    ) -> np.recarray:
+        """Extract/get detections as a record array (see
+        openvino_utils.detections.DETECTION_DTYPE)
+        :param image: image to detect pedestrians on (ignored when detections are
+            provided)
+        :param detections: detection rows, if set to None an inference is run to
+            generate the detections
+        :param min_confidence: minimum confidence to filter detections
+        :param top_k: maximum number of (biggest) detections to keep
+        :param nms_threshold: non-maxima suppression IoU threshold (None to keep the
+            overlapping detections)
+        :param regions: run the inference on these regions of interest only (see
+            infer_regions)
 
-        # check if the image is matching the expected dimension otherwise pre-process it
-        to_infer = image.copy()
-        if to_infer.shape != self.expected_input_shape:
-            to_infer = self.preprocess_input(to_infer)
-        # run inference
-        prediction_results = self.predict(to_infer)
-        if "detection_out" in  prediction_results:
-            return self.predict(to_infer)["detection_out"][0][0]
+        :return: pedestrian detections sorted by decreasing size
+        """
+        if detections is None:
+            detections = (
+                self.infer_regions(image, regions) if regions else self.infer(image)
+            )
+
+        # filter the detection to keep only high confidence detection (bounding boxes)
+        pedestrians = decode_detections(
+            detections,
+            min_confidence=min_confidence,
+            top_k=top_k,
+            nms_threshold=nms_threshold,
+        )
 
-        if "DetectionOutput" in prediction_results:
-            return self.predict(to_infer)["DetectionOutput"][0][0]
+        LOGGER.debug(
+            "detections (at confidence > %.2f): %d",
+            min_confidence,
+            pedestrians.shape[0],
+        )
 
-        raise Exception("non supported results")
+        return pedestrians
 
     def detect(
         self,
@@ -57,28 +162,72 @@ class PedestrianDetection(SingleImageOpenVinoModel):
 
         :return: pedestrian RationDetection list
         """
-        # Check if the model is loaded correctly!
-        if detections is None:
-            detections = self.infer(image)
-
-        # filter the detection to keep only high confidence detection (bounding boxes)
-        filtered = detections[detections[:, 2] >= min_confidence]
-
-        LOGGER.debug(
-            "detections (at confidence > %.2f): %d", min_confidence, filtered.shape[0]
+        return to_ratio_detections(
+            self.detect_array(
+                image, detections=detections, min_confidence=min_confidence
+            )
         )
 
-        pedestrians: List[RatioDetection] = []
+    def detect_async(
+        self,
+        images: Iterable[Tuple[Any, np.ndarray]],
+        min_confidence: float = 0.95,
+        top_k: Optional[int] = None,
+        nms_threshold: Optional[float] = None,
+    ) -> Iterator[Tuple[Any, np.recarray]]:
+        """Detect pedestrians on a stream of images keeping up to num_requests
+        inferences in flight
+        :param images: iterable of (user_data, image) tuples (ex: (frame, image))
+        :param min_confidence: minimum confidence to filter detections
+        :param top_k: maximum number of (biggest) detections to keep
+        :param nms_threshold: non-maxima suppression IoU threshold (None to keep the
+            overlapping detections)
+
+        :return: iterator of (user_data, pedestrian detections record array) in the
+            input order
+        """
 
-        for _, _, confidence, start_x, start_y, end_x, end_y in filtered:
-            pedestrians.append(
-                RatioDetection(
-                    top_left=RatioPoint(start_x, start_y),
-                    bottom_right=RatioPoint(end_x, end_y),
-                    confidence=confidence,
-                )
+        def prepared_images():
+            for user_data, image in images:
+                # the input is copied to its request when submitted: the buffer is
+                # reused right after
+                with self.prepared_input(image) as to_infer:
+                    yield user_data, to_infer
+
+        for user_data, prediction_results in self.predict_async(prepared_images()):
+            yield user_data, self.detect_array(
+                None,
+                detections=self.detection_output(prediction_results),
+                min_confidence=min_confidence,
+                top_k=top_k,
+                nms_threshold=nms_threshold,
             )
 
-        return sorted(
-            pedestrians, key=lambda ratio_detection: ratio_detection.size, reverse=True
-        )
+    def detect_propagated(
+        self,
+        frames: Iterable[np.ndarray],
+        propagator: DetectionPropagator,
+        min_confidence: float = 0.95,
+        top_k: Optional[int] = None,
+    ) -> Iterator[List[RatioDetection]]:
+        """Detect pedestrians on the (consecutive) frames scheduled by the propagator
+        only, the detections are propagated on the frames in between (see
+        openvino_utils.propagation)
+        :param frames: consecutive (height, width, depth) frames
+        :param propagator: the detector frames scheduler (and detections propagator)
+        :param min_confidence: minimum confidence to filter detections
+        :param top_k: maximum number of (biggest) detections to keep
+
+        :return: iterator of each frame pedestrian RatioDetection list
+        """
+        for frame in frames:
+            if propagator.schedule():
+                detections = propagator.synchronize(
+                    frame,
+                    self.detect_array(
+                        frame, min_confidence=min_confidence, top_k=top_k
+                    ),
+                )
+            else:
+                detections = propagator.propagate(frame)
+            yield to_ratio_detections(detections)
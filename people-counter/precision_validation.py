@@ -0,0 +1,173 @@
+"""
+ Low precision (INT8) validation: replay the same frames through a reference (FP32) and
+ a quantized model, compare their detections, counts and dwell times, and their
+ throughput
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from counting import PresenceCounter, TrackCounter
+from openvino_utils.input_feeder import TimestampedFrame
+from openvino_utils.quantization import DetectionAgreement
+from openvino_utils.tuning import measure
+from pedestrian_detection import PedestrianDetection
+
+LOGGER = logging.getLogger()
+
+
+class CountingReplay:
+    """Count (presence or tracking mode) a model detections: entries and dwell times"""
+
+    def __init__(self, counting: str = "presence"):
+        self.counter = TrackCounter() if counting == "tracking" else PresenceCounter()
+        self.entries = 0
+        self.durations: List[float] = []
+        self.timestamp = 0.0
+
+    def count(self, detections: np.ndarray, timestamp: float):
+        self.timestamp = timestamp
+        for presence_event in self.counter.count(detections, timestamp):
+            if presence_event.entered:
+                self.entries += 1
+            else:
+                self.durations.append(presence_event.duration)
+
+    def summary(self) -> Dict[str, Any]:
+        if isinstance(self.counter, TrackCounter):
+            # the persons still in the scene leave at the end of the replay
+            for presence_event in self.counter.flush(self.timestamp):
+                self.durations.append(presence_event.duration)
+        return {
+            "total_count": self.entries,
+            "exits": len(self.durations),
+            "dwell_times": self.durations,
+            "mean_dwell_time": float(np.mean(self.durations))
+            if self.durations
+            else None,
+        }
+
+
+def compare_counts(
+    reference: Dict[str, Any], compared: Dict[str, Any], dwell_tolerance: float = 0.5
+) -> Tuple[Optional[float], Dict[str, bool]]:
+    """Compare two CountingReplay summaries: the same entries and exits, and mean dwell
+    times within the tolerance (rejected when only one of them has exits)
+
+    :return: the mean dwell times difference (None without exits) and the checks
+    """
+    mean_dwell_times = [reference["mean_dwell_time"], compared["mean_dwell_time"]]
+    dwell_difference = (
+        abs(mean_dwell_times[0] - mean_dwell_times[1])
+        if None not in mean_dwell_times
+        else None
+    )
+    checks = {
+        "same_total_count": reference["total_count"] == compared["total_count"],
+        "same_exits": reference["exits"] == compared["exits"],
+        "dwell_time": (
+            dwell_difference <= dwell_tolerance
+            if dwell_difference is not None
+            # (no exits on both sides)
+            else mean_dwell_times == [None, None]
+        ),
+    }
+    return dwell_difference, checks
+
+
+def validate_precision(
+    reference: PedestrianDetection,
+    quantized: PedestrianDetection,
+    frames: Iterable[TimestampedFrame],
+    counting: str = "presence",
+    min_confidence: float = 0.85,
+    nms_threshold: float = 0.5,
+    iou_threshold: float = 0.5,
+    min_agreement: float = 0.95,
+    dwell_tolerance: float = 0.5,
+    throughput_frames: int = 200,
+) -> Dict[str, Any]:
+    """Compare a quantized model to its reference (both loaded, with the same input
+    preprocessing)
+    :param frames: the replayed (consecutive) frames
+    :param counting: "presence" or "tracking" counting
+    :param min_confidence: detections minimum confidence (as the infer command)
+    :param nms_threshold: tracking mode non-maxima suppression IoU threshold
+    :param iou_threshold: minimum IoU for a quantized detection to match a reference one
+    :param min_agreement: minimum detections recall and precision (against the
+        reference) to accept
+    :param dwell_tolerance: maximum mean dwell time difference (seconds) to accept (with
+        exits on both)
+    :param throughput_frames: measured inferences for the throughput comparison
+
+    :return: the validation report (agreement, counts, speedup and the accepted verdict)
+    """
+    tracking = counting == "tracking"
+    decoding = {
+        "min_confidence": min_confidence,
+        "top_k": None if tracking else 1,
+        "nms_threshold": nms_threshold if tracking else None,
+    }
+    agreement = DetectionAgreement(iou_threshold=iou_threshold)
+    reference_counting = CountingReplay(counting)
+    quantized_counting = CountingReplay(counting)
+    inputs = []
+    for timestamped in frames:
+        reference_detections = reference.detect_array(timestamped.frame, **decoding)
+        quantized_detections = quantized.detect_array(timestamped.frame, **decoding)
+        agreement.add(reference_detections, quantized_detections)
+        reference_counting.count(reference_detections, timestamped.timestamp)
+        quantized_counting.count(quantized_detections, timestamped.timestamp)
+        if len(inputs) < throughput_frames:
+            inputs.append(reference.preprocess_input(timestamped.frame))
+
+    # (same inputs, same number of requests)
+    throughput = {
+        "reference": measure(reference, inputs, throughput_frames).dict(),
+        "quantized": measure(quantized, inputs, throughput_frames).dict(),
+    }
+    speedup: Optional[float] = None
+    if throughput["reference"]["fps"] and throughput["quantized"]["fps"]:
+        speedup = throughput["quantized"]["fps"] / throughput["reference"]["fps"]
+
+    counts = {
+        "reference": reference_counting.summary(),
+        "quantized": quantized_counting.summary(),
+    }
+    dwell_difference, count_checks = compare_counts(
+        counts["reference"], counts["quantized"], dwell_tolerance
+    )
+    agreement_summary = agreement.summary()
+    checks = {
+        "detections_agreement": all(
+            agreement_summary[metric] is None
+            or agreement_summary[metric] >= min_agreement
+            for metric in ("recall", "precision")
+        ),
+        **count_checks,
+    }
+    report = {
+        "reference": reference.model_directory,
+        "quantized": quantized.model_directory,
+        "counting": counting,
+        "agreement": agreement_summary,
+        "counts": counts,
+        "mean_dwell_time_difference": dwell_difference,
+        "throughput": throughput,
+        "speedup": speedup,
+        "checks": checks,
+        "accepted": all(checks.values()),
+    }
+    LOGGER.info(
+        "%s: recall %s, precision %s, counts %d/%d, speedup %s (%s)",
+        quantized.model_name,
+        agreement_summary["recall"],
+        agreement_summary["precision"],
+        counts["reference"]["total_count"],
+        counts["quantized"]["total_count"],
+        speedup,
+        "accepted" if report["accepted"] else "rejected",
+    )
+    return report
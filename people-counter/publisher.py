@@ -0,0 +1,188 @@
+"""
+ Coalescing, non-blocking MQTT publisher (and an in-process broker stand-in to measure
+ it)
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+from time import monotonic
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from openvino_utils.streaming_stats import LatencyStats
+
+LOGGER = logging.getLogger()
+
+# (topic, payload, enqueue time)
+OutboundMessage = Tuple[str, str, float]
+
+
+class CountPublisher:
+    """Publish the counting statistics from a background thread (never blocking the
+    inference loop)
+
+    - a count is only published when it changes or on a heartbeat (the last count is
+        re-published)
+    - the duration and stat messages are coalesced and sent in batches every
+        flush_interval (for the stats only the last value of each topic is kept)
+    - messages are held in a bounded outbound queue (the oldest are dropped) while the
+        client reconnects
+
+    Topics can be namespaced (ex: per stream "door-1/person").
+    """
+
+    def __init__(
+        self,
+        client,
+        heartbeat: float = 5.0,
+        flush_interval: float = 0.2,
+        max_queue: int = 1000,
+        run_network_loop: bool = True,
+    ):
+        """
+        :param client: (connected) paho MQTT client (or an InProcessBroker)
+        :param heartbeat: re-publish the (unchanged) counts every heartbeat seconds
+        :param flush_interval: batches sending interval (seconds)
+        :param max_queue: bounded outbound queue size (messages)
+        :param run_network_loop: run the client network loop in the background
+            (loop_start)
+        """
+        self.client = client
+        self.heartbeat = heartbeat
+        self.flush_interval = flush_interval
+        self.run_network_loop = run_network_loop
+        self.publish_latency = LatencyStats()
+        self.published_messages = 0
+        self.dropped_messages = 0
+        self._counts: Dict[str, int] = {}
+        self._counts_published_at: Dict[str, float] = {}
+        self._changed_counts: Dict[str, float] = {}  # topic -> change time
+        self._stats: Dict[str, Tuple[str, float]] = {}
+        self._outbound: Deque[OutboundMessage] = deque()
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sender: Optional[threading.Thread] = None
+
+    @staticmethod
+    def topic(topic: str, namespace: str = "") -> str:
+        return f"{namespace}/{topic}" if namespace else topic
+
+    def start(self) -> "CountPublisher":
+        if self.run_network_loop:
+            # paho reconnects automatically from its network loop (with a bounded
+            # backoff)
+            self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+            self.client.loop_start()
+        self._sender = threading.Thread(
+            target=self._send_loop, name="mqtt-publisher", daemon=True
+        )
+        self._sender.start()
+        return self
+
+    def stop(self):
+        """Flush the pending messages and stop the background sender (and network
+        loop)"""
+        self._stop_event.set()
+        if self._sender is not None:
+            self._sender.join()
+        self._flush(monotonic())
+        if self.run_network_loop:
+            self.client.loop_stop()
+
+    def _enqueue(self, topic: str, payload: str, now: float):
+        if len(self._outbound) >= self.max_queue:
+            self._outbound.popleft()
+            self.dropped_messages += 1
+        self._outbound.append((topic, payload, now))
+
+    def publish_count(self, count: int, namespace: str = ""):
+        """Publish a count (only sent if it changed or on the heartbeat)"""
+        topic = self.topic("person", namespace)
+        with self._lock:
+            if self._counts.get(topic) != count:
+                self._changed_counts[topic] = monotonic()
+            self._counts[topic] = count
+
+    def publish_duration(self, duration: float, namespace: str = ""):
+        """Publish a presence duration (sent with the next batch)"""
+        with self._lock:
+            self._enqueue(
+                self.topic("person/duration", namespace),
+                json.dumps({"duration": duration}),
+                monotonic(),
+            )
+
+    def publish_stats(
+        self, stats: Dict[str, Any], topic: str = "stats", namespace: str = ""
+    ):
+        """Publish statistics (coalesced: only the last stats of each topic is sent with
+        the next batch)"""
+        with self._lock:
+            self._stats[self.topic(topic, namespace)] = (json.dumps(stats), monotonic())
+
+    def _send_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self._flush(monotonic())
+
+    def _flush(self, now: float):
+        with self._lock:
+            for topic, count in self._counts.items():
+                changed_at = self._changed_counts.pop(topic, None)
+                if changed_at is not None or (
+                    now - self._counts_published_at.get(topic, 0.0) >= self.heartbeat
+                ):
+                    self._enqueue(
+                        topic, json.dumps({"count": count}), changed_at or now
+                    )
+                    self._counts_published_at[topic] = now
+            for topic, (payload, updated_at) in self._stats.items():
+                self._enqueue(topic, payload, updated_at)
+            self._stats.clear()
+            if not self.client.is_connected():
+                # keep the (bounded) outbound queue until the client reconnects
+                return
+            batch = list(self._outbound)
+            self._outbound.clear()
+        for topic, payload, enqueued_at in batch:
+            self.client.publish(topic, payload)
+            self.publish_latency.add(monotonic() - enqueued_at)
+        self.published_messages += len(batch)
+
+
+class InProcessBroker:
+    """A local, in-process MQTT broker stand-in (paho client interface subset) recording
+    the published messages: to run and measure the publisher without a broker"""
+
+    def __init__(self, max_messages: int = 100000):
+        self.messages: Deque[Tuple[str, str, float]] = deque(maxlen=max_messages)
+        self.subscribers: List[Callable[[str, str], None]] = []
+        self.connected = True
+        self.published = 0
+
+    def connect(self, *_args, **_kwargs):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def reconnect_delay_set(self, min_delay: int = 1, max_delay: int = 120):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def publish(
+        self, topic: str, payload: str = None, qos: int = 0, retain: bool = False
+    ):
+        self.messages.append((topic, payload, monotonic()))
+        self.published += 1
+        for subscriber in self.subscribers:
+            subscriber(topic, payload)
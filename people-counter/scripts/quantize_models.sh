@@ -0,0 +1,7 @@
+#!/usr/bin/bash
+# requires openvino-dev (post-training optimization tool) to be installed
+if [ "$#" -eq 1 ];
+then
+    echo "quantize (INT8) the models from $1"
+    . ../.venv/bin/activate && python app.py quantize_models --models_file=$1
+fi
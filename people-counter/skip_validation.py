@@ -0,0 +1,136 @@
+"""
+ Frame skipping validation: replay the same frames with an inference on every frame (the
+ reference) and with a skipping strategy (ex: motion gating) reusing or propagating the
+ detections of the inferred frames, then compare their counts and the inference compute
+"""
+
+import logging
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from openvino_utils.input_feeder import TimestampedFrame
+from openvino_utils.streaming_stats import LatencyStats
+from openvino_utils.utils import RatioBoundingBox
+from pedestrian_detection import PedestrianDetection
+from precision_validation import compare_counts, CountingReplay
+
+LOGGER = logging.getLogger()
+
+# (frame, the frame reference detections) -> (the strategy detections, the frame was
+# inferred)
+SkippingStrategy = Callable[[TimestampedFrame, np.recarray], Tuple[np.recarray, bool]]
+
+
+def motion_gated(gate) -> SkippingStrategy:
+    """Motion gating strategy: the not changed frames reuse the last inferred detections
+    :param gate: an openvino_utils.motion.MotionGate
+    """
+    last = {"detections": None}
+
+    def strategy(timestamped: TimestampedFrame, detections: np.recarray):
+        inferred = gate.update(timestamped.frame, timestamped.timestamp)
+        if inferred or last["detections"] is None:
+            last["detections"] = detections
+        return last["detections"], inferred
+
+    return strategy
+
+
+def propagated(propagator) -> SkippingStrategy:
+    """Detect every k frames strategy: the detections of the scheduled detector frames
+    are propagated (optical flow) on the frames in between
+    :param propagator: an openvino_utils.propagation.DetectionPropagator
+    """
+
+    def strategy(timestamped: TimestampedFrame, detections: np.recarray):
+        if propagator.schedule():
+            return propagator.synchronize(timestamped.frame, detections), True
+        return propagator.propagate(timestamped.frame), False
+
+    return strategy
+
+
+def validate_skipping(
+    detection: PedestrianDetection,
+    frames: Iterable[TimestampedFrame],
+    strategy: SkippingStrategy,
+    counting: str = "presence",
+    min_confidence: float = 0.85,
+    nms_threshold: float = 0.5,
+    dwell_tolerance: float = 0.5,
+    regions: Optional[Sequence[RatioBoundingBox]] = None,
+) -> Dict[str, Any]:
+    """Compare the counts of a skipping strategy to the every frame inference ones
+    :param detection: the loaded detector
+    :param frames: the replayed (consecutive) frames
+    :param strategy: the skipping strategy (its own time is measured as its overhead)
+    :param counting: "presence" or "tracking" counting
+    :param min_confidence: detections minimum confidence (as the infer command)
+    :param nms_threshold: tracking mode non-maxima suppression IoU threshold
+    :param dwell_tolerance: maximum mean dwell time difference (seconds) to accept
+    :param regions: regions of interest (see PedestrianDetection.infer_regions)
+
+    :return: the validation report (inferred frames, estimated speedup, counts and the
+        accepted verdict)
+    """
+    tracking = counting == "tracking"
+    reference_counting = CountingReplay(counting)
+    skipping_counting = CountingReplay(counting)
+    strategy_time = LatencyStats()
+    replayed, inferred, mismatched = 0, 0, 0
+    for timestamped in frames:
+        detections = detection.detect_array(
+            timestamped.frame,
+            min_confidence=min_confidence,
+            top_k=None if tracking else 1,
+            nms_threshold=nms_threshold if tracking else None,
+            regions=regions,
+        )
+        start = perf_counter()
+        skipping_detections, frame_inferred = strategy(timestamped, detections)
+        strategy_time.add(perf_counter() - start)
+        replayed += 1
+        inferred += frame_inferred
+        mismatched += len(skipping_detections) != len(detections)
+        reference_counting.count(detections, timestamped.timestamp)
+        skipping_counting.count(skipping_detections, timestamped.timestamp)
+
+    # (per frame: one inference per region of interest)
+    inference_time = detection.prediction_stats.total / replayed if replayed else 0.0
+    # per frame cost: every frame inferred vs the inferred frames and the strategy
+    # overhead
+    reference_time = replayed * inference_time
+    skipping_time = inferred * inference_time + strategy_time.total
+    counts = {
+        "reference": reference_counting.summary(),
+        "skipping": skipping_counting.summary(),
+    }
+    dwell_difference, checks = compare_counts(
+        counts["reference"], counts["skipping"], dwell_tolerance
+    )
+    report = {
+        "counting": counting,
+        "frames": replayed,
+        "inferred_frames": inferred,
+        "skip_ratio": 1 - inferred / replayed if replayed else None,
+        "inference_time": inference_time,
+        "strategy_time": strategy_time.summary(),
+        "saved_inference_seconds": (replayed - inferred) * inference_time,
+        "estimated_speedup": reference_time / skipping_time if skipping_time else None,
+        "mismatched_count_frames": mismatched / replayed if replayed else None,
+        "counts": counts,
+        "mean_dwell_time_difference": dwell_difference,
+        "checks": checks,
+        "accepted": all(checks.values()),
+    }
+    LOGGER.info(
+        "skip ratio %s, estimated speedup %s, counts %d/%d (%s)",
+        report["skip_ratio"],
+        report["estimated_speedup"],
+        counts["reference"]["total_count"],
+        counts["skipping"]["total_count"],
+        "accepted" if report["accepted"] else "rejected",
+    )
+    return report
@@ -0,0 +1,13 @@
+"""
+ The app modules and the openvino_utils library importable from the tests (without
+ installing them)
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, "openvino-utils")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
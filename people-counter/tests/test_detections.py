@@ -0,0 +1,80 @@
+"""
+ Detections decoding: confidence filtering, vectorized non-maxima suppression, size
+ ranking and top_k
+"""
+
+import numpy as np
+
+from openvino_utils.detections import (
+    decode_detections,
+    iou_matrix,
+    non_maxima_suppression,
+)
+
+
+def rows(*detections):
+    """(n, 7) detection rows from (confidence, x_min, y_min, x_max, y_max) tuples"""
+    return np.array(
+        [[0, 1, *detection] for detection in detections], dtype=np.float32
+    ).reshape(-1, 7)
+
+
+def test_iou_matrix():
+    boxes = np.array([[0.0, 0.0, 0.2, 0.2], [0.1, 0.0, 0.3, 0.2], [0.5, 0.5, 0.6, 0.6]])
+    ious = iou_matrix(boxes, boxes)
+    assert np.allclose(np.diag(ious), 1.0)
+    assert np.isclose(ious[0, 1], 1 / 3)
+    assert ious[0, 2] == 0.0
+    assert np.allclose(ious, ious.T)
+
+
+def test_overlapping_boxes_are_suppressed():
+    boxes = np.array(
+        [
+            [0.10, 0.10, 0.30, 0.50],  # the best of its cluster
+            [0.11, 0.10, 0.31, 0.50],  # overlaps the first one
+            [0.60, 0.10, 0.80, 0.50],  # disjoint
+            [0.12, 0.11, 0.31, 0.51],  # overlaps the first one
+            [0.20, 0.10, 0.40, 0.50],  # overlaps the second one below the threshold
+        ]
+    )
+    scores = np.array([0.9, 0.95, 0.8, 0.85, 0.7])
+    # (by decreasing score: the second box suppresses the first and the fourth ones)
+    assert non_maxima_suppression(boxes, scores, iou_threshold=0.5).tolist() == [
+        1,
+        2,
+        4,
+    ]
+    # no overlap above the threshold: all kept
+    assert sorted(
+        non_maxima_suppression(boxes, scores, iou_threshold=0.99).tolist()
+    ) == [0, 1, 2, 3, 4]
+    assert non_maxima_suppression(np.empty((0, 4)), np.empty(0)).tolist() == []
+
+
+def test_decode_detections():
+    detections = decode_detections(
+        rows(
+            (0.97, 0.1, 0.1, 0.3, 0.5),
+            (0.99, 0.11, 0.1, 0.31, 0.5),  # (suppresses the first one)
+            (0.96, 0.6, 0.1, 0.9, 0.6),  # the biggest
+            (0.5, 0.0, 0.0, 1.0, 1.0),  # below the minimum confidence
+        ),
+        min_confidence=0.95,
+        nms_threshold=0.5,
+    )
+    assert detections.confidence.tolist() == np.float32([0.96, 0.99]).tolist()
+    biggest = decode_detections(
+        rows((0.97, 0.1, 0.1, 0.3, 0.5), (0.96, 0.6, 0.1, 0.9, 0.6)), top_k=1
+    )
+    assert biggest.x_min.tolist() == [np.float32(0.6)]
+    # (without non-maxima suppression the overlapping detections are kept)
+    assert (
+        len(
+            decode_detections(
+                rows((0.97, 0.1, 0.1, 0.3, 0.5), (0.99, 0.11, 0.1, 0.31, 0.5))
+            )
+        )
+        == 2
+    )
+    assert len(decode_detections(rows())) == 0
@@ -0,0 +1,31 @@
+"""
+ Process metrics: the process start time
+"""
+
+import os
+import sys
+from time import time
+
+import pytest
+
+from openvino_utils.metrics import process_start_time
+
+
+def test_process_start_time():
+    started = process_start_time()
+    # (the test session started before this test, within its timeout)
+    assert time() - 600 < started < time()
+    assert abs(process_start_time() - started) < 0.1
+
+
+def test_process_start_time_without_proc(monkeypatch):
+    psutil = pytest.importorskip("psutil")
+    monkeypatch.delattr(os, "sysconf")
+    assert process_start_time() == psutil.Process().create_time()
+
+
+def test_unknown_process_start_time(monkeypatch):
+    monkeypatch.delattr(os, "sysconf")
+    # (psutil not installed)
+    monkeypatch.setitem(sys.modules, "psutil", None)
+    assert process_start_time() is None
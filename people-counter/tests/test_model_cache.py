@@ -0,0 +1,86 @@
+"""
+ Compiled network cache: a second load of a model imports its compiled network (a
+ "warm", faster load)
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from openvino_utils.openvino_model import OpenVinoModel
+
+runtime = pytest.importorskip("openvino.runtime")
+
+
+def write_model(directory, seed=0):
+    """A small convolutional network IR (tiny.xml, tiny.bin)"""
+    os.makedirs(directory, exist_ok=True)
+    opset = runtime.opset8
+    data = opset.parameter([1, 3, 96, 96], np.float32, name="data")
+    output = data
+    for layer in range(6):
+        weights = np.random.default_rng(seed + layer).random(
+            (8, output.shape[1], 3, 3), dtype=np.float32
+        )
+        output = opset.relu(
+            opset.convolution(
+                output, opset.constant(weights), [1, 1], [1, 1], [1, 1], [1, 1]
+            )
+        )
+    runtime.serialize(
+        runtime.Model([output], [data], "tiny"),
+        os.path.join(directory, "tiny.xml"),
+        os.path.join(directory, "tiny.bin"),
+    )
+    return directory
+
+
+@pytest.fixture(name="model_directory")
+def fixture_model_directory(tmp_path):
+    if not hasattr(runtime, "serialize"):
+        pytest.skip("openvino.runtime.serialize unavailable")
+    return write_model(str(tmp_path / "model"))
+
+
+def load(model_directory, cache_directory):
+    model = OpenVinoModel(
+        model_name="tiny",
+        model_directory=model_directory,
+        cache_directory=cache_directory,
+        tuning=False,
+    )
+    model.load_model()
+    return model
+
+
+def test_second_load_is_warm(model_directory, tmp_path):
+    cache_directory = str(tmp_path / "cache")
+    cold = load(model_directory, cache_directory)
+    assert cold.cache_state == "cold"
+    (entry,) = os.listdir(cache_directory)
+    # the compiled network was exported in the entry (the core CACHE_DIR)
+    assert any(
+        name != "metadata.json"
+        for name in os.listdir(os.path.join(cache_directory, entry))
+    )
+    warm = [load(model_directory, cache_directory) for _ in range(3)]
+    assert [model.cache_state for model in warm] == ["warm"] * 3
+    assert min(model.loading_time for model in warm) < cold.loading_time
+    assert warm[-1].cache_metadata["loads"] == 4
+    inputs = np.ones((1, 3, 96, 96), dtype=np.float32)
+    assert np.array_equal(
+        next(iter(warm[0].network.infer({"data": inputs}).values())),
+        next(iter(cold.network.infer({"data": inputs}).values())),
+    )
+
+
+def test_the_cache_directory_is_only_used_by_cached_loads(model_directory, tmp_path):
+    cache_directory = str(tmp_path / "cache")
+    load(model_directory, cache_directory)
+    (entry,) = os.listdir(cache_directory)
+    exported = set(os.listdir(os.path.join(cache_directory, entry)))
+    # (the shared core CACHE_DIR was reset after the cached load)
+    model = load(write_model(str(tmp_path / "other"), seed=10), None)
+    assert model.cache_state is None
+    assert set(os.listdir(os.path.join(cache_directory, entry))) == exported
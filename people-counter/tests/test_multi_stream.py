@@ -0,0 +1,59 @@
+"""
+ Multi-stream runner: every stream runs at once (its own thread) whatever the inference
+ concurrency cap
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from multi_stream import MultiStreamRunner, StreamManifest, StreamSpec
+from openvino_utils.detections import empty_detections
+from publisher import CountPublisher, InProcessBroker
+
+FRAMES = 12
+
+
+class BarrierDetector:
+    """A detector stand-in whose first inference of each stream waits for all the
+    streams to be running"""
+
+    def __init__(self, streams: int):
+        self.barrier = threading.Barrier(streams, timeout=10)
+        self._waited = threading.local()
+
+    def detect_array(self, _image, **_kwargs):
+        if not getattr(self._waited, "done", False):
+            self._waited.done = True
+            self.barrier.wait()
+        return empty_detections()
+
+
+def write_video(path):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 24))
+    for index in range(FRAMES):
+        writer.write(np.full((24, 32, 3), index * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_all_the_streams_run_concurrently(tmp_path):
+    source = write_video(str(tmp_path / "video.avi"))
+    manifest = StreamManifest(
+        streams=[StreamSpec(name=f"door-{index}", source=source) for index in range(3)]
+    )
+    publisher = CountPublisher(InProcessBroker(), flush_interval=0.01).start()
+    runner = MultiStreamRunner(
+        manifest,
+        {"detector": BarrierDetector(3)},
+        publisher,
+        default_model="detector",
+        report_interval=0.1,
+    )
+    report = runner.run()
+    publisher.stop()
+    # (a stream waiting for another one to end would break the barrier)
+    assert {name: stream["frames"] for name, stream in report["streams"].items()} == {
+        f"door-{index}": FRAMES for index in range(3)
+    }
@@ -0,0 +1,152 @@
+"""
+ Staged pipeline: the items leave in the source order (whatever the threads per stage),
+ the dropped items are filtered out, and a failing stage or source stops the pipeline
+ raising its error to the consumer
+"""
+
+import random
+import threading
+from time import sleep
+
+import pytest
+
+from openvino_utils.video_utils import DROP, Pipeline, Stage
+
+TIMEOUT = 10
+
+
+def consume(pipeline):
+    """Iterate the pipeline in a thread (a deadlock fails the test instead of hanging
+    it)"""
+    result = {"items": [], "error": None}
+
+    def run():
+        try:
+            for item in pipeline:
+                result["items"].append(item)
+        except Exception as error:  # pylint: disable=broad-except
+            result["error"] = error
+
+    consumer = threading.Thread(target=run, daemon=True)
+    consumer.start()
+    consumer.join(TIMEOUT)
+    assert not consumer.is_alive(), "the pipeline did not end"
+    return result
+
+
+def jittered(function):
+    """A stage process taking a random time (the threads of a stage finish out of
+    order)"""
+    generator = random.Random(0)
+    lock = threading.Lock()
+
+    def process(item):
+        with lock:
+            delay = generator.uniform(0, 0.003)
+        sleep(delay)
+        return function(item)
+
+    return process
+
+
+def test_source_order_with_several_threads_per_stage():
+    threads = set()
+
+    def square(item):
+        threads.add(threading.current_thread().name)
+        return item * item
+
+    stages = [
+        Stage("square", jittered(square), threads=4, queue_size=2),
+        Stage("increment", jittered(lambda item: item + 1), threads=3, queue_size=2),
+        Stage("identity", lambda item: item, threads=1, queue_size=1),
+    ]
+    result = consume(Pipeline(range(200), stages))
+    assert result["error"] is None
+    assert result["items"] == [item * item + 1 for item in range(200)]
+    assert len(threads) > 1
+
+
+def test_dropped_items():
+    seen = []
+
+    def drop_odd(item):
+        return DROP if item % 2 else item
+
+    def record(item):
+        seen.append(item)
+        return item
+
+    stages = [
+        Stage("drop", jittered(drop_odd), threads=3),
+        Stage("record", record, threads=1),
+    ]
+    result = consume(Pipeline(range(50), stages))
+    assert result["error"] is None
+    assert result["items"] == list(range(0, 50, 2))
+    # (the downstream stages do not process the dropped items)
+    assert seen == list(range(0, 50, 2))
+
+
+def test_failing_stage():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for item in range(10000):
+                yield item
+        finally:
+            closed.set()
+
+    def fail(item):
+        if item == 20:
+            raise ValueError("stage failure")
+        return item
+
+    stages = [
+        Stage("fail", fail, threads=2, queue_size=2),
+        Stage("identity", jittered(lambda item: item), threads=2, queue_size=2),
+    ]
+    result = consume(Pipeline(source(), stages))
+    assert isinstance(result["error"], ValueError)
+    assert str(result["error"]) == "stage failure"
+    assert result["items"] == list(range(len(result["items"])))
+    assert len(result["items"]) <= 20
+    assert closed.wait(TIMEOUT)
+
+
+def test_failing_source():
+    def source():
+        yield from range(5)
+        raise OSError("capture failure")
+
+    result = consume(
+        Pipeline(source(), [Stage("identity", lambda item: item, threads=2)])
+    )
+    assert isinstance(result["error"], OSError)
+    assert result["items"] == list(range(len(result["items"])))
+
+
+def test_consumer_stopping_early():
+    pipeline = Pipeline(
+        iter(range(10000)), [Stage("identity", lambda item: item, threads=2)]
+    )
+    items = []
+    for item in pipeline:
+        items.append(item)
+        if len(items) == 10:
+            break
+    # (closing the iteration stops and joins the threads)
+    assert items == list(range(10))
+    assert pipeline.stop_event.is_set()
+    assert not any(
+        thread.is_alive() for thread in pipeline._threads
+    )  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_empty_source(threads):
+    result = consume(
+        Pipeline([], [Stage("identity", lambda item: item, threads=threads)])
+    )
+    assert result == {"items": [], "error": None}
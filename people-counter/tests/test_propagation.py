@@ -0,0 +1,95 @@
+"""
+ Detection propagation scheduling: the detector frames at startup and after a lost box,
+ and the lag between the scheduling (gate stage) and the propagation (count stage) in
+ the pipeline
+"""
+
+import threading
+from time import sleep
+
+from counter_pipeline import CounterStages
+from openvino_utils.propagation import DetectionPropagator
+from openvino_utils.sinks import OutputSinks
+from openvino_utils.utils import ImageDimension
+from openvino_utils.video_utils import Pipeline
+
+
+def test_only_the_first_frame_is_forced():
+    propagator = DetectionPropagator(min_interval=4, max_interval=8)
+    # (several frames are scheduled before the first one is synchronized)
+    assert [propagator.schedule() for _ in range(9)] == [
+        True,
+        False,
+        False,
+        False,
+    ] * 2 + [True]
+
+
+def test_a_lost_box_schedules_the_next_frame():
+    propagator = DetectionPropagator(min_interval=4, max_interval=8)
+    assert propagator.schedule()
+    assert not propagator.schedule()
+    propagator.lost = True
+    assert propagator.schedule()
+    assert not propagator.lost
+    assert not propagator.schedule()
+
+
+def counter_stages(propagator):
+    return CounterStages(
+        pedestrian_detection=None,
+        presence_counter=None,
+        publisher=None,
+        sinks=OutputSinks([]),
+        output_dimension=ImageDimension(x=64, y=48),
+        propagator=propagator,
+    )
+
+
+def test_gated_queues():
+    stages = counter_stages(DetectionPropagator(max_interval=8)).stages(queue_size=4)
+    assert {stage.name: stage.queue_size for stage in stages} == {
+        "gate": 4,
+        "preprocess": 1,
+        "infer": 1,
+        "count": 1,
+    }
+    # (detecting every frame: no lag to bound)
+    stages = counter_stages(DetectionPropagator(max_interval=1)).stages(queue_size=4)
+    assert {stage.queue_size for stage in stages} == {4}
+
+
+def test_scheduling_lag_is_bounded():
+    stages = counter_stages(DetectionPropagator(max_interval=8)).stages(
+        preprocess_threads=2, infer_threads=3, queue_size=8
+    )
+    lock = threading.Lock()
+    progress = {"scheduled": 0, "counted": 0, "lag": 0}
+
+    def gate(item):
+        with lock:
+            progress["scheduled"] += 1
+            progress["lag"] = max(
+                progress["lag"], progress["scheduled"] - progress["counted"] - 1
+            )
+        return item
+
+    def infer(item):
+        sleep(0.002)
+        return item
+
+    def count(item):
+        with lock:
+            progress["counted"] += 1
+        return item
+
+    processes = {
+        "gate": gate,
+        "preprocess": lambda item: item,
+        "infer": infer,
+        "count": count,
+    }
+    for stage in stages:
+        stage.process = processes[stage.name]
+    assert list(Pipeline(range(200), stages)) == list(range(200))
+    assert 0 < progress["lag"] <= CounterStages.propagation_lag(stages) == 2 + 3 + 4
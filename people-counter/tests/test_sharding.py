@@ -0,0 +1,171 @@
+"""
+ Sharded (time segments) processing: the segments frames are the sequential read ones
+ and the counting replayed on the merged segments gives the sequential run events
+"""
+
+import itertools
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from offline import (
+    count_events,
+    frame_count,
+    frame_digest,
+    new_counter,
+    OfflineJob,
+    pack_segment,
+    plan_segments,
+    segment_frames,
+)
+from openvino_utils.detections import as_detections, empty_detections
+from openvino_utils.input_feeder import InputFeeder
+
+TEST_VIDEO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "..",
+    "ffmpeg",
+    "data",
+    "test_video.mp4",
+)
+
+FPS = 10.0
+
+
+def read_frames(start=0, stop=None, overlap=0):
+    input_feeder = InputFeeder("video", TEST_VIDEO)
+    input_feeder.load_data()
+    try:
+        return [
+            (timestamped.index, timestamped.timestamp, timestamped.frame.copy())
+            for timestamped in input_feeder.frames(start, stop, overlap=overlap)
+        ]
+    finally:
+        input_feeder.close()
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_VIDEO), reason="no test video")
+@pytest.mark.parametrize("overlap", [0, 12])
+def test_segments_frames_are_the_sequential_ones(overlap):
+    frames = read_frames(stop=90)
+    segments = plan_segments(len(frames), 3)
+    sharded = list(
+        itertools.chain.from_iterable(
+            read_frames(start, len(frames) if stop is None else stop, overlap=overlap)
+            for start, stop in segments
+        )
+    )
+    assert [index for index, _, _ in sharded] == [index for index, _, _ in frames]
+    for (index, timestamp, frame), (_, sharded_timestamp, sharded_frame) in zip(
+        frames, sharded
+    ):
+        assert sharded_timestamp == timestamp, index
+        assert np.array_equal(sharded_frame, frame), index
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_VIDEO), reason="no test video")
+def test_frame_count():
+    capture = cv2.VideoCapture(TEST_VIDEO)
+    expected = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    assert frame_count(TEST_VIDEO) == expected > 0
+
+
+def person(x_min, confidence=0.9):
+    return [0, 1, confidence, x_min, 0.2, x_min + 0.2, 0.9]
+
+
+def synthetic_frames(frames=100):
+    """A person walking in (frames 20-69) then a second one (45-79): both across the
+    segment boundaries"""
+    sequence = []
+    for index in range(frames):
+        rows = []
+        if 20 <= index < 70:
+            rows.append(person(0.05 + 0.004 * (index - 20)))
+        if 45 <= index < 80:
+            rows.append(person(0.7 - 0.004 * (index - 45), confidence=0.95))
+        detections = (
+            as_detections(np.array(rows, dtype=np.float32))
+            if rows
+            else empty_detections()
+        )
+        sequence.append((index, index / FPS, detections))
+    return sequence
+
+
+def split(sequence, segments):
+    """Pack the sequence detections by segment (as the workers do), with the boundary
+    frames digests"""
+    ranges = plan_segments(len(sequence), segments)
+    packed = []
+    for start, stop in ranges:
+        segment_sequence = sequence[start:stop]
+        packed.append(
+            pack_segment(
+                start,
+                stop,
+                segment_sequence,
+                first_digest=str(start),
+                next_digest=None if stop is None else str(stop),
+            )
+        )
+    return packed
+
+
+def merged(segments):
+    return itertools.chain.from_iterable(
+        segment_frames(segment, segments[position - 1] if position else None)
+        for position, segment in enumerate(segments)
+    )
+
+
+@pytest.mark.parametrize("counting", ["presence", "tracking"])
+@pytest.mark.parametrize("segments", [2, 3, 7])
+def test_sharded_events_are_the_sequential_ones(counting, segments):
+    job = OfflineJob(counting=counting, frames_window=10, threshold=0.7)
+    sequence = synthetic_frames()
+    expected = list(count_events(new_counter(job), iter(sequence)))
+    events = list(count_events(new_counter(job), merged(split(sequence, segments))))
+    assert events == expected
+    # an entry before a segment boundary whose exit (and dwell) comes after it
+    boundaries = [start for start, _ in plan_segments(len(sequence), segments)[1:]]
+    entries = [event for event in expected if event["event"] == "enter"]
+    exits = [
+        event for event in expected if event["event"] == "exit" and event.get("dwell")
+    ]
+    assert entries and exits
+    assert any(
+        entry["frame"] < boundary <= exit_event["frame"]
+        for entry, exit_event in zip(entries, exits)
+        for boundary in boundaries
+    )
+
+
+def test_misaligned_segment_is_rejected():
+    segments = split(synthetic_frames(), 2)
+    segments[1]["first_digest"] = frame_digest(np.zeros((4, 4, 3), dtype=np.uint8))
+    with pytest.raises(RuntimeError, match="misaligned"):
+        list(merged(segments))
+
+
+def test_short_segment_is_rejected():
+    sequence = synthetic_frames()
+    segments = split(sequence, 2)
+    segments[0] = pack_segment(
+        0, segments[0]["stop"], sequence[:10], "0", segments[0]["next_digest"]
+    )
+    with pytest.raises(RuntimeError, match="short segment"):
+        list(merged(segments))
+
+
+def test_plan_segments():
+    assert plan_segments(100, 4) == [(0, 25), (25, 50), (50, 75), (75, None)]
+    # an unknown frame count: a single (open) segment
+    assert plan_segments(0, 4) == [(0, None)]
+    # more segments than frames: one frame segments
+    assert plan_segments(3, 8) == [(0, 1), (1, 2), (2, None)]
+    assert plan_segments(1, 8) == [(0, None)]
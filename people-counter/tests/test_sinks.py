@@ -0,0 +1,38 @@
+"""
+ Output sinks: the frames are color converted once and written to every sink
+"""
+
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from openvino_utils.sinks import FrameSink, OutputSinks, RawPipeSink
+
+
+def test_a_sink_implements_write():
+    with pytest.raises(TypeError):
+        FrameSink()  # pylint: disable=abstract-class-instantiated
+
+    class ClosingOnly(FrameSink):  # pylint: disable=abstract-method
+        def close(self):
+            pass
+
+    with pytest.raises(TypeError):
+        ClosingOnly()
+
+
+def test_raw_pipe_sinks():
+    frame = np.arange(4 * 6 * 3, dtype=np.uint8).reshape(4, 6, 3)
+    streams = [io.BytesIO(), io.BytesIO()]
+    sinks = OutputSinks(
+        [RawPipeSink(stream) for stream in streams], color_conversion=cv2.COLOR_BGR2RGB
+    )
+    assert sinks.enabled
+    sinks.write(frame)
+    sinks.write(frame)
+    sinks.close()
+    expected = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).tobytes() * 2
+    assert [stream.getvalue() for stream in streams] == [expected, expected]
+    assert not OutputSinks([]).enabled
@@ -0,0 +1,217 @@
+"""
+ Time series store: segments rotation and reuse, range reads and the per-minute rollups
+ (aggregated as the raw frames and events)
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from counting import PresenceEvent
+from openvino_utils.detections import as_detections
+from openvino_utils.timeseries import (
+    dwell_bins,
+    FRAME_DTYPE,
+    SegmentedSeries,
+    TimeSeriesStore,
+    TimeSeriesWriter,
+)
+
+FPS = 10.0
+
+
+def frame_records(timestamps):
+    records = np.zeros(len(timestamps), dtype=FRAME_DTYPE)
+    records["timestamp"] = timestamps
+    records["count"] = np.arange(len(timestamps)) % 3
+    return records
+
+
+def detections(count, confidence=0.9):
+    return as_detections(
+        np.array([[0, 1, confidence, 0.1, 0.1, 0.3, 0.9]] * count, dtype=np.float32)
+    )
+
+
+def test_append_across_rotations(tmp_path):
+    series = SegmentedSeries(str(tmp_path), "frames", initial_rows=4, max_rows=8)
+    records = frame_records(np.arange(30, dtype=np.float64))
+    for start in range(0, 30, 3):
+        series.append(records[start : start + 3])
+    series.flush()
+    # the segments double up to max_rows
+    assert [len(np.load(path, mmap_mode="r")) for path in series.paths()] == [
+        4,
+        8,
+        8,
+        8,
+        8,
+    ]
+    assert np.array_equal(series.read(), records)
+    assert np.array_equal(series.read(5, 12), records[5:12])
+    assert np.array_equal(series.read(28.5), records[29:])
+    assert len(series.read(100)) == 0
+    series.close()
+
+
+def test_a_new_writer_appends_to_the_last_segment(tmp_path):
+    series = SegmentedSeries(str(tmp_path), "frames", initial_rows=4, max_rows=16)
+    series.append(frame_records([0.0, 1.0]))
+    series.close()
+    series = SegmentedSeries(str(tmp_path), "frames", initial_rows=4, max_rows=16)
+    series.append(frame_records([2.0, 3.0, 4.0]))
+    series.close()
+    paths = series.paths()
+    assert [len(np.load(path, mmap_mode="r")) for path in paths] == [4, 8]
+    assert series.read()["timestamp"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    # (no temporary file left)
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(path) for path in paths]
+
+
+def record_run(writer, stream, frames, offset=0.0, seed=0):
+    """Record frames at FPS with random detections and presence, an entry/exit on each
+    presence change"""
+    random = np.random.default_rng(seed)
+    recorder = writer.stream(stream, offset=offset)
+    present, entered_at = 0, 0.0
+    for index in range(frames):
+        timestamp = index / FPS
+        count = int(random.integers(0, 3))
+        recorder.add_frame(
+            timestamp,
+            detections(count, float(random.uniform(0.8, 1.0))),
+            present,
+            index % 2 == 0,
+        )
+        if count and not present:
+            present, entered_at = 1, timestamp
+            recorder.add_event(PresenceEvent(entered=True, timestamp=timestamp))
+        elif not count and present:
+            present = 0
+            recorder.add_event(
+                PresenceEvent(
+                    entered=False, timestamp=timestamp, duration=timestamp - entered_at
+                )
+            )
+    return recorder
+
+
+def raw_occupancy(frames, events, bucket):
+    """The occupancy aggregated from the raw frames and events"""
+    buckets = (frames["timestamp"] // bucket) * bucket
+    event_buckets = (events["timestamp"] // bucket) * bucket
+    keys = np.unique(buckets)
+    exits = events[events["entered"] == 0]
+    exit_buckets = (exits["timestamp"] // bucket) * bucket
+    return {
+        "timestamp": keys.tolist(),
+        "frames": [int(np.count_nonzero(buckets == key)) for key in keys],
+        "mean_occupancy": [frames["present"][buckets == key].mean() for key in keys],
+        "max_occupancy": [int(frames["present"][buckets == key].max()) for key in keys],
+        "entries": [
+            int(np.count_nonzero((event_buckets == key) & (events["entered"] == 1)))
+            for key in keys
+        ],
+        "exits": [int(np.count_nonzero(exit_buckets == key)) for key in keys],
+        "mean_dwell": [
+            (
+                float(exits["dwell"][exit_buckets == key].astype(np.float64).mean())
+                if np.any(exit_buckets == key)
+                else None
+            )
+            for key in keys
+        ],
+    }
+
+
+@pytest.mark.parametrize("bucket", [60, 120])
+def test_rollups_are_the_raw_aggregates(tmp_path, bucket):
+    writer = TimeSeriesWriter(
+        str(tmp_path), segment_rows={"frames": (64, 256), "minutes": (2, 4)}
+    )
+    # 5.5 minutes, flushed in batches
+    recorder = writer.stream("door")
+    for start in range(0, 3300, 500):
+        record_run(
+            writer, "door", min(500, 3300 - start), offset=start / FPS, seed=start
+        )
+        writer.flush()
+    writer.stop()
+    assert recorder.stream == "door"
+    store = TimeSeriesStore(str(tmp_path))
+    assert store.streams() == ["door"]
+    frames, events = store.series("door", "frames"), store.series("door", "events")
+    assert len(frames) == 3300
+    occupancy = store.occupancy("door", bucket=bucket)
+    expected = raw_occupancy(frames, events, bucket)
+    for field in ("timestamp", "frames", "max_occupancy", "entries", "exits"):
+        assert occupancy[field] == expected[field], field
+    assert np.allclose(occupancy["mean_occupancy"], expected["mean_occupancy"])
+    assert [dwell is None for dwell in occupancy["mean_dwell"]] == [
+        dwell is None for dwell in expected["mean_dwell"]
+    ]
+    assert np.allclose(
+        [dwell for dwell in occupancy["mean_dwell"] if dwell is not None],
+        [dwell for dwell in expected["mean_dwell"] if dwell is not None],
+        rtol=1e-5,
+    )
+    exits = events[events["entered"] == 0]
+    histogram = store.dwell_histogram("door")
+    assert histogram["counts"] == dwell_bins(exits["dwell"]).tolist()
+    assert histogram["exits"] == len(exits)
+    # a range: the minutes of [60, 180)
+    ranged = store.occupancy("door", start=60, end=180)
+    assert ranged["timestamp"] == [60.0, 120.0]
+    assert ranged["frames"] == [600, 600]
+
+
+def test_reads_while_a_minute_is_pending(tmp_path):
+    writer = TimeSeriesWriter(str(tmp_path))
+    recorder = writer.stream("door")
+    for index in range(900):  # 1.5 minutes
+        recorder.add_frame(index / FPS, detections(1), 1)
+    writer.flush()
+    store = TimeSeriesStore(str(tmp_path))
+    occupancy = store.occupancy("door")
+    # the pending (second) minute is visible
+    assert occupancy["frames"] == [600, 300]
+    for index in range(900, 1000):
+        recorder.add_frame(index / FPS, detections(0), 0)
+    writer.flush()
+    occupancy = store.occupancy("door")
+    # rewritten in place (no duplicate minute)
+    assert len(store.series("door", "minutes")) == 2
+    assert occupancy["frames"] == [600, 400]
+    assert occupancy["mean_occupancy"] == [1.0, 0.75]
+    writer.stop()
+    assert store.occupancy("door")["frames"] == [600, 400]
+
+
+def test_a_clock_going_backwards_is_added_to_the_current_minute(tmp_path):
+    writer = TimeSeriesWriter(str(tmp_path))
+    recorder = writer.stream("door")
+    recorder.add_frame(125.0, detections(1), 1)
+    writer.flush()
+    recorder.add_frame(119.0, detections(1), 1)
+    writer.stop()
+    minutes = TimeSeriesStore(str(tmp_path)).series("door", "minutes")
+    assert minutes["timestamp"].tolist() == [120.0]
+    assert minutes["frames"].tolist() == [2]
+
+
+def test_stream_offset(tmp_path):
+    writer = TimeSeriesWriter(str(tmp_path))
+    recorder = writer.stream("replay", offset=1000.0)
+    recorder.add_frame(1.5, detections(1), 1)
+    recorder.add_event(PresenceEvent(entered=True, timestamp=1.5))
+    writer.stop()
+    store = TimeSeriesStore(str(tmp_path))
+    assert recorder.last_timestamp == 1001.5
+    assert store.series("replay", "frames")["timestamp"].tolist() == [1001.5]
+    assert store.series("replay", "events")["timestamp"].tolist() == [1001.5]
+
+
+def test_invalid_stream_name(tmp_path):
+    with pytest.raises(ValueError):
+        TimeSeriesWriter(str(tmp_path)).stream("../door")
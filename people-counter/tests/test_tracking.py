@@ -0,0 +1,80 @@
+"""
+ IoU tracker: tracks confirmed after min_hits matched detections, exiting after
+ max_misses missed frames with their dwell time
+"""
+
+import numpy as np
+
+from openvino_utils.tracking import IoUTracker
+
+FPS = 10.0
+
+
+def boxes(*boxes):
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def update(tracker, frame, *frame_boxes):
+    detected = boxes(*frame_boxes)
+    return tracker.update(detected, np.full(len(detected), 0.9), frame / FPS)
+
+
+def test_confirmed_after_min_hits():
+    tracker = IoUTracker(min_hits=3, max_misses=2)
+    assert update(tracker, 0, (0.1, 0.1, 0.3, 0.5)) == []
+    assert tracker.detection_track_ids.tolist() == [-1]
+    assert update(tracker, 1, (0.11, 0.1, 0.31, 0.5)) == []
+    (entered,) = update(tracker, 2, (0.12, 0.1, 0.32, 0.5))
+    assert entered.entered
+    # (entered when first seen)
+    assert entered.timestamp == 0.0
+    assert tracker.detection_track_ids.tolist() == [entered.track_id]
+    assert [track.track_id for track in tracker.active_tracks] == [entered.track_id]
+
+
+def test_exit_after_max_misses_with_the_dwell_time():
+    tracker = IoUTracker(min_hits=2, max_misses=3)
+    for frame in range(10):
+        update(tracker, frame, (0.1 + frame * 0.01, 0.1, 0.3 + frame * 0.01, 0.5))
+    (track,) = tracker.active_tracks
+    # missed frames 10 to 12 are tolerated, the 4th miss exits
+    for frame in range(10, 13):
+        assert update(tracker, frame) == []
+        assert tracker.active_tracks == [track]
+    (exited,) = update(tracker, 13)
+    assert not exited.entered
+    assert exited.track_id == track.track_id
+    assert exited.timestamp == 1.3
+    # (first to last seen)
+    assert np.isclose(exited.dwell, 0.9)
+    assert tracker.tracks == []
+
+
+def test_unconfirmed_tracks_exit_silently():
+    tracker = IoUTracker(min_hits=3, max_misses=1)
+    update(tracker, 0, (0.1, 0.1, 0.3, 0.5))
+    assert update(tracker, 1) == []
+    assert update(tracker, 2) == []
+    assert tracker.tracks == []
+
+
+def test_persistent_ids_for_two_persons():
+    tracker = IoUTracker(min_hits=1, max_misses=5)
+    entered = update(tracker, 0, (0.1, 0.1, 0.3, 0.5), (0.6, 0.1, 0.8, 0.5))
+    assert [event.entered for event in entered] == [True, True]
+    ids = tracker.detection_track_ids.tolist()
+    # (listed in the other order, moved: matched by IoU)
+    assert update(tracker, 1, (0.62, 0.1, 0.82, 0.5), (0.12, 0.1, 0.32, 0.5)) == []
+    assert tracker.detection_track_ids.tolist() == ids[::-1]
+
+
+def test_centroid_distance_fallback():
+    tracker = IoUTracker(min_hits=1, max_misses=5, max_centroid_distance=0.1)
+    update(tracker, 0, (0.10, 0.1, 0.15, 0.5))
+    (track_id,) = tracker.detection_track_ids.tolist()
+    # a (narrow) box moving without overlap within the centroid distance keeps its id
+    assert update(tracker, 1, (0.16, 0.1, 0.21, 0.5)) == []
+    assert tracker.detection_track_ids.tolist() == [track_id]
+    # beyond the centroid distance: a new track
+    (entered,) = update(tracker, 2, (0.40, 0.1, 0.45, 0.5))
+    assert entered.entered and entered.track_id != track_id
@@ -0,0 +1,49 @@
+"""
+ Tuning profiles: saved and loaded back, applied to the models configuration not given
+ explicitly
+"""
+
+import os
+
+from openvino_utils.openvino_model import OpenVinoModel
+from openvino_utils.tuning import host_id, model_key, TunedConfig, TuningProfile
+
+
+def test_profile_round_trip(tmp_path):
+    path = str(tmp_path / "profiles" / "host.json")
+    profile = TuningProfile(host=host_id())
+    config = TunedConfig(
+        plugin_config={"CPU_THROUGHPUT_STREAMS": "2"}, num_requests=4, fps=30.5
+    )
+    profile.update("model@CPU", config)
+    profile.save(path)
+    assert os.listdir(tmp_path / "profiles") == ["host.json"]
+    loaded = TuningProfile.load(path)
+    assert loaded == profile
+    assert loaded.models["model@CPU"] == config
+
+
+def test_unreadable_profile(tmp_path):
+    path = tmp_path / "host.json"
+    assert TuningProfile.load(str(path)) is None
+    path.write_text("{")
+    assert TuningProfile.load(str(path)) is None
+
+
+def test_explicit_configuration_is_kept(tmp_path):
+    path = str(tmp_path / "host.json")
+    profile = TuningProfile(host=host_id())
+    profile.update(
+        model_key("models", "detector", "CPU"),
+        TunedConfig(plugin_config={"CPU_THROUGHPUT_STREAMS": "2"}, num_requests=4),
+    )
+    profile.save(path)
+    model = OpenVinoModel(
+        model_name="detector",
+        model_directory="models",
+        num_requests=2,
+        tuning_profile=path,
+    )
+    assert model.apply_tuning_profile()
+    assert model.num_requests == 2
+    assert model.plugin_config == {"CPU_THROUGHPUT_STREAMS": "2"}
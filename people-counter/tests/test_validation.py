@@ -0,0 +1,105 @@
+"""
+ Counts validation: the compared entries, exits and mean dwell times (of a quantized
+ model or of a frame skipping strategy against the reference)
+"""
+
+import numpy as np
+
+from openvino_utils.detections import as_detections, empty_detections
+from openvino_utils.input_feeder import TimestampedFrame
+from openvino_utils.streaming_stats import LatencyStats
+from precision_validation import compare_counts
+from skip_validation import validate_skipping
+
+
+def summary(entries, dwell_times):
+    return {
+        "total_count": entries,
+        "exits": len(dwell_times),
+        "dwell_times": dwell_times,
+        "mean_dwell_time": sum(dwell_times) / len(dwell_times) if dwell_times else None,
+    }
+
+
+def test_same_counts():
+    difference, checks = compare_counts(
+        summary(2, [3.0, 5.0]), summary(2, [3.5, 4.9]), 0.5
+    )
+    assert abs(difference - 0.2) < 1e-9
+    assert all(checks.values())
+
+
+def test_no_exits_on_both_sides():
+    difference, checks = compare_counts(summary(1, []), summary(1, []))
+    assert difference is None
+    assert all(checks.values())
+
+
+def test_exits_lost_on_one_side():
+    difference, checks = compare_counts(summary(2, [3.0, 5.0]), summary(2, []))
+    assert difference is None
+    assert checks == {
+        "same_total_count": True,
+        "same_exits": False,
+        "dwell_time": False,
+    }
+    _, checks = compare_counts(summary(2, []), summary(2, [4.0]))
+    assert not checks["dwell_time"]
+
+
+def test_dwell_time_beyond_tolerance():
+    _, checks = compare_counts(summary(2, [3.0, 5.0]), summary(2, [3.0, 7.0]), 0.5)
+    assert checks == {"same_total_count": True, "same_exits": True, "dwell_time": False}
+
+
+class ReplayedDetections:
+    """A detector stand-in: a person on the frames 10 to 49 (the frames are filled with
+    their index)"""
+
+    def __init__(self):
+        self.prediction_stats = LatencyStats()
+
+    def detect_array(self, frame, **_kwargs):
+        self.prediction_stats.add(0.01)
+        if 10 <= frame[0, 0, 0] < 50:
+            return as_detections(
+                np.array([[0, 1, 0.95, 0.2, 0.2, 0.4, 0.9]], dtype=np.float32)
+            )
+        return empty_detections()
+
+
+def replayed_frames(count=100):
+    return [
+        TimestampedFrame(
+            frame=np.full((4, 4, 3), index, dtype=np.uint8),
+            timestamp=index / 10,
+            index=index,
+            captured_at=0.0,
+        )
+        for index in range(count)
+    ]
+
+
+def sticky():
+    """A strategy keeping the last non empty detections: the person never leaves"""
+    last = {"detections": empty_detections()}
+
+    def strategy(_timestamped, detections):
+        if len(detections):
+            last["detections"] = detections
+        return last["detections"], False
+
+    return strategy
+
+
+def test_a_strategy_dropping_the_exits_is_rejected():
+    report = validate_skipping(ReplayedDetections(), replayed_frames(), sticky())
+    assert report["counts"]["reference"]["exits"] == 1
+    assert report["counts"]["skipping"]["exits"] == 0
+    assert report["mean_dwell_time_difference"] is None
+    assert report["checks"] == {
+        "same_total_count": True,
+        "same_exits": False,
+        "dwell_time": False,
+    }
+    assert not report["accepted"]